@@ -1,14 +1,16 @@
+import os
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, scoped_session
 
 # Use only SQLite database
 # This will create/use a users.db file in the backend directory
-DATABASE_URL = "sqlite:///./users.db"
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./users.db")
 
 db = SQLAlchemy()
 
-engine = create_engine(DATABASE_URL, echo=True)
+# SQL_ECHO=0 turns off the SQL logging (benchmarks)
+engine = create_engine(DATABASE_URL, echo=os.getenv("SQL_ECHO", "1") == "1")
 SessionLocal = scoped_session(sessionmaker(bind=engine, autocommit=False, autoflush=False))
 
 
@@ -16,9 +18,26 @@ def create_tables_database(app):
     """Create all database tables"""
     with app.app_context():
         db.create_all()
+        add_missing_columns()
     return True
 
 
+def add_missing_columns():
+    """create_all() never alters existing tables, new nullable columns are added here"""
+    from sqlalchemy import inspect, text
+    inspector = inspect(db.engine)
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+
+
 def get_session():
     """Get database session"""
     session = SessionLocal()
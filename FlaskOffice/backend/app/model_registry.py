@@ -0,0 +1,119 @@
+import os
+import logging
+import threading
+import time
+import numpy as np
+
+'''
+Model registry
+    1. Nothing is loaded at import time, importing the routes (tooling, tests, gunicorn workers) is cheap.
+    2. get(name) loads the weights on first use, only once per process.
+    3. warm_up(name) runs a few dummy passes so the first real request does not pay
+       for lazy init (allocator, kernel selection, fuse of conv+bn layers...).
+    4. inference_lock: one model call at a time per process, Flask threads share the same model.
+    5. Under gunicorn (gunicorn.conf.py) the master calls preload() before fork and every worker
+       calls after_fork(): the weights are shared copy-on-write, each worker gets its own thread budget.
+'''
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(
+    os.path.dirname(
+        os.path.dirname(os.path.abspath(__file__))
+    )
+)
+
+MODEL_PATH = os.path.join(BASE_DIR, "weights", "combined_best.pt")
+
+WARMUP_RUNS = int(os.getenv("WARMUP_RUNS", "2"))
+WARMUP_IMGSZ = int(os.getenv("WARMUP_IMGSZ", "640"))
+
+
+# INFERENCE_BACKEND=stub -> deterministic fake model (app/stub_model.py), no weights needed, for benchmarks
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch").lower()
+
+
+def load_model(model_path: str):
+    if INFERENCE_BACKEND == "stub":
+        from app.stub_model import StubModel
+        return StubModel()
+    from ultralytics import YOLO
+    return YOLO(model_path)
+
+
+class ModelRegistry:
+    def __init__(self, paths: dict):
+        self.paths = dict(paths)
+        self.status = "starting"   # starting -> warming_up -> ready / failed
+        self.error = None
+        self._models = {}
+        self._warm = {}
+        self._lock = threading.Lock()
+        self.inference_lock = threading.Lock()
+
+    def get(self, name: str = "default"):
+        """Return the model, loading it on first use"""
+        model = self._models.get(name)
+        if model is None:
+            with self._lock:
+                model = self._models.get(name)
+                if model is None:
+                    model = load_model(self.paths[name])
+                    self._models[name] = model
+        return model
+
+    def warm_up(self, name: str = "default", runs: int = WARMUP_RUNS, imgsz: int = WARMUP_IMGSZ):
+        """Load the model and run dummy passes on it"""
+        self.status = "warming_up"
+        try:
+            model = self.get(name)
+            if name not in self._warm:
+                start = time.time()
+                dummy = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+                for _ in range(runs):
+                    with self.inference_lock:
+                        model(dummy, imgsz=imgsz, verbose=False)
+                self._warm[name] = (time.time() - start) * 1000
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+            logger.warning("Model warm-up failed: %s", e)
+            return None
+        self.status = "ready"
+        return model
+
+    def warm_up_in_background(self, name: str = "default"):
+        """Warm up without blocking app start-up, /ready reports when it is done"""
+        thread = threading.Thread(target=self.warm_up, args=(name,), daemon=True)
+        thread.start()
+        return thread
+
+    def preload(self, name: str = "default"):
+        """Master process, before fork: load + fuse the weights, no forward pass"""
+        if INFERENCE_BACKEND != "stub":
+            import torch
+            # 1 thread in the master: no OpenMP pool exists when gunicorn forks (forked pools deadlock)
+            torch.set_num_threads(1)
+        model = self.get(name)
+        if hasattr(model, "fuse"):
+            model.fuse()  # fused conv+bn weights are made once here and shared, not once per worker
+        # objects that exist now are never touched by the gc again, so their pages stay shared after fork
+        import gc
+        gc.collect()
+        gc.freeze()
+        return model
+
+    def after_fork(self, torch_threads: int, name: str = "default"):
+        """Worker process, right after fork: own thread budget, then warm up in the background"""
+        if INFERENCE_BACKEND != "stub" and torch_threads > 0:
+            import torch
+            torch.set_num_threads(torch_threads)
+        self._lock = threading.Lock()  # locks held by another thread at fork time would never be released
+        self.inference_lock = threading.Lock()
+        return self.warm_up_in_background(name)
+
+    def is_ready(self, name: str = "default") -> bool:
+        return name in self._warm
+
+
+registry = ModelRegistry({"default": MODEL_PATH})
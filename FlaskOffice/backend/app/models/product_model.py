@@ -13,3 +13,4 @@ class Detections(db.Model):
     num_detections = db.Column(db.Integer)
     classes_detected = db.Column(db.String)
     confidence_avg = db.Column(db.Float)
+    available = db.Column(db.Boolean, nullable=True)  # False until the write-behind writer has the file on disk (for good if that write failed)
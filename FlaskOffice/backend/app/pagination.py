@@ -0,0 +1,46 @@
+import base64, json
+
+'''
+Keyset (cursor) pagination
+    1. OFFSET pagination still reads and throws away every skipped row, pages get slower with table size.
+    2. Keyset pagination remembers the last id of the page and asks for "id < last_id" next time,
+       that is a primary key range scan, every page costs the same.
+    3. Lists are newest first, ids only grow, so the id order is also the timestamp order.
+    4. The cursor is an opaque token (base64 JSON), clients just send back next_cursor.
+'''
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        return int(json.loads(base64.urlsafe_b64decode(cursor.encode()))["id"])
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def read_limit(value) -> int:
+    """Clamp the ?limit= query parameter to 1..MAX_LIMIT"""
+    try:
+        limit = int(value) if value is not None else DEFAULT_LIMIT
+    except ValueError:
+        raise ValueError("Invalid limit")
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def paginate(query, id_column, cursor, limit):
+    """Apply the cursor to an unordered query, returns (rows, next_cursor)"""
+    if cursor:
+        query = query.filter(id_column < decode_cursor(cursor))
+    rows = query.order_by(id_column.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].id)
+    return rows, next_cursor
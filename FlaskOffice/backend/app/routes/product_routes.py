@@ -1,19 +1,25 @@
 from flask import Blueprint, request, jsonify, send_file
-from app.database import get_session
+from app.database import get_session, SessionLocal
 from app.models.user_model import User, EmailOTP
 from app.models.product_model import Detections
 from app.dependancies import get_current_user
 from app.schemas.user_schema import CreateUser, OTPVerify, UpdateUser, loginUser, UserRead, Token
 from app.auth import hash_password, verified_password, create_acess_token
 from app.emailverfication import send_otp_email, generate_otp
-from ultralytics import YOLO
-import cv2, numpy as np, os
-import time
+from app.model_registry import registry, MODEL_PATH
+from app.pagination import paginate, read_limit
+from app.uploads import read_upload, release
+from app.write_behind import writer, WRITE_BEHIND_ENABLED
+from functools import partial
+import cv2, numpy as np, os, io, mimetypes
+import time, logging
 from datetime import datetime, timedelta
 from werkzeug.utils import secure_filename
 
 router = Blueprint('product_routes', __name__)
 
+logger = logging.getLogger(__name__)
+
 BASE_DIR = os.path.dirname(
     os.path.dirname(
         os.path.dirname(
@@ -22,22 +28,22 @@ BASE_DIR = os.path.dirname(
     )
 )
 
-MODEL_PATH = os.path.join(BASE_DIR, "weights", "combined_best.pt")
-
-IMG_SAVE_DIR = os.path.join(BASE_DIR, "storage", "images")
-VID_SAVE_DIR = os.path.join(BASE_DIR, "storage", "videos")
+# STORAGE_DIR can point somewhere else (benchmarks run against a throw-away folder)
+STORAGE_DIR = os.getenv("STORAGE_DIR", os.path.join(BASE_DIR, "storage"))
+IMG_SAVE_DIR = os.path.join(STORAGE_DIR, "images")
+VID_SAVE_DIR = os.path.join(STORAGE_DIR, "videos")
 
 os.makedirs(IMG_SAVE_DIR, exist_ok=True)
 os.makedirs(VID_SAVE_DIR, exist_ok=True)
 
-model = YOLO(MODEL_PATH)
-
 def detect_image(image_bytes):
+    model = registry.get()  # loaded lazily, normally already warm from app start-up
     start = time.time()
 
     np_arr = np.frombuffer(image_bytes, np.uint8)
     img = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-    results = model(img)
+    with registry.inference_lock:  # one model call at a time, the other Flask threads wait here
+        results = model(img)
 
     annotated = results[0].plot()
     inference_time = (time.time() - start) * 1000
@@ -54,12 +60,56 @@ def detect_image(image_bytes):
     }
     return annotated, metadata
 
-def save_image(image, file_name):
+# Annotated result encoding: RESULT_FORMAT=jpg|webp, quality 0-100
+RESULT_FORMAT = os.getenv("RESULT_FORMAT", "jpg").lower()
+RESULT_JPEG_QUALITY = int(os.getenv("RESULT_JPEG_QUALITY", "90"))
+RESULT_WEBP_QUALITY = int(os.getenv("RESULT_WEBP_QUALITY", "80"))
+ENCODE_PARAMS = {
+    "jpg": [cv2.IMWRITE_JPEG_QUALITY, RESULT_JPEG_QUALITY],
+    "webp": [cv2.IMWRITE_WEBP_QUALITY, RESULT_WEBP_QUALITY],
+}
+
+def result_name(file_name):
     name, ext = os.path.splitext(file_name)
-    filename = f"{name}_result.jpg"
-    filepath = os.path.join(IMG_SAVE_DIR, filename)
-    cv2.imwrite(filepath, image)
-    return filename, filepath   # return only filename
+    filename = f"{name}_result.{RESULT_FORMAT}"
+    return filename, os.path.join(IMG_SAVE_DIR, filename)
+
+def encode_image(image):
+    ok, encoded = cv2.imencode(f".{RESULT_FORMAT}", image, ENCODE_PARAMS.get(RESULT_FORMAT, []))
+    if not ok:
+        raise ValueError("Could not encode result image")
+    return encoded.tobytes()
+
+def write_file(filepath, data):
+    with open(filepath, "wb") as f:
+        f.write(data)
+
+def mark_available(detection_id, path):
+    """Called once the result file is durable, deleted rows just lose their late file"""
+    session = SessionLocal()
+    try:
+        record = session.get(Detections, detection_id)
+        if record is None:
+            os.remove(path)
+            return
+        record.available = True
+        session.commit()
+    finally:
+        session.close()
+
+def mark_failed(detection_id, path):
+    """Write-behind could not store the file, the row stays available=False (hidden from the lists)"""
+    logger.error("Detection %s: result %s was not stored", detection_id, path)
+
+def send_result(path, available=None, **kwargs):
+    """Result file from disk, or from the write-behind buffer while the row is not available yet"""
+    mimetype = mimetypes.guess_type(path)[0] or "image/jpeg"
+    data = writer.read(path) if available is False else None
+    if data is not None:
+        return send_file(io.BytesIO(data), mimetype=mimetype, **kwargs)
+    if not os.path.exists(path):
+        return jsonify({"detail": "File missing on server"}), 404
+    return send_file(path, mimetype=mimetype, **kwargs)
 
 IMG_EXT = [".jpg", ".jpeg", ".png", ".gif", ".webp", ".avif", ".svg"]
 
@@ -71,7 +121,8 @@ def view_image(current_user=None, session=None):
         return jsonify({"detail": "Path parameter required"}), 400
     
     try:
-        return send_file(path, mimetype="image/jpeg")
+        record = session.query(Detections).filter(Detections.filepath == path).first()
+        return send_result(path, record.available if record else None)
     finally:
         if session:
             session.close()
@@ -89,21 +140,27 @@ def detect(current_user=None, session=None):
         if file.filename == '':
             return jsonify({"detail": "No file selected"}), 400
 
-        image_bytes = file.read()
-
         name, ext = os.path.splitext(file.filename)
         ext = ext.lower()
 
         if ext not in IMG_EXT:
             return jsonify({"detail": "Only image files allowed"}), 400
 
-        annotated, meta = detect_image(image_bytes)
+        # magic bytes checked first, big uploads are memory-mapped instead of read (app/uploads.py)
+        image_bytes = read_upload(file)
+        if image_bytes is None:
+            return jsonify({"detail": "Unsupported image format"}), 415
+        try:
+            annotated, meta = detect_image(image_bytes)
+        finally:
+            release(image_bytes)
         image_name = name
         
         if custom_file_name:
-            object_name, file_path = save_image(annotated, custom_file_name)
+            object_name, file_path = result_name(custom_file_name)
         else:
-            object_name, file_path = save_image(annotated, image_name)
+            object_name, file_path = result_name(image_name)
+        encoded = encode_image(annotated)
 
         total_detections = meta["num_detections"]
 
@@ -114,11 +171,21 @@ def detect(current_user=None, session=None):
             num_detections=meta["num_detections"],
             classes_detected=meta["classes_detected"],
             confidence_avg=meta["confidence_avg"],
+            available=not WRITE_BEHIND_ENABLED,
         )
 
+        if not WRITE_BEHIND_ENABLED:
+            write_file(file_path, encoded)
         session.add(record)
         session.commit()
 
+        if WRITE_BEHIND_ENABLED:
+            # the file is written by the write-behind threads, the row is marked available once it is durable
+            on_done = partial(mark_available, record.id)
+            if not writer.submit(file_path, encoded, on_done, partial(mark_failed, record.id)):
+                write_file(file_path, encoded)  # queue full, this request writes it
+                on_done(file_path)
+
         return jsonify({
             "message": "Detections done",
             "download_url": f"{file_path}",
@@ -128,10 +195,23 @@ def detect(current_user=None, session=None):
         if session:
             session.close()
 
+def detection_to_dict(r):
+    return {
+        "id": r.id,
+        "filename": r.filename,
+        "filepath": r.filepath,
+        "timestamp": r.timestamp.isoformat() if r.timestamp else None,
+        "inference_time_ms": r.inference_time_ms,
+        "num_detections": r.num_detections,
+        "classes_detected": r.classes_detected,
+        "confidence_avg": r.confidence_avg
+    }
+
 @router.route("/detections", methods=["GET"])
 def get_detections():
     file_name = request.args.get('file_name')
     file_id = request.args.get('file_id', type=int)
+    cursor = request.args.get('cursor')
     
     session = next(get_session())
     try:
@@ -139,41 +219,23 @@ def get_detections():
             record = session.query(Detections).filter(Detections.id == file_id).first()
             if not record:
                 return jsonify({"detail": "Detection not found"}), 404
-            return jsonify({
-                "id": record.id,
-                "filename": record.filename,
-                "filepath": record.filepath,
-                "timestamp": record.timestamp.isoformat() if record.timestamp else None,
-                "inference_time_ms": record.inference_time_ms,
-                "num_detections": record.num_detections,
-                "classes_detected": record.classes_detected,
-                "confidence_avg": record.confidence_avg
-            }), 200
+            return jsonify(detection_to_dict(record)), 200
 
+        # available=False: result not on disk (yet), left out until it is
+        query = session.query(Detections).filter(Detections.available.isnot(False))
         if file_name is not None:
-            records = session.query(Detections).filter(Detections.filename == file_name).all()
-            return jsonify([{
-                "id": r.id,
-                "filename": r.filename,
-                "filepath": r.filepath,
-                "timestamp": r.timestamp.isoformat() if r.timestamp else None,
-                "inference_time_ms": r.inference_time_ms,
-                "num_detections": r.num_detections,
-                "classes_detected": r.classes_detected,
-                "confidence_avg": r.confidence_avg
-            } for r in records]), 200
+            query = query.filter(Detections.filename == file_name)
 
-        records = session.query(Detections).all()
-        return jsonify([{
-            "id": r.id,
-            "filename": r.filename,
-            "filepath": r.filepath,
-            "timestamp": r.timestamp.isoformat() if r.timestamp else None,
-            "inference_time_ms": r.inference_time_ms,
-            "num_detections": r.num_detections,
-            "classes_detected": r.classes_detected,
-            "confidence_avg": r.confidence_avg
-        } for r in records]), 200
+        try:
+            limit = read_limit(request.args.get('limit'))
+            records, next_cursor = paginate(query, Detections.id, cursor, limit)
+        except ValueError as e:
+            return jsonify({"detail": str(e)}), 400
+
+        return jsonify({
+            "items": [detection_to_dict(r) for r in records],
+            "next_cursor": next_cursor
+        }), 200
     finally:
         session.close()
 
@@ -195,17 +257,7 @@ def download_file(current_user=None, session=None):
         if not record:
             return jsonify({"detail": "Record not found"}), 404
 
-        path = record.filepath
-
-        if not os.path.exists(path):
-            return jsonify({"detail": "File missing on server"}), 404
-
-        return send_file(
-            path,
-            mimetype="image/jpeg",
-            as_attachment=True,
-            download_name=record.filename
-        )
+        return send_result(record.filepath, record.available, as_attachment=True, download_name=record.filename)
     finally:
         if session:
             session.close()
@@ -251,18 +303,28 @@ def delete_by_id(file_id, current_user=None, session=None):
 @get_current_user
 def detections_history(current_user=None, session=None):
     try:
-        records = session.query(Detections).order_by(Detections.id.desc()).all()
-
-        return jsonify([
-            {
-                "id": r.id,
-                "filename": r.filename,
-                "filepath": r.filepath,
-                "num_detections": r.num_detections,
-                "timestamp": r.timestamp.isoformat() if r.timestamp else None,
-            }
-            for r in records]
-        ), 200
+        try:
+            limit = read_limit(request.args.get('limit'))
+            records, next_cursor = paginate(
+                session.query(Detections).filter(Detections.available.isnot(False)),
+                Detections.id, request.args.get('cursor'), limit
+            )
+        except ValueError as e:
+            return jsonify({"detail": str(e)}), 400
+
+        return jsonify({
+            "items": [
+                {
+                    "id": r.id,
+                    "filename": r.filename,
+                    "filepath": r.filepath,
+                    "num_detections": r.num_detections,
+                    "timestamp": r.timestamp.isoformat() if r.timestamp else None,
+                }
+                for r in records
+            ],
+            "next_cursor": next_cursor
+        }), 200
     finally:
         if session:
             session.close()
@@ -0,0 +1,84 @@
+import time, zlib
+import cv2
+import numpy as np
+
+'''
+Deterministic stub detector (INFERENCE_BACKEND=stub)
+    1. Stands in for the YOLO weights in benchmarks and environments without the weights file.
+    2. Same call / result shape as ultralytics: model(images, imgsz=, conf=, iou=) -> results
+       with boxes.cls / boxes.conf / boxes.xyxy, names, plot() and speed.
+    3. The boxes only depend on the image content (seeded from a CRC of the downscaled pixels),
+       the same image always gives the same boxes -> runs can be compared between commits.
+    4. It still does a fixed amount of real CPU work per image (resize + a few matmuls at imgsz / 4),
+       so throughput numbers react to batching, threads and worker processes.
+'''
+
+STUB_NAMES = {0: "person", 1: "forklift", 2: "helmet", 3: "vest"}
+
+class StubBoxes:
+    def __init__(self, cls, conf, xyxy):
+        self.cls = cls
+        self.conf = conf
+        self.xyxy = xyxy
+
+    def __len__(self):
+        return len(self.cls)
+
+class StubResult:
+    def __init__(self, img, boxes, names, speed):
+        self.orig_img = img
+        self.orig_shape = img.shape[:2]
+        self.boxes = boxes
+        self.names = names
+        self.speed = speed
+
+    def plot(self):
+        img = self.orig_img.copy()
+        for cls, xyxy in zip(self.boxes.cls, self.boxes.xyxy):
+            x1, y1, x2, y2 = [int(v) for v in xyxy]
+            cv2.rectangle(img, (x1, y1), (x2, y2), (56, 56, 255), 2)
+            cv2.putText(img, self.names[int(cls)], (x1, max(y1 - 5, 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (56, 56, 255), 1)
+        return img
+
+class StubModel:
+    names = STUB_NAMES
+
+    def __init__(self, work: int = 8):
+        self.work = work
+        self._weights = None
+
+    def _features(self, img, imgsz):
+        side = max(8, imgsz // 4)
+        small = cv2.resize(img, (side, side), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        x = gray.astype(np.float32) / 255.0
+        if self._weights is None or self._weights.shape[0] != side:
+            self._weights = np.random.default_rng(0).standard_normal((side, side)).astype(np.float32) / side
+        for _ in range(self.work):
+            x = np.tanh(x @ self._weights)
+        return gray, x
+
+    def __call__(self, source, imgsz: int = 640, conf: float = 0.25, iou: float = 0.7, verbose: bool = False, **kwargs):
+        images = source if isinstance(source, list) else [source]
+        results = []
+        for img in images:
+            t0 = time.perf_counter()
+            gray, _ = self._features(img, imgsz)
+            t1 = time.perf_counter()
+
+            rng = np.random.default_rng(zlib.crc32(gray.tobytes()))
+            h, w = img.shape[:2]
+            n = int(rng.integers(0, 6))
+            cls = rng.integers(0, len(self.names), n).astype(np.float32)
+            scores = rng.uniform(0.2, 0.95, n).astype(np.float32)
+            x1 = rng.uniform(0, w * 0.8, n)
+            y1 = rng.uniform(0, h * 0.8, n)
+            x2 = np.minimum(x1 + rng.uniform(w * 0.05, w * 0.3, n), w - 1)
+            y2 = np.minimum(y1 + rng.uniform(h * 0.05, h * 0.3, n), h - 1)
+            keep = scores >= conf
+            boxes = StubBoxes(cls[keep], scores[keep], np.stack([x1, y1, x2, y2], axis=1)[keep].astype(np.float32))
+            t2 = time.perf_counter()
+
+            speed = {"preprocess": 0.0, "inference": (t1 - t0) * 1000, "postprocess": (t2 - t1) * 1000}
+            results.append(StubResult(img, boxes, self.names, speed))
+        return results
@@ -0,0 +1,51 @@
+import io, mmap
+
+# Upload ingest for /detect-image:
+# the body size is capped by MAX_CONTENT_LENGTH (werkzeug stops reading and answers 413),
+# the magic bytes are checked before the image is used, and uploads werkzeug already
+# spooled to a temp file (> 500KB) are memory-mapped instead of read into memory.
+
+CHUNK_SIZE = 64 * 1024
+
+def sniff(head: bytes):
+    """Image format from the first bytes of the file, None = not an image we can decode"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"avif", b"avis"):
+        return "avif"
+    if head.startswith(b"BM"):
+        return "bmp"
+    if head[:4] in (b"II*\x00", b"MM\x00*"):
+        return "tiff"
+    return None
+
+def read_upload(file):
+    """Bytes (small upload) or a read-only mmap of the spooled upload, None when it is not an image"""
+    stream = file.stream
+    head = stream.read(CHUNK_SIZE)
+    if not sniff(head):
+        return None
+    stream.seek(0)
+
+    # SpooledTemporaryFile keeps small uploads in a BytesIO, bigger ones in a real temp file
+    raw = getattr(stream, "_file", stream)
+    try:
+        fd = raw.fileno()
+    except (OSError, AttributeError):
+        return stream.read()
+    raw.flush()
+    return mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+
+def release(data):
+    """Unmap a spooled upload once the request is done"""
+    if isinstance(data, mmap.mmap):
+        try:
+            data.close()
+        except BufferError:
+            pass  # the decoder still holds a view, the mapping goes away with it
@@ -0,0 +1,120 @@
+import os, queue, threading, uuid, logging
+
+'''
+Write-behind writer for the annotated *_result images
+    1. /detect-image encodes the image and hands the bytes to submit(), the response does not wait for the disk.
+    2. Writer threads: temp file -> (fsync) -> rename -> (fsync folder) -> on_done() marks the row available.
+    3. read(path) serves the bytes from memory until they are on disk.
+    4. Bounded in bytes (WRITE_BEHIND_MAX_BYTES), when full submit() returns False and the request writes itself.
+    5. A failed write is logged and on_error() is called, the row stays available=False
+       (left out of the lists, 404 once the buffer is gone).
+'''
+
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "1") == "1"
+WRITE_BEHIND_WORKERS = int(os.getenv("WRITE_BEHIND_WORKERS", "2"))
+WRITE_BEHIND_MAX_BYTES = int(os.getenv("WRITE_BEHIND_MAX_BYTES", str(64 * 1024 * 1024)))
+# always = fsync file + folder before the row is marked available, never = leave it to the OS
+WRITE_FSYNC = os.getenv("WRITE_FSYNC", "always").lower()
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WriteBehind:
+    def __init__(self, workers: int = 2, max_bytes: int = 64 * 1024 * 1024, fsync: str = "always"):
+        self.workers = max(1, workers)
+        self.max_bytes = max_bytes
+        self.fsync = fsync == "always"
+        self._queue = queue.Queue()
+        self._pending = {}  # path -> bytes not on disk yet
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        """Writer threads start on first use, so a gunicorn master (preload) never owns any"""
+        with self._lock:
+            if self._threads:
+                return
+            self._threads = [
+                threading.Thread(target=self._run, name=f"write-behind-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, path, data, on_done=None, on_error=None):
+        """Queue a file write, False = no room, the caller writes it"""
+        with self._lock:
+            if self._bytes + len(data) > self.max_bytes or path in self._pending:
+                return False
+            self._pending[path] = data
+            self._bytes += len(data)
+        self.start()
+        self._queue.put((path, data, on_done, on_error))
+        return True
+
+    def read(self, path):
+        """Bytes of a file still waiting to be written, None once it is on disk"""
+        with self._lock:
+            return self._pending.get(path)
+
+    def _write(self, path, data):
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        if self.fsync:
+            fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                return
+            path, data, on_done, on_error = item
+            try:
+                self._write(path, data)
+            except Exception:
+                logger.exception("Write-behind failed for %s", path)
+                if on_error:
+                    self._call(on_error, path)
+            else:
+                if on_done:
+                    self._call(on_done, path)
+            finally:
+                with self._lock:
+                    self._pending.pop(path, None)
+                    self._bytes -= len(data)
+                self._queue.task_done()
+
+    def _call(self, callback, path):
+        try:
+            callback(path)
+        except Exception:
+            logger.exception("Write-behind callback failed for %s", path)
+
+    def flush(self):
+        """Blocks until everything queued so far is written"""
+        self._queue.join()
+
+    def stop(self):
+        """Writes what is left and stops the threads (atexit)"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(_STOP)
+        for thread in threads:
+            thread.join()
+
+
+writer = WriteBehind(WRITE_BEHIND_WORKERS, WRITE_BEHIND_MAX_BYTES, WRITE_FSYNC)
@@ -0,0 +1,46 @@
+import multiprocessing
+import os
+
+'''
+Production mode: gunicorn with the model preloaded in the master
+    Run from the backend folder:
+        gunicorn -c gunicorn.conf.py app.main:app
+    1. preload_app: app.main (and so the YOLO weights) is imported ONCE in the master, before fork.
+       The workers share those weight pages copy-on-write instead of each loading its own copy.
+    2. The master loads with 1 torch thread and never runs a forward pass,
+       so no OpenMP thread pool exists at fork time.
+    3. Each worker then gets TORCH_THREADS_PER_WORKER intra-op threads (default: cores // workers),
+       N workers never oversubscribe the cores.
+    4. gthread workers serve several requests at once (uploads, DB, file I/O),
+       model calls inside a worker are serialised by registry.inference_lock.
+    5. DB connections opened in the master are dropped in every worker (never share a socket across fork).
+'''
+
+CORES = multiprocessing.cpu_count()
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_WORKERS", str(max(1, min(4, CORES)))))
+threads = int(os.getenv("WEB_THREADS", "4"))
+worker_class = "gthread"
+timeout = int(os.getenv("WEB_TIMEOUT", "120"))
+preload_app = True
+
+# read by app/main.py (preload instead of background warm-up) and by post_fork below
+os.environ["PRELOAD_MODEL"] = "1"
+os.environ.setdefault("TORCH_THREADS_PER_WORKER", str(max(1, CORES // workers)))
+
+def post_fork(server, worker):
+    from app.main import app
+    from app.database import db, engine
+    from app.model_registry import registry
+
+    # close=False: the master's connections stay valid for the master, the worker opens its own
+    engine.dispose(close=False)
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+    registry.after_fork(int(os.environ["TORCH_THREADS_PER_WORKER"]))
+    server.log.info(
+        "worker %s: %s torch threads, %s request threads",
+        worker.pid, os.environ["TORCH_THREADS_PER_WORKER"], threads,
+    )
@@ -0,0 +1,201 @@
+import bisect
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select, func
+from app.database import engine
+from app.models.product_model import Detections, DetectionRollups, ClassRollups, LatencyRollups, RollupBackfill
+from app.annotations import load_boxes
+
+'''
+Incremental analytics rollups
+    1. Scanning Detections for every dashboard refresh gets slower with every image.
+    2. Instead every insert also bumps a few counters in its hour and day bucket
+       (same transaction, INSERT .. ON CONFLICT DO UPDATE SET x = x + excluded.x):
+        - DetectionRollups: images, detections, sum of confidence_avg, sum of inference_time_ms
+        - ClassRollups:     boxes / images per class
+        - LatencyRollups:   inference_time_ms histogram (fixed bins)
+    3. p50 / p95 come from the summed histogram, interpolated inside the bin.
+    4. /analytics only reads rollup rows -> cost grows with the number of buckets, not rows.
+    5. Rollups count work done, deleting history does not take it back out.
+    6. Older history is rolled up once by backfill(): start_backfill() stores the last existing id
+       before any request can insert (watermark), each batch commits its progress with its counters,
+       so a restart resumes where it stopped and nothing is counted twice.
+'''
+
+GRANULARITIES = ("hour", "day")
+
+# upper bounds of the latency bins in ms, the last bin catches everything slower
+LATENCY_BINS = [1, 2, 5, 10, 15, 20, 30, 40, 50, 75, 100, 150, 200, 300, 500, 750, 1000, 2000, 5000, 1e9]
+
+def bucket_start(ts, granularity):
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def latency_bin(ms):
+    return LATENCY_BINS[min(bisect.bisect_left(LATENCY_BINS, ms), len(LATENCY_BINS) - 1)]
+
+def _upsert(session, model, keys, increments):
+    dialect = session.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        stmt = insert(model).values(**keys, **increments)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={name: getattr(model, name) + stmt.excluded[name] for name in increments},
+        )
+        session.exec(stmt)
+        return
+
+    # other databases: read-modify-write
+    row = session.exec(select(model).filter_by(**keys)).first() or model(**keys)
+    for name, value in increments.items():
+        setattr(row, name, (getattr(row, name) or 0) + value)
+    session.add(row)
+
+def record(session, rows):
+    # rows: (Detections record, boxes) pairs about to be committed, call before session.commit()
+    totals = defaultdict(Counter)
+    classes = defaultdict(Counter)
+    latency = Counter()
+
+    for detection, boxes in rows:
+        per_class = Counter(b["name"] for b in boxes)
+        for granularity in GRANULARITIES:
+            bucket = (granularity, bucket_start(detection.timestamp, granularity))
+            totals[bucket].update({
+                "images": 1,
+                "detections": detection.num_detections,
+                "confidence_sum": detection.confidence_avg or 0.0,
+                "inference_time_sum": detection.inference_time_ms or 0.0,
+            })
+            for name, count in per_class.items():
+                classes[bucket + (name,)].update({"boxes": count, "images": 1})
+            latency[bucket + (latency_bin(detection.inference_time_ms or 0.0),)] += 1
+
+    # one upsert per touched bucket, not per row
+    for (granularity, start), values in totals.items():
+        _upsert(session, DetectionRollups, {"granularity": granularity, "bucket_start": start}, dict(values))
+    for (granularity, start, name), values in classes.items():
+        _upsert(session, ClassRollups, {"granularity": granularity, "bucket_start": start, "class_name": name}, dict(values))
+    for (granularity, start, le_ms), count in latency.items():
+        _upsert(session, LatencyRollups, {"granularity": granularity, "bucket_start": start, "le_ms": le_ms}, {"count": count})
+
+def percentile(histogram, q):
+    # histogram: {le_ms: count}, linear interpolation inside the bin
+    total = sum(histogram.values())
+    if not total:
+        return None
+    target = q * total
+    seen = 0
+    lower = 0.0
+    for le_ms in sorted(histogram):
+        count = histogram[le_ms]
+        if count and seen + count >= target:
+            if le_ms >= LATENCY_BINS[-1]:
+                return lower  # open ended overflow bin
+            return round(lower + (le_ms - lower) * (target - seen) / count, 2)
+        seen += count
+        lower = le_ms
+    return lower
+
+def _summary(totals, histogram, class_counts):
+    images = totals["images"]
+    return {
+        "images": images,
+        "detections": totals["detections"],
+        "avg_confidence": round(totals["confidence_sum"] / images, 4) if images else None,
+        "avg_inference_ms": round(totals["inference_time_sum"] / images, 2) if images else None,
+        "p50_inference_ms": percentile(histogram, 0.50),
+        "p95_inference_ms": percentile(histogram, 0.95),
+        "classes": dict(class_counts),
+    }
+
+def query(session, granularity, start, end):
+    in_range = lambda model: (
+        model.granularity == granularity, model.bucket_start >= start, model.bucket_start < end,
+    )
+
+    buckets = defaultdict(lambda: {"totals": Counter(), "histogram": Counter(), "classes": Counter()})
+    for row in session.exec(select(DetectionRollups).where(*in_range(DetectionRollups))):
+        buckets[row.bucket_start]["totals"].update({
+            "images": row.images,
+            "detections": row.detections,
+            "confidence_sum": row.confidence_sum,
+            "inference_time_sum": row.inference_time_sum,
+        })
+    for row in session.exec(select(LatencyRollups).where(*in_range(LatencyRollups))):
+        buckets[row.bucket_start]["histogram"][row.le_ms] += row.count
+    for row in session.exec(select(ClassRollups).where(*in_range(ClassRollups))):
+        buckets[row.bucket_start]["classes"][row.class_name] += row.boxes
+
+    overall = {"totals": Counter(), "histogram": Counter(), "classes": Counter()}
+    series = []
+    for start_at in sorted(buckets):
+        bucket = buckets[start_at]
+        for part in overall:
+            overall[part].update(bucket[part])
+        series.append({"bucket_start": start_at, **_summary(bucket["totals"], bucket["histogram"], bucket["classes"])})
+
+    return {
+        "granularity": granularity,
+        "start": start,
+        "end": end,
+        "summary": _summary(overall["totals"], overall["histogram"], overall["classes"]),
+        "buckets": series,
+    }
+
+def start_backfill():
+    # call at startup before serving: rows inserted after this are rolled up by their own request
+    with Session(engine) as session:
+        if session.get(RollupBackfill, 1):
+            return
+        max_id = session.exec(select(func.max(Detections.id))).one() or 0
+        # rollups without a watermark: made before it existed, that history was already rolled up
+        done = session.exec(select(func.count(DetectionRollups.id))).one() > 0
+        session.add(RollupBackfill(id=1, max_id=max_id, last_id=max_id if done else 0))
+        try:
+            session.commit()
+        except IntegrityError:
+            session.rollback()  # another process (API / job worker) took it first
+
+def _advance(session, last_id, new_id):
+    # compare-and-set, two processes backfilling at once never count the same batch twice
+    result = session.exec(
+        update(RollupBackfill)
+        .where(RollupBackfill.id == 1, RollupBackfill.last_id == last_id)
+        .values(last_id=new_id)
+    )
+    return result.rowcount == 1
+
+def backfill(batch_size=1000):
+    # one-time scan of the history that predates the rollup tables, resumes from the watermark
+    start_backfill()
+    done = 0
+    with Session(engine) as session:
+        while True:
+            last_id, max_id = session.exec(select(RollupBackfill.last_id, RollupBackfill.max_id)).one()
+            if last_id >= max_id:
+                return done
+            batch = session.exec(
+                select(Detections)
+                .where(Detections.id > last_id, Detections.id <= max_id)
+                .order_by(Detections.id)
+                .limit(batch_size)
+            ).all()
+            rows = []
+            for detection in batch:
+                boxes = load_boxes(detection.boxes_json)
+                if not boxes and detection.classes_detected:
+                    # rows older than boxes_json only know which classes were seen
+                    boxes = [{"name": name} for name in detection.classes_detected.split(",") if name]
+                rows.append((detection, boxes))
+            record(session, rows)
+            if not _advance(session, last_id, batch[-1].id if batch else max_id):
+                session.rollback()  # someone else did this batch
+                continue
+            session.commit()  # counters + progress together
+            done += len(batch)
@@ -0,0 +1,91 @@
+import json, os, uuid
+import cv2
+from app.detector import render_annotated
+from app.thumbnails import remove_thumbnails
+from app.encodings import remove_variants
+from app import metrics
+from app.models.product_model import DetectionBoxes
+from app.write_behind import writer
+from app.config import UPLOAD_DIR, IMG_SAVE_DIR, RESULT_JPEG_QUALITY
+
+'''
+Lazy annotation rendering
+    1. /detect-image stores the upload bytes as they came (no decode, no encode) and the raw boxes.
+    2. Most results are never looked at, so the overlay is not drawn at detection time.
+    3. The first /view-image or /download renders the *_result.jpg and keeps it on disk,
+       every later access is a plain file read.
+    4. /detect-image hands the upload to the write-behind writer (app/write_behind.py),
+       a view before it is on disk renders from the bytes still in memory.
+'''
+
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+def source_path_for(name, ext):
+    return os.path.join(UPLOAD_DIR, f"{name}_{uuid.uuid4().hex[:8]}{ext}")
+
+def result_path_for(source_path):
+    # unique like the upload it is rendered from, two uploads named a.jpg never share one overlay
+    name = os.path.splitext(os.path.basename(source_path))[0]
+    return os.path.join(IMG_SAVE_DIR, f"{name}_result.jpg")
+
+def write_source(filepath, image_bytes):
+    with open(filepath, "wb") as f:
+        f.write(image_bytes)
+
+def save_source(image_bytes, name, ext):
+    filepath = source_path_for(name, ext)
+    write_source(filepath, image_bytes)
+    return filepath
+
+def dump_boxes(boxes):
+    # compact JSON, one decimal is plenty for pixel coordinates
+    return json.dumps([
+        {"cls": b["cls"], "name": b["name"], "conf": round(b["conf"], 4), "xyxy": [round(v, 1) for v in b["xyxy"]]}
+        for b in boxes
+    ], separators=(",", ":"))
+
+def load_boxes(boxes_json):
+    return json.loads(boxes_json) if boxes_json else []
+
+def box_rows(detection_id, boxes):
+    return [
+        DetectionBoxes(
+            detection_id=detection_id,
+            class_id=b["cls"],
+            class_name=b["name"],
+            confidence=b["conf"],
+            x1=b["xyxy"][0], y1=b["xyxy"][1], x2=b["xyxy"][2], y2=b["xyxy"][3],
+        )
+        for b in boxes
+    ]
+
+def ensure_rendered(record):
+    # Returns the path of the annotated image, rendering it on first access
+    if os.path.exists(record.filepath):
+        return record.filepath
+    if not record.source_path:
+        return None
+    # available=False -> the upload is still in the write-behind buffer (or its write failed, nothing to render)
+    source = writer.read(record.source_path) if record.available is False else None
+    if source is None and not os.path.exists(record.source_path):
+        return None
+
+    with metrics.timed("plot"):
+        if source is None:
+            with open(record.source_path, "rb") as f:
+                source = f.read()
+        annotated = render_annotated(source, load_boxes(record.boxes_json))
+
+    # write to a temp name then rename, two concurrent viewers never see a half written file
+    with metrics.timed("encode_write"):
+        tmp_path = f"{record.filepath}.{uuid.uuid4().hex[:8]}.tmp.jpg"
+        cv2.imwrite(tmp_path, annotated, [cv2.IMWRITE_JPEG_QUALITY, RESULT_JPEG_QUALITY])
+        os.replace(tmp_path, record.filepath)
+    return record.filepath
+
+def remove_files(record):
+    for path in (record.filepath, record.source_path):
+        if path and os.path.exists(path):
+            os.remove(path)
+    remove_thumbnails(record.filepath)
+    remove_variants(record.filepath)
@@ -0,0 +1,211 @@
+import asyncio, json, os, zipfile
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import Session
+from app.database import engine
+from app.models.product_model import Detections
+from app import result_cache, analytics, metrics
+from app.batching import QueueFullError
+from app.annotations import save_source, result_path_for, dump_boxes, box_rows
+from app.config import RESULT_CACHE_ENABLED, BATCH_INGEST_MAX_FILES, BATCH_INGEST_MAX_FILE_BYTES
+
+'''
+/detect-batch: many images in one request
+    1. Input is a list of files and/or a ZIP archive, members are read one at a time (never the whole archive).
+    2. Images are grouped into chunks of chunk_size and submitted to the shared MicroBatcher (via_batcher),
+       up to `inflight` chunks at once: same queue bound and workers as /detect-image,
+       a full queue makes the stream wait instead of pushing past the bound.
+    3. One NDJSON line is streamed per image as soon as its chunk comes back and its row is written,
+       every line has the detection "id" (cached or not).
+    4. Detections rows are not committed one by one: the rows of a finished model chunk go in
+       one INSERT batch + one commit (at most db_chunk rows per statement).
+    5. The last line is a summary {"done": true, ...}.
+'''
+
+def make_record(meta, image_name, source_path):
+    filename = f"{image_name}_result.jpg"
+    return Detections(
+        filename=filename,
+        filepath=result_path_for(source_path),
+        inference_time_ms=meta["inference_time_ms"],
+        num_detections=meta["num_detections"],
+        classes_detected=meta["classes_detected"],
+        confidence_avg=meta["confidence_avg"],
+        source_path=source_path,
+        boxes_json=dump_boxes(meta["boxes"]),
+        image_width=meta["image_size"][0],
+        image_height=meta["image_size"][1],
+    )
+
+def iter_images(uploads, archive, image_ext):
+    # yields (name, ext, bytes) or (name, ext, error message)
+    count = 0
+    for upload in uploads:
+        name, ext = os.path.splitext(os.path.basename(upload.filename or "image"))
+        if count >= BATCH_INGEST_MAX_FILES:
+            yield name, ext.lower(), f"Batch limit of {BATCH_INGEST_MAX_FILES} images reached"
+            return
+        count += 1
+        yield name, ext.lower(), upload.file.read(BATCH_INGEST_MAX_FILE_BYTES + 1)
+
+    if archive is None:
+        return
+    try:
+        zf = zipfile.ZipFile(archive.file)
+    except zipfile.BadZipFile:
+        yield os.path.basename(archive.filename or "archive"), ".zip", "Not a valid ZIP archive"
+        return
+
+    with zf:
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            name, ext = os.path.splitext(os.path.basename(info.filename))
+            ext = ext.lower()
+            if name.startswith(".") or ext not in image_ext:
+                continue  # __MACOSX files, thumbs, text files..
+            if count >= BATCH_INGEST_MAX_FILES:
+                yield name, ext, f"Batch limit of {BATCH_INGEST_MAX_FILES} images reached"
+                return
+            count += 1
+            # the declared size can't be trusted (zip bombs), so read at most the limit + 1 byte
+            with zf.open(info) as member:
+                yield name, ext, member.read(BATCH_INGEST_MAX_FILE_BYTES + 1)
+
+def via_batcher(submit, retry_after=0.05):
+    # run_batch for detect_stream on top of MicroBatcher.submit, one result (or exception) per image
+    async def one(data):
+        while True:
+            try:
+                return await submit(data)
+            except QueueFullError:
+                await asyncio.sleep(retry_after)  # the batch waits, /detect-image callers get the 503
+
+    async def run_batch(items):
+        return await asyncio.gather(*(one(data) for data in items), return_exceptions=True)
+    return run_batch
+
+def _line(payload):
+    return json.dumps(payload, default=str) + "\n"
+
+async def detect_stream(images, run_batch, image_ext, chunk_size=8, inflight=1, db_chunk=200):
+    session = Session(engine)
+    pending_rows = []   # (record, boxes, cache key, NDJSON line) not written yet
+    used_names = {}
+    summary = {"done": True, "processed": 0, "cached": 0, "failed": 0, "inserted": 0}
+
+    def unique_name(name):
+        # the same file name twice in one archive still gets two distinct download names
+        seen = used_names.get(name, 0)
+        used_names[name] = seen + 1
+        return name if seen == 0 else f"{name}_{seen}"
+
+    def write_rows(rows):
+        records = [record for record, _, _, _ in rows]
+        session.add_all(records)
+        session.flush()  # one multi-row INSERT, gives the ids for the box rows
+        ids = [record.id for record in records]
+        for record, boxes, _, _ in rows:
+            session.add_all(box_rows(record.id, boxes))
+        analytics.record(session, [(record, boxes) for record, boxes, _, _ in rows])
+        session.commit()
+        cache_items = [(key, record) for record, _, key, _ in rows if key]
+        if cache_items:
+            result_cache.store_many(session, cache_items)
+        return ids
+
+    async def flush():
+        # writes the pending rows, returns their NDJSON lines (now with the ids)
+        nonlocal pending_rows
+        lines = []
+        while pending_rows:
+            rows, pending_rows = pending_rows[:db_chunk], pending_rows[db_chunk:]
+            with metrics.timed("db_commit"):
+                ids = await run_in_threadpool(write_rows, rows)
+            summary["inserted"] += len(ids)
+            lines += [_line({"file": line.pop("file"), "id": id, **line}) for (_, _, _, line), id in zip(rows, ids)]
+        return lines
+
+    async def run_chunk(chunk):
+        try:
+            return chunk, await run_batch([item["bytes"] for item in chunk])
+        except Exception as e:  # worker died / queue closed, fail this chunk only
+            return chunk, [e] * len(chunk)
+
+    tasks = set()
+    chunk = []
+    iterator = iter(images)
+
+    try:
+        while True:
+            with metrics.timed("input_read"):
+                item = await run_in_threadpool(next, iterator, None)
+            if item is not None:
+                name, ext, data = item
+                if isinstance(data, str) or ext not in image_ext or len(data) > BATCH_INGEST_MAX_FILE_BYTES:
+                    error = data if isinstance(data, str) else (
+                        "Only image files allowed" if ext not in image_ext else "File too large"
+                    )
+                    summary["failed"] += 1
+                    yield _line({"file": f"{name}{ext}", "error": error})
+                    continue
+
+                key = None
+                if RESULT_CACHE_ENABLED:
+                    key = await run_in_threadpool(result_cache.make_key, data)
+                    cached = await run_in_threadpool(result_cache.lookup, session, key)
+                    if cached:
+                        summary["cached"] += 1
+                        yield _line({
+                            "file": f"{name}{ext}",
+                            "id": cached.id,
+                            "download_url": cached.filepath,
+                            "num_detections": cached.num_detections,
+                            "cached": True,
+                        })
+                        continue
+
+                chunk.append({"name": name, "ext": ext, "bytes": data, "key": key})
+                if len(chunk) < chunk_size:
+                    continue
+
+            if chunk:
+                tasks.add(asyncio.create_task(run_chunk(chunk)))
+                chunk = []
+
+            # keep `inflight` chunks running, drain everything once the input is exhausted
+            while tasks and (len(tasks) >= inflight or item is None):
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    finished, results = task.result()
+                    for entry, meta in zip(finished, results):
+                        file = f"{entry['name']}{entry['ext']}"
+                        if isinstance(meta, Exception):
+                            summary["failed"] += 1
+                            yield _line({"file": file, "error": str(meta)})
+                            continue
+
+                        metrics.observe_inference(meta)
+                        image_name = unique_name(entry["name"])
+                        with metrics.timed("encode_write"):
+                            source_path = await run_in_threadpool(save_source, entry["bytes"], image_name, entry["ext"])
+                        record = make_record(meta, image_name, source_path)
+                        summary["processed"] += 1
+                        pending_rows.append((record, meta["boxes"], entry["key"], {
+                            "file": file,
+                            "download_url": record.filepath,
+                            "num_detections": meta["num_detections"],
+                            "classes_detected": meta["classes_detected"],
+                            "inference_time_ms": meta["inference_time_ms"],
+                            "cached": False,
+                        }))
+                    for line in await flush():
+                        yield line
+
+            if item is None:
+                break
+
+        yield _line(summary)
+    finally:
+        for task in tasks:
+            task.cancel()
+        session.close()
@@ -0,0 +1,113 @@
+import asyncio
+
+'''
+Dynamic micro-batching
+    1. Every call to model(img) pays a fixed overhead (pre/post processing, framework dispatch).
+    2. Under concurrent load we can pay that overhead once for many images instead.
+    3. The first request opens a batch window of max_wait_ms.
+    4. The batch is flushed as soon as it holds max_batch_size items or the window closes.
+    5. Each caller awaits its own future and only gets back its own result.
+    6. At most max_concurrency batches run at once (one per model worker).
+    7. At most max_queue items wait for a batch, after that submit() raises QueueFullError.
+'''
+
+class QueueFullError(Exception):
+    pass
+
+class MicroBatcher:
+    def __init__(
+        self,
+        run_batch,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10,
+        max_concurrency: int = 1,
+        max_queue: int = 0,
+    ):
+        # await run_batch(items) -> list of results (same order)
+        # A result can be an Exception, it is raised only for that one caller..!
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue  # 0 = unbounded
+        self._queue = None
+        self._slots = None
+        self._worker = None
+        self._inflight = set()
+
+    def _ensure_started(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._worker = asyncio.create_task(self._loop())
+
+    async def submit(self, item):
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((item, future))
+        except asyncio.QueueFull:
+            raise QueueFullError("Inference queue is full")
+        return await future
+
+    def full(self):
+        return self._queue is not None and self._queue.full()
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _loop(self):
+        while True:
+            # wait for a free worker first, so requests keep piling into the next batch meanwhile
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            task = asyncio.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch):
+        items = [item for item, _ in batch]
+        try:
+            results = await self.run_batch(items)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+
+        for (_, future), result in zip(batch, results):
+            if future.done():  # caller went away (client disconnected)
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
@@ -0,0 +1,116 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()  # Reads .env file
+
+BASE_DIR = os.path.dirname(
+    os.path.dirname(
+        os.path.dirname(os.path.abspath(__file__))
+    )
+)
+
+MODEL_PATH = os.path.join(BASE_DIR, "weights", "combined_best.pt")
+
+# STORAGE_DIR can point somewhere else (benchmarks run against a throw-away folder)
+STORAGE_DIR = os.getenv("STORAGE_DIR", os.path.join(BASE_DIR, "storage"))
+IMG_SAVE_DIR = os.path.join(STORAGE_DIR, "images")
+VID_SAVE_DIR = os.path.join(STORAGE_DIR, "videos")
+CACHE_DIR = os.path.join(STORAGE_DIR, "cache")
+UPLOAD_DIR = os.path.join(STORAGE_DIR, "uploads")
+THUMB_DIR = os.path.join(STORAGE_DIR, "thumbnails")
+VARIANT_DIR = os.path.join(STORAGE_DIR, "variants")
+
+# CPU inference backend: torch (eager PyTorch), onnx (ONNX Runtime) or openvino
+# (stub = deterministic fake model for benchmarks, see app/stub_model.py)
+# onnx / openvino weights are exported next to combined_best.pt on first use
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch").lower()
+
+# Inference parameters, part of the result cache key..!
+INFERENCE_IMGSZ = int(os.getenv("INFERENCE_IMGSZ", "640"))
+INFERENCE_CONF = float(os.getenv("INFERENCE_CONF", "0.25"))
+INFERENCE_IOU = float(os.getenv("INFERENCE_IOU", "0.7"))
+
+# Dummy passes run on each loaded model before it reports ready
+WARMUP_RUNS = int(os.getenv("WARMUP_RUNS", "2"))
+
+# Micro-batching for /detect-image..!
+# Concurrent requests are grouped into one model call of at most BATCH_MAX_SIZE images.
+# The first request in a batch waits at most BATCH_MAX_WAIT_MS for others to join.
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "10"))
+
+# Model worker processes, each one loads the weights once (0 = run inside the API process)
+MODEL_WORKERS = int(os.getenv("MODEL_WORKERS", "2"))
+# torch intra-op threads per worker, default splits the cores between the workers
+TORCH_THREADS_PER_WORKER = int(os.getenv(
+    "TORCH_THREADS_PER_WORKER",
+    str(max(1, (os.cpu_count() or 1) // max(1, MODEL_WORKERS))),
+))
+# Images allowed to wait for a worker, above this /detect-image answers 503
+INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", "64"))
+
+# /detect-video: run the detector on every VIDEO_FRAME_STRIDE-th frame (skipped frames reuse the last boxes)
+VIDEO_FRAME_STRIDE = int(os.getenv("VIDEO_FRAME_STRIDE", "1"))
+VIDEO_BATCH_SIZE = int(os.getenv("VIDEO_BATCH_SIZE", str(BATCH_MAX_SIZE)))
+# Frames buffered between decode -> inference -> encode, this bounds the memory per video
+VIDEO_QUEUE_FRAMES = int(os.getenv("VIDEO_QUEUE_FRAMES", "32"))
+# VIDEO_MODE=track: detector on adaptive keyframes only, boxes follow the objects in between (app/tracking.py)
+VIDEO_MODE = os.getenv("VIDEO_MODE", "stride")
+VIDEO_TRACK_MAX_STRIDE = int(os.getenv("VIDEO_TRACK_MAX_STRIDE", "12"))
+# Mean gray level change (0-255) of a 64x36 thumbnail that counts as a scene cut -> new keyframe
+VIDEO_SCENE_THRESHOLD = float(os.getenv("VIDEO_SCENE_THRESHOLD", "25"))
+# Videos run on their own worker processes (a clip is one long task, it must not hold the image workers)
+VIDEO_WORKERS = int(os.getenv("VIDEO_WORKERS", "1"))
+# Videos running + waiting for a video worker, above this /detect-video answers 503 (jobs wait and retry)
+VIDEO_MAX_PENDING = int(os.getenv("VIDEO_MAX_PENDING", "4"))
+
+# Content-hash result cache: same image + same weights + same params -> no inference
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "1") == "1"
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Thumbnail widths served by /detections/{id}/thumbnail, ?w= is rounded up to one of these
+THUMBNAIL_WIDTHS = sorted(int(w) for w in os.getenv("THUMBNAIL_WIDTHS", "128,256,512").split(","))
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "80"))
+
+# /detect-batch limits (a ZIP is read member by member, each member is capped)
+BATCH_INGEST_MAX_FILES = int(os.getenv("BATCH_INGEST_MAX_FILES", "10000"))
+BATCH_INGEST_MAX_FILE_BYTES = int(os.getenv("BATCH_INGEST_MAX_FILE_BYTES", str(50 * 1024 * 1024)))
+# Detections rows per INSERT + commit
+BATCH_DB_CHUNK = int(os.getenv("BATCH_DB_CHUNK", "200"))
+
+# Async job queue (POST /jobs/detect)
+# JOB_WORKER_IN_API=0 -> the API only queues jobs, run `python -m app.jobs` next to it to process them
+JOB_WORKER_IN_API = os.getenv("JOB_WORKER_IN_API", "1") == "1"
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", str(max(2, 2 * MODEL_WORKERS))))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+# a running job not finished after this long is assumed lost (worker killed) and queued again
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "3600"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# inference queue full: the job waits this long (plus jitter) and goes back to the queue, no attempt used
+JOB_BUSY_DELAY = float(os.getenv("JOB_BUSY_DELAY", "2.0"))
+
+# /ws/detect: frames bigger than this are dropped (binary JPEG per message)
+LIVE_MAX_FRAME_BYTES = int(os.getenv("LIVE_MAX_FRAME_BYTES", str(4 * 1024 * 1024)))
+
+# Upload limits (request body size, checked while it is received, see app/uploads.py)
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+VIDEO_UPLOAD_MAX_BYTES = int(os.getenv("VIDEO_UPLOAD_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+BATCH_UPLOAD_MAX_BYTES = int(os.getenv("BATCH_UPLOAD_MAX_BYTES", str(1024 * 1024 * 1024)))
+# Uploaded file parts up to this size stay in memory, Starlette spools bigger ones to a temp file (memory-mapped)
+UPLOAD_SPOOL_MEMORY_BYTES = int(os.getenv("UPLOAD_SPOOL_MEMORY_BYTES", str(1024 * 1024)))
+
+# Write-behind for stored uploads / annotated images (see app/write_behind.py)
+# the request only queues the bytes, writer threads put them on disk, reads before that come from memory
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "1") == "1"
+WRITE_BEHIND_WORKERS = int(os.getenv("WRITE_BEHIND_WORKERS", "2"))
+# bytes waiting in memory, above this the request writes the file itself (back-pressure, memory stays bounded)
+WRITE_BEHIND_MAX_BYTES = int(os.getenv("WRITE_BEHIND_MAX_BYTES", str(64 * 1024 * 1024)))
+# always = fsync file + folder before the row is marked available, never = leave it to the OS
+WRITE_FSYNC = os.getenv("WRITE_FSYNC", "always").lower()
+# JPEG quality of the annotated *_result.jpg images
+RESULT_JPEG_QUALITY = int(os.getenv("RESULT_JPEG_QUALITY", "90"))
+# Encoded variants of the results (see app/encodings.py), quality per tier: high,medium,low
+RESULT_JPEG_TIERS = os.getenv("RESULT_JPEG_TIERS", f"{RESULT_JPEG_QUALITY},75,50")
+RESULT_WEBP_TIERS = os.getenv("RESULT_WEBP_TIERS", "90,80,60")
+RESULT_AVIF_TIERS = os.getenv("RESULT_AVIF_TIERS", "80,60,40")
+RESULT_DEFAULT_TIER = os.getenv("RESULT_DEFAULT_TIER", "high")
@@ -0,0 +1,212 @@
+import cv2, numpy as np, os
+import time, logging
+from app.config import INFERENCE_IMGSZ, INFERENCE_CONF, INFERENCE_IOU, INFERENCE_BACKEND
+from app.preprocess import decode_for_inference, decode_full, letterbox, map_boxes
+
+'''
+Pure detection helpers, no FastAPI / database imports here..!
+This module is imported inside the model worker processes, so it has to stay light.
+'''
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_PARAMS = {"imgsz": INFERENCE_IMGSZ, "conf": INFERENCE_CONF, "iou": INFERENCE_IOU}
+
+'''
+Inference backends
+    - torch    : combined_best.pt, eager PyTorch
+    - onnx     : combined_best.onnx, ONNX Runtime CPU
+    - openvino : combined_best_openvino_model/, OpenVINO CPU
+    - onnx-int8: combined_best.int8.onnx, ONNX Runtime CPU, made by `python -m app.quantize`
+                 only served when its accuracy report passed, otherwise falls back to onnx
+    - stub     : deterministic stand-in model (app/stub_model.py), no weights needed, for benchmarks
+    ultralytics wraps all three behind the same YOLO object, so results / boxes
+    keep exactly the same format whatever backend is selected..!
+    The overlay is not results.plot() (it is rendered later, from the stored boxes): draw_boxes()
+    copies its style (Ultralytics palette, line width, filled label tag with white text).
+'''
+
+BACKENDS = ("torch", "onnx", "openvino", "onnx-int8", "stub")
+
+def resolve_weights(model_path: str, backend: str = INFERENCE_BACKEND):
+    # Returns the weights for this backend, exporting them from the .pt when missing or outdated
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+    if backend in ("torch", "stub"):
+        return model_path
+    if backend == "onnx-int8":
+        return _resolve_int8(model_path)
+
+    stem = os.path.splitext(model_path)[0]
+    target = f"{stem}.onnx" if backend == "onnx" else f"{stem}_openvino_model"
+    if not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(model_path):
+        from ultralytics import YOLO
+        # dynamic shapes, so the micro-batches keep working
+        target = YOLO(model_path).export(format=backend, imgsz=INFERENCE_IMGSZ, dynamic=True)
+    return target
+
+def int8_paths(model_path: str):
+    stem = os.path.splitext(model_path)[0]
+    return f"{stem}.int8.onnx", f"{stem}.int8.json"
+
+def file_sha256(path):
+    import hashlib
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _resolve_int8(model_path: str):
+    # Guardrail: the INT8 model serves only if its accuracy report approved it for these weights
+    import json
+    int8_path, report_path = int8_paths(model_path)
+    reason = None
+    if not os.path.exists(int8_path) or not os.path.exists(report_path):
+        reason = "not built, run `python -m app.quantize`"
+    elif os.path.getmtime(int8_path) < os.path.getmtime(model_path):
+        reason = "older than the .pt weights, re-run `python -m app.quantize`"
+    else:
+        with open(report_path) as f:
+            report = json.load(f)
+        if not report.get("approved"):
+            reason = f'accuracy check failed (mAP50 vs FP32 = {report.get("map50_vs_fp32")})'
+        elif report.get("sha256") != file_sha256(int8_path):
+            reason = "the report is for another build, re-run `python -m app.quantize`"
+    if reason:
+        logger.warning("INT8 model not served: %s. Falling back to FP32 onnx.", reason)
+        return resolve_weights(model_path, "onnx")
+    return int8_path
+
+def box_iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+def load_model(model_path: str, backend: str = INFERENCE_BACKEND):
+    if backend == "stub":
+        from app.stub_model import StubModel
+        return StubModel()
+    from ultralytics import YOLO
+    return YOLO(resolve_weights(model_path, backend), task="detect")
+
+def decode_image(image_bytes):
+    np_arr = np.frombuffer(image_bytes, np.uint8)
+    return cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+
+def extract_boxes(result, names):
+    # Raw boxes as plain python values, cheap to pickle between processes
+    boxes = result.boxes
+    return [
+        {
+            "cls": int(cls),
+            "name": names[int(cls)],
+            "conf": float(conf),
+            "xyxy": [float(v) for v in xyxy],
+        }
+        for cls, conf, xyxy in zip(boxes.cls, boxes.conf, boxes.xyxy)
+    ]
+
+# ultralytics.utils.plotting.colors, BGR
+_PALETTE = [(56, 56, 255), (151, 157, 255), (31, 112, 255), (29, 178, 255), (49, 210, 207),
+            (10, 249, 72), (23, 204, 146), (134, 219, 61), (52, 147, 26), (187, 212, 0),
+            (168, 153, 44), (255, 194, 0), (147, 69, 52), (255, 115, 100), (236, 24, 0),
+            (255, 56, 132), (133, 0, 82), (255, 56, 203), (200, 149, 255), (199, 55, 255)]
+
+def draw_boxes(img, boxes):
+    # Same look as ultralytics results.plot() (Annotator.box_label), used for images and video frames
+    lw = max(round(sum(img.shape) / 2 * 0.003), 2)
+    tf, sf = max(lw - 1, 1), lw / 3
+    for box in boxes:
+        x1, y1, x2, y2 = [int(v) for v in box["xyxy"]]
+        color = _PALETTE[box["cls"] % len(_PALETTE)]
+        label = f'{box["name"]} {box["conf"]:.2f}'
+        cv2.rectangle(img, (x1, y1), (x2, y2), color, thickness=lw, lineType=cv2.LINE_AA)
+        w, h = cv2.getTextSize(label, 0, fontScale=sf, thickness=tf)[0]
+        outside = y1 >= h + 3  # label tag above the box, inside it when there is no room
+        tag_y = y1 - h - 3 if outside else y1 + h + 3
+        cv2.rectangle(img, (x1, y1), (x1 + w, tag_y), color, -1, cv2.LINE_AA)
+        text_y = y1 - 2 if outside else y1 + h + 2
+        cv2.putText(img, label, (x1, text_y), 0, sf, (255, 255, 255), thickness=tf, lineType=cv2.LINE_AA)
+    return img
+
+def detect_images(model, images_bytes):
+    # One model call for the whole batch, results come back in the same order..!
+    # Only boxes / classes / scores come back, the overlay is rendered later when someone looks at it
+    # Every phase is timed with perf_counter, the timings go back with each result (see app/metrics.py)
+    start = time.perf_counter()
+    imgsz = INFERENCE_PARAMS["imgsz"]
+
+    decoded = []
+    for image_bytes in images_bytes:
+        t0 = time.perf_counter()
+        decoded.append(decode_for_inference(image_bytes, imgsz) + ((time.perf_counter() - t0) * 1000,))
+
+    t0 = time.perf_counter()
+    inputs = [letterbox(img, imgsz) for img, _, _, _ in decoded if img is not None]
+    letterbox_ms = (time.perf_counter() - t0) * 1000 / max(1, len(inputs))
+
+    valid = [tensor for tensor, _, _ in inputs]
+    t0 = time.perf_counter()
+    results = model(valid, **INFERENCE_PARAMS) if valid else []
+    model_ms = (time.perf_counter() - t0) * 1000 / max(1, len(valid))
+    results = iter(results)
+    inputs = iter(inputs)
+
+    outputs = []
+    for img, factor, size, decode_ms in decoded:
+        if img is None:
+            outputs.append(ValueError("Could not decode image"))
+            continue
+
+        result = next(results)
+        _, scale, pad = next(inputs)
+        t0 = time.perf_counter()
+        # boxes in original image coordinates, even when the image was decoded reduced
+        boxes = map_boxes(extract_boxes(result, model.names), scale, pad, factor, size)
+        boxes_ms = (time.perf_counter() - t0) * 1000
+
+        # ultralytics reports its own preprocess / inference / postprocess (NMS) split per image
+        speed = getattr(result, "speed", None) or {}
+        timings = {
+            "decode": decode_ms,
+            "preprocess": letterbox_ms + (speed.get("preprocess") or 0.0),
+            "forward": speed["inference"] if speed.get("inference") is not None else model_ms,
+            "nms": (speed.get("postprocess") or 0.0) + boxes_ms,
+        }
+
+        num_detections = len(boxes)
+        classes = [box["name"] for box in boxes]
+        confidence_avg = sum(box["conf"] for box in boxes) / num_detections if num_detections > 0 else 0.0
+
+        outputs.append({
+            "num_detections": num_detections,
+            "classes_detected": ",".join(classes),
+            "confidence_avg": confidence_avg,
+            "boxes": boxes,
+            "image_size": list(size),
+            "timings_ms": timings,
+        })
+
+    # every image waited for the whole batch, so that is its inference time
+    inference_time = (time.perf_counter() - start) * 1000
+    for output in outputs:
+        if not isinstance(output, Exception):
+            output["inference_time_ms"] = inference_time
+            output["batch_size"] = len(valid)
+    return outputs
+
+def detect_image(model, image_bytes):
+    output = detect_images(model, [image_bytes])[0]
+    if isinstance(output, Exception):
+        raise output
+    return output
+
+def render_annotated(image_bytes, boxes):
+    # Decode the stored upload at full resolution and draw the stored boxes (original pixel coordinates) on it
+    img = decode_full(image_bytes)
+    if img is None:
+        raise ValueError("Could not decode image")
+    return draw_boxes(img, boxes)
@@ -0,0 +1,130 @@
+import glob, os, time, uuid
+import cv2
+from app.config import (
+    VARIANT_DIR, RESULT_JPEG_TIERS, RESULT_WEBP_TIERS, RESULT_AVIF_TIERS, RESULT_DEFAULT_TIER,
+)
+
+'''
+Output encoding profiles for the annotated results
+    1. The annotated image is stored once as JPEG (RESULT_JPEG_QUALITY), clients that can take
+       a smaller format get an encoded variant of it instead.
+    2. Profile = format + quality tier:
+        - ?format=avif|webp|jpg, without it the format is picked from Accept:
+          highest q-value wins, ties go avif > webp > jpg, q=0 means never
+        - avif / webp only when Accept names them, image/* or */* alone keep the jpeg every client can show
+        - ?quality=high|medium|low (default RESULT_DEFAULT_TIER)
+        - AVIF only when this OpenCV build can write it
+    3. Each variant is encoded once and kept on disk: storage/variants/{result name}_{tier}.{fmt}
+       (the annotated file name is unique per upload, a row id is reused after a delete)
+    4. jpg + the tier that matches the stored file -> the stored file itself, no re-encode.
+    5. A variant older than its annotated image is rebuilt (same as the thumbnails).
+'''
+
+os.makedirs(VARIANT_DIR, exist_ok=True)
+
+AVIF_AVAILABLE = cv2.haveImageWriter("x.avif")
+TIERS = ("high", "medium", "low")
+
+def _tiers(value):
+    return dict(zip(TIERS, (int(q) for q in value.split(","))))
+
+FORMATS = {
+    "jpg": ("image/jpeg", cv2.IMWRITE_JPEG_QUALITY, _tiers(RESULT_JPEG_TIERS)),
+    "webp": ("image/webp", cv2.IMWRITE_WEBP_QUALITY, _tiers(RESULT_WEBP_TIERS)),
+}
+if AVIF_AVAILABLE:
+    FORMATS["avif"] = ("image/avif", cv2.IMWRITE_AVIF_QUALITY, _tiers(RESULT_AVIF_TIERS))
+
+def parse_accept(accept_header):
+    # {media range: q}, e.g. "image/avif;q=0, image/*;q=0.8" -> {"image/avif": 0.0, "image/*": 0.8}
+    ranges = {}
+    for part in (accept_header or "").split(","):
+        media, *params = [p.strip() for p in part.split(";")]
+        if not media:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = min(1.0, max(0.0, float(value)))
+                except ValueError:
+                    q = 0.0  # broken q -> treat the range as refused
+        ranges[media.lower()] = q
+    return ranges
+
+def pick_accepted(accept_header, candidates, default="jpg", default_type="image/jpeg"):
+    # candidates = [(fmt, media type)] best first, only used when named in Accept
+    ranges = parse_accept(accept_header)
+    if not ranges:
+        return default
+    scores = {fmt: ranges.get(mime, 0.0) for fmt, mime in candidates}
+    # the default also matches through image/* and */*, the most specific range counts
+    for media in (default_type, default_type.split("/")[0] + "/*", "*/*"):
+        if media in ranges:
+            scores[default] = ranges[media]
+            break
+    best = max(scores, key=scores.get)  # ties -> the earlier candidate
+    return best if scores[best] > 0 else default
+
+def pick_profile(accept_header, fmt=None, tier=None):
+    # (format, tier), an explicit ?format= wins over Accept
+    tier = tier or RESULT_DEFAULT_TIER
+    if tier not in TIERS:
+        raise ValueError(f"quality must be one of {', '.join(TIERS)}")
+    if fmt:
+        fmt = "jpg" if fmt == "jpeg" else fmt
+        if fmt not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+        return fmt, tier
+
+    candidates = [(name, FORMATS[name][0]) for name in ("avif", "webp") if name in FORMATS]
+    return pick_accepted(accept_header, candidates), tier
+
+def media_type(fmt):
+    return FORMATS[fmt][0]
+
+def encode_params(fmt, tier):
+    _, flag, qualities = FORMATS[fmt]
+    return [flag, qualities[tier]]
+
+def encode(img, fmt, tier):
+    # (bytes, encode time in ms), also used by the benchmark
+    t0 = time.perf_counter()
+    ok, buffer = cv2.imencode(f".{fmt}", img, encode_params(fmt, tier))
+    if not ok:
+        raise ValueError(f"Could not encode {fmt}")
+    return buffer.tobytes(), (time.perf_counter() - t0) * 1000
+
+def is_stored_profile(fmt, tier, stored_quality):
+    return fmt == "jpg" and FORMATS["jpg"][2][tier] == stored_quality
+
+def _stem(annotated_path):
+    return os.path.splitext(os.path.basename(annotated_path))[0]
+
+def variant_path(annotated_path, fmt, tier):
+    return os.path.join(VARIANT_DIR, f"{_stem(annotated_path)}_{tier}.{fmt}")
+
+def ensure_variant(annotated_path, fmt, tier):
+    # Returns the variant path, encoding it from the annotated image if missing or stale
+    path = variant_path(annotated_path, fmt, tier)
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(annotated_path):
+        return path
+
+    img = cv2.imread(annotated_path, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Annotated image could not be decoded")
+
+    data, _ = encode(img, fmt, tier)
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return path
+
+def remove_variants(annotated_path):
+    for path in glob.glob(os.path.join(VARIANT_DIR, f"{glob.escape(_stem(annotated_path))}_*")):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
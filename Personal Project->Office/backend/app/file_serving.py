@@ -0,0 +1,141 @@
+import hashlib, os
+from collections import OrderedDict
+from email.utils import formatdate
+from urllib.parse import quote
+import anyio
+from fastapi import Request
+from fastapi.responses import Response
+
+'''
+Result file serving
+    1. Strong ETag = hash of the file content (cached per path + mtime + size, the file is hashed once).
+    2. If-None-Match with the same ETag -> 304, no body is sent again.
+    3. Range: bytes=a-b -> 206 with only that part (resumable downloads, video seeking).
+    4. Cache-Control: private, no-cache (browser keeps it, but revalidates with the ETag -> 304)
+       results are rendered lazily and the format depends on Accept, so no URL is content addressed.
+    5. When the ASGI server supports the zerocopy extension the file goes out with sendfile(),
+       otherwise it is streamed in chunks from a worker thread.
+'''
+
+REVALIDATE = "private, no-cache"
+
+_etags = OrderedDict()
+_ETAG_CACHE_SIZE = 4096
+
+def content_etag(path, st=None):
+    st = st or os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _etags.get(path)
+    if cached and cached[0] == stamp:
+        _etags.move_to_end(path)
+        return cached[1]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    etag = f'"{digest.hexdigest()[:32]}"'
+
+    _etags[path] = (stamp, etag)
+    if len(_etags) > _ETAG_CACHE_SIZE:
+        _etags.popitem(last=False)
+    return etag
+
+def _etag_matches(header, etag):
+    if header.strip() == "*":
+        return True
+    return etag in [tag.strip().removeprefix("W/") for tag in header.split(",")]
+
+def _parse_range(header, size):
+    # single "bytes=start-end" / "bytes=start-" / "bytes=-suffix" range, None if not satisfiable
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    start, _, end = spec.strip().partition("-")
+    try:
+        if start == "":
+            length = int(end)
+            if length <= 0:
+                return None
+            return max(0, size - length), size - 1
+        start = int(start)
+        end = int(end) if end else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
+
+class SendfileResponse(Response):
+    chunk_size = 256 * 1024
+
+    def __init__(self, path, status_code=200, headers=None, media_type=None, offset=0, count=0):
+        self.path = path
+        self.status_code = status_code
+        self.media_type = media_type
+        self.offset = offset
+        self.count = count
+        self.background = None
+        self.init_headers(headers)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"] == "HEAD" or self.count == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if "http.response.zerocopy" in scope.get("extensions", {}):
+            with open(self.path, "rb") as f:
+                await send({
+                    "type": "http.response.zerocopy",
+                    "file": f,
+                    "offset": self.offset,
+                    "count": self.count,
+                    "more_body": False,
+                })
+            return
+
+        async with await anyio.open_file(self.path, "rb") as f:
+            await f.seek(self.offset)
+            remaining = self.count
+            while remaining > 0:
+                chunk = await f.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:  # file shrank while sending
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+def serve_file(request: Request, path: str, media_type: str, filename: str | None = None):
+    st = os.stat(path)
+    size = st.st_size
+    etag = content_etag(path, st)
+
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": REVALIDATE,
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    if filename:
+        headers["Content-Disposition"] = f"attachment; filename*=utf-8''{quote(filename)}"
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() == etag):
+        byte_range = _parse_range(range_header, size)
+        if byte_range is None:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return SendfileResponse(path, 206, headers, media_type, offset=start, count=end - start + 1)
+
+    headers["Content-Length"] = str(size)
+    return SendfileResponse(path, 200, headers, media_type, offset=0, count=size)
@@ -0,0 +1,326 @@
+import asyncio, json, logging, os, random, socket, time
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from sqlmodel import Session, select, func
+from app.database import engine, create_tables_database
+from app.models.product_model import Detections, VideoDetections, DetectJobs
+from app import result_cache, analytics, metrics
+from app.annotations import box_rows
+from app.batch_ingest import make_record
+from app.batching import QueueFullError
+from app.config import (
+    MODEL_PATH, VID_SAVE_DIR, INFERENCE_BACKEND, RESULT_CACHE_ENABLED,
+    BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, MODEL_WORKERS, TORCH_THREADS_PER_WORKER, INFERENCE_QUEUE_SIZE, WARMUP_RUNS,
+    VIDEO_FRAME_STRIDE, VIDEO_BATCH_SIZE, VIDEO_QUEUE_FRAMES,
+    VIDEO_MODE, VIDEO_TRACK_MAX_STRIDE, VIDEO_SCENE_THRESHOLD, VIDEO_WORKERS, VIDEO_MAX_PENDING,
+    JOB_CONCURRENCY, JOB_POLL_INTERVAL, JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS, JOB_BUSY_DELAY,
+)
+
+'''
+Asynchronous detection jobs
+    1. POST /jobs/detect stores the upload, inserts a DetectJobs row (status=queued) and returns its id.
+    2. Job workers poll the table and claim one job at a time with a compare-and-set UPDATE
+       (... WHERE id = ? AND status = 'queued'), so any number of API / worker processes can share the queue.
+    3. The worker runs the job (same batching, cache and records as /detect-image, /detect-video)
+       and writes the result back, GET /jobs/{id} just reads the row.
+    4. Jobs stuck in "running" longer than JOB_LEASE_SECONDS (killed worker) are queued again,
+       up to JOB_MAX_ATTEMPTS, bad input (ValueError) fails at once.
+       A full inference queue is not the job's fault: it waits JOB_BUSY_DELAY and is queued again
+       without using an attempt.
+    5. Run a separate worker with:  python -m app.jobs
+'''
+
+logger = logging.getLogger(__name__)
+
+def enqueue(session, kind, name, ext, input_path, params=None):
+    job = DetectJobs(kind=kind, name=name, ext=ext, input_path=input_path, params_json=json.dumps(params or {}))
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    return job
+
+def job_to_dict(session, job):
+    body = {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "attempts": job.attempts,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+    if job.status == "queued":
+        body["queue_position"] = session.exec(
+            select(func.count(DetectJobs.id)).where(DetectJobs.status == "queued", DetectJobs.id < job.id)
+        ).one()
+    if job.result_json:
+        body["result"] = json.loads(job.result_json)
+    if job.error:
+        body["error"] = job.error
+    return body
+
+def claim(worker_id):
+    # two workers may pick the same candidate, only one UPDATE matches status = 'queued'
+    with Session(engine) as session:
+        for _ in range(5):
+            job_id = session.exec(
+                select(DetectJobs.id).where(DetectJobs.status == "queued").order_by(DetectJobs.id).limit(1)
+            ).first()
+            if job_id is None:
+                return None
+            result = session.exec(
+                update(DetectJobs)
+                .where(DetectJobs.id == job_id, DetectJobs.status == "queued")
+                .values(status="running", worker_id=worker_id, started_at=datetime.utcnow(), attempts=DetectJobs.attempts + 1)
+            )
+            session.commit()
+            if result.rowcount == 1:
+                job = session.get(DetectJobs, job_id)
+                session.expunge(job)
+                return job
+    return None
+
+def requeue_stale():
+    lease_start = datetime.utcnow() - timedelta(seconds=JOB_LEASE_SECONDS)
+    stale = (DetectJobs.status == "running", DetectJobs.started_at < lease_start)
+    with Session(engine) as session:
+        session.exec(
+            update(DetectJobs).where(*stale, DetectJobs.attempts >= JOB_MAX_ATTEMPTS)
+            .values(status="failed", error="Worker lost too many times", finished_at=datetime.utcnow())
+        )
+        session.exec(update(DetectJobs).where(*stale).values(status="queued", worker_id=None))
+        session.commit()
+
+def release(worker_id):
+    # worker shutting down: its unfinished jobs go back to the queue right away
+    with Session(engine) as session:
+        session.exec(
+            update(DetectJobs).where(DetectJobs.status == "running", DetectJobs.worker_id == worker_id)
+            .values(status="queued", worker_id=None, attempts=DetectJobs.attempts - 1)
+        )
+        session.commit()
+
+def postpone(job_id):
+    # back to the queue, the attempt claim() counted does not count
+    with Session(engine) as session:
+        session.exec(
+            update(DetectJobs).where(DetectJobs.id == job_id, DetectJobs.status == "running")
+            .values(status="queued", worker_id=None, attempts=DetectJobs.attempts - 1)
+        )
+        session.commit()
+
+def finish(job_id, status, result=None, error=None):
+    with Session(engine) as session:
+        job = session.get(DetectJobs, job_id)
+        job.status = status
+        job.result_json = json.dumps(result, default=str) if result is not None else None
+        job.error = error
+        job.finished_at = datetime.utcnow() if status in ("done", "failed") else None
+        session.add(job)
+        session.commit()
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def _remove(path):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+async def _detect_image(job, infer_image):
+    with metrics.timed("input_read"):
+        image_bytes = await asyncio.to_thread(_read, job.input_path)
+
+    cache_key = None
+    if RESULT_CACHE_ENABLED:
+        cache_key = await asyncio.to_thread(result_cache.make_key, image_bytes)
+
+        def lookup():
+            with Session(engine) as session:
+                cached = result_cache.lookup(session, cache_key)
+                return cached and {
+                    "detection_id": cached.id,
+                    "download_url": cached.filepath,
+                    "num_detections": cached.num_detections,
+                    "cached": True,
+                }
+
+        cached = await asyncio.to_thread(lookup)
+        if cached:
+            await asyncio.to_thread(_remove, job.input_path)
+            return cached
+
+    submitted = time.perf_counter()
+    meta = await infer_image(image_bytes)
+    if isinstance(meta, Exception):
+        raise meta
+    metrics.observe_inference(meta, time.perf_counter() - submitted)
+
+    def write():
+        # the stored upload becomes the source image of the record, no copy
+        with Session(engine) as session:
+            record = make_record(meta, job.name, job.input_path)
+            session.add(record)
+            session.flush()
+            session.add_all(box_rows(record.id, meta["boxes"]))
+            analytics.record(session, [(record, meta["boxes"])])
+            session.commit()
+            session.refresh(record)
+            if cache_key:
+                result_cache.store(session, cache_key, record)
+            return record.id, record.filepath
+
+    with metrics.timed("db_commit"):
+        detection_id, file_path = await asyncio.to_thread(write)
+    return {
+        "detection_id": detection_id,
+        "download_url": file_path,
+        "num_detections": meta["num_detections"],
+        "classes_detected": meta["classes_detected"],
+        "inference_time_ms": meta["inference_time_ms"],
+        "cached": False,
+    }
+
+async def _detect_video(job, pool):
+    params = json.loads(job.params_json or "{}")
+    object_name = f"{job.name}_result.mp4"
+    file_path = os.path.join(VID_SAVE_DIR, object_name)
+
+    stats = await pool.run_video(
+        job.input_path, file_path,
+        frame_stride=params.get("frame_stride", VIDEO_FRAME_STRIDE),
+        batch_size=VIDEO_BATCH_SIZE,
+        queue_frames=VIDEO_QUEUE_FRAMES,
+        mode=params.get("mode", VIDEO_MODE),
+        max_stride=VIDEO_TRACK_MAX_STRIDE,
+        scene_threshold=VIDEO_SCENE_THRESHOLD,
+    )
+
+    def write():
+        with Session(engine) as session:
+            record = VideoDetections(
+                filename=object_name,
+                filepath=file_path,
+                fps=stats["fps"],
+                frame_stride=stats["frame_stride"],
+                frames_total=stats["frames_total"],
+                frames_processed=stats["frames_processed"],
+                processing_time_ms=stats["processing_time_ms"],
+                inference_time_ms=stats["inference_time_ms"],
+                num_detections=stats["num_detections"],
+                max_detections_per_frame=stats["max_detections_per_frame"],
+                classes_detected=stats["classes_detected"],
+                confidence_avg=stats["confidence_avg"],
+            )
+            session.add(record)
+            session.commit()
+            session.refresh(record)
+            return record.id
+
+    video_id = await asyncio.to_thread(write)
+    await asyncio.to_thread(_remove, job.input_path)
+    return {
+        "video_id": video_id,
+        "download_url": file_path,
+        "frames_total": stats["frames_total"],
+        "frames_processed": stats["frames_processed"],
+        "num_detections": stats["num_detections"],
+        "class_counts": stats["class_counts"],
+    }
+
+async def run_job(job, pool, infer_image):
+    try:
+        if job.kind == "video":
+            result = await _detect_video(job, pool)
+        else:
+            result = await _detect_image(job, infer_image)
+    except asyncio.CancelledError:
+        raise  # shutdown, release() puts it back in the queue
+    except QueueFullError:
+        # keep the slot while waiting, this worker should not claim more work when the model is busy
+        await asyncio.sleep(JOB_BUSY_DELAY * (1 + random.random()))
+        await asyncio.to_thread(postpone, job.id)
+        return
+    except Exception as e:
+        retry = not isinstance(e, ValueError) and job.attempts < JOB_MAX_ATTEMPTS
+        if retry:
+            await asyncio.to_thread(finish, job.id, "queued", error=str(e))
+        else:
+            await asyncio.to_thread(finish, job.id, "failed", error=str(e))
+            await asyncio.to_thread(_remove, job.input_path)
+        return
+    await asyncio.to_thread(finish, job.id, "done", result)
+
+async def run_worker(pool, infer_image, stop=None, concurrency=JOB_CONCURRENCY, poll_interval=JOB_POLL_INTERVAL):
+    # infer_image(bytes) -> meta, normally a MicroBatcher.submit so concurrent image jobs share model calls
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    stop = stop or asyncio.Event()
+    slots = asyncio.Semaphore(max(1, concurrency))
+    running = set()
+
+    try:
+        while not stop.is_set():
+            await slots.acquire()
+            job = await asyncio.to_thread(claim, worker_id)
+            if job is None:
+                slots.release()
+                await asyncio.to_thread(requeue_stale)
+                try:
+                    await asyncio.wait_for(stop.wait(), poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            task = asyncio.create_task(run_job(job, pool, infer_image))
+            running.add(task)
+            task.add_done_callback(running.discard)
+            task.add_done_callback(lambda _: slots.release())
+    finally:
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        await asyncio.to_thread(release, worker_id)
+
+def main():
+    from app.model_workers import ModelWorkerPool
+    from app.batching import MicroBatcher
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    create_tables_database()
+    analytics.start_backfill()  # this worker's inserts must not be counted twice by the API's backfill
+    pool = ModelWorkerPool(
+        MODEL_PATH,
+        backend=INFERENCE_BACKEND,
+        workers=MODEL_WORKERS,
+        torch_threads=TORCH_THREADS_PER_WORKER,
+        warmup_runs=WARMUP_RUNS,
+        video_workers=VIDEO_WORKERS,
+        video_max_pending=VIDEO_MAX_PENDING,
+    )
+    batcher = MicroBatcher(
+        pool.run_batch,
+        max_batch_size=BATCH_MAX_SIZE,
+        max_wait_ms=BATCH_MAX_WAIT_MS,
+        max_concurrency=max(1, MODEL_WORKERS),
+        max_queue=INFERENCE_QUEUE_SIZE,
+    )
+
+    async def serve():
+        await pool.warm_up()
+        if pool.status != "ready":
+            raise SystemExit(f"Model failed to load: {pool.error}")
+        logger.info("Job worker ready, waiting for jobs...")
+        try:
+            await run_worker(pool, batcher.submit)
+        finally:
+            await batcher.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import asyncio, time
+from fastapi import WebSocket
+from sqlmodel import Session, select
+from app.auth import verify_token
+from app.batching import QueueFullError
+from app.database import engine
+from app.models.user_model import User
+from app import metrics
+
+'''
+Live detection over a WebSocket (same accept / receive loop as Knowing FastAPI/17_WebSockets)
+    1. The client sends binary JPEG frames, the server answers one compact JSON per processed frame:
+        {"seq": 12, "boxes": [["person", 0.91, x1, y1, x2, y2], ...], "dropped": 3, "latency_ms": 41.2, ...}
+    2. Receiving and inference run as two tasks. The receiver only keeps the NEWEST frame (one slot),
+       a frame that is replaced before inference picked it up is dropped and counted.
+    3. So when inference is slower than the camera, the server skips frames instead of queueing them:
+       the answer is always about a recent frame and the latency stays bounded.
+    4. Browsers can't set an Authorization header on a WebSocket, the JWT comes as ?token=...
+'''
+
+def user_from_token(token):
+    payload = verify_token(token) if token else None
+    if not payload or not payload.get("sub"):
+        return None
+    with Session(engine) as session:
+        return session.exec(select(User).where(User.email == payload["sub"])).first()
+
+def compact_boxes(boxes):
+    return [
+        [b["name"], round(b["conf"], 3)] + [round(v, 1) for v in b["xyxy"]]
+        for b in boxes
+    ]
+
+async def live_session(websocket: WebSocket, infer, max_frame_bytes: int):
+    # infer(frame bytes) -> meta, normally MicroBatcher.submit (live frames share the model workers)
+    latest = {"frame": None, "seq": 0, "received_at": 0.0}
+    stats = {"received": 0, "processed": 0, "dropped": 0}
+    new_frame = asyncio.Event()
+    closed = asyncio.Event()
+
+    async def receive():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                frame = message.get("bytes")
+                if not frame:
+                    continue  # text messages are ignored
+                stats["received"] += 1
+                if len(frame) > max_frame_bytes:
+                    stats["dropped"] += 1
+                    continue
+                if latest["frame"] is not None:
+                    stats["dropped"] += 1  # the previous frame never reached the model, replace it
+                latest.update(frame=frame, seq=stats["received"], received_at=time.perf_counter())
+                new_frame.set()
+        finally:
+            closed.set()
+            new_frame.set()
+
+    receiver = asyncio.create_task(receive())
+    try:
+        while True:
+            await new_frame.wait()
+            new_frame.clear()
+            if closed.is_set():
+                break
+
+            frame, seq, received_at = latest["frame"], latest["seq"], latest["received_at"]
+            latest["frame"] = None
+            if frame is None:
+                continue
+
+            try:
+                submitted = time.perf_counter()
+                meta = await infer(frame)
+                metrics.observe_inference(meta, time.perf_counter() - submitted)
+            except QueueFullError:
+                stats["dropped"] += 1
+                await websocket.send_json({"seq": seq, "error": "Server busy, frame dropped"})
+                continue
+            except ValueError as e:
+                await websocket.send_json({"seq": seq, "error": str(e)})
+                continue
+
+            stats["processed"] += 1
+            await websocket.send_json({
+                "seq": seq,
+                "boxes": compact_boxes(meta["boxes"]),
+                "image_size": meta["image_size"],
+                "inference_ms": round(meta["inference_time_ms"], 1),
+                "latency_ms": round((time.perf_counter() - received_at) * 1000, 1),
+                "dropped": stats["dropped"],
+            })
+    finally:
+        receiver.cancel()
+        await asyncio.gather(receiver, return_exceptions=True)
+    return stats
@@ -1,20 +1,85 @@
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, Response
 from contextlib import asynccontextmanager
-from app.database import create_tables_database
+import asyncio
+from sqlmodel import Session
+from app.database import create_tables_database, engine
+from app import result_cache, reaper, jobs, analytics, metrics
+from starlette.formparsers import MultiPartParser
+from app.config import JOB_WORKER_IN_API, UPLOAD_MAX_BYTES, VIDEO_UPLOAD_MAX_BYTES, BATCH_UPLOAD_MAX_BYTES, UPLOAD_SPOOL_MEMORY_BYTES
+from app.uploads import BodyLimitMiddleware
+from app.write_behind import writer
+import threading
 from app.routes.user_routes import router as user_router
-from app.routes.product_routes import router as product_router
+from app.routes.product_routes import router as product_router, batcher, model_pool
 from app.routes import user_routes
 
 # This is an Event Handler..!
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     create_tables_database()
+    # cached results made with older weights are useless now
+    with Session(engine) as session:
+        result_cache.purge_stale(session)
+    # bulk deletes cut short by a restart still have files queued
+    threading.Thread(target=reaper.resume_pending, daemon=True).start()
+    # history from before the analytics rollups existed is rolled up once (watermark taken before serving)
+    analytics.start_backfill()
+    threading.Thread(target=analytics.backfill, daemon=True).start()
+    # load + warm up the model workers in the background, /ready tells when it is done
+    warmup = asyncio.create_task(model_pool.warm_up())
+    # queued /jobs/detect jobs are processed here unless separate workers run them (python -m app.jobs)
+    jobs_stop = asyncio.Event()
+    job_worker = asyncio.create_task(jobs.run_worker(model_pool, batcher.submit, stop=jobs_stop)) if JOB_WORKER_IN_API else None
     yield # app runs here
+    jobs_stop.set()
+    if job_worker:
+        job_worker.cancel()
+        await asyncio.gather(job_worker, return_exceptions=True)
+    warmup.cancel()
+    await batcher.stop()
+    model_pool.shutdown()
+    # everything still in the write-behind queue goes to disk before exit
+    await asyncio.to_thread(writer.stop)
  
 # Initialising FastAPI with lifespan constructor..!
 app = FastAPI(lifespan=lifespan)
 
+# request bodies are counted while they arrive, too big -> 413 before the rest is read (see app/uploads.py)
+app.add_middleware(
+    BodyLimitMiddleware,
+    default_max=UPLOAD_MAX_BYTES,
+    limits={
+        "/detect-video": VIDEO_UPLOAD_MAX_BYTES,
+        "/jobs/detect": VIDEO_UPLOAD_MAX_BYTES,
+        "/detect-batch": BATCH_UPLOAD_MAX_BYTES,
+    },
+    # single image uploads: not an image (magic bytes) -> 415 as soon as the file part starts
+    sniff_paths=("/detect-image",),
+)
+
+# file parts bigger than this go to Starlette's temp file, read_upload() maps it instead of copying
+MultiPartParser.spool_max_size = UPLOAD_SPOOL_MEMORY_BYTES
+
 # app.include_router(user_routes.router)
 app.include_router(user_router)
 app.include_router(product_router)
 
+@app.get("/health")
+def health():
+    # liveness: the API process is up
+    return {"status": "ok"}
+
+@app.get("/ready")
+def ready():
+    # readiness: only "ready" once every model worker is loaded and warmed up
+    body = {"status": model_pool.status}
+    if model_pool.error:
+        body["error"] = model_pool.error
+    return JSONResponse(body, status_code=200 if model_pool.status == "ready" else 503)
+
+@app.get("/metrics")
+def prometheus_metrics():
+    # per-phase latency histograms, scraped by Prometheus (see app/metrics.py)
+    body, content_type = metrics.render()
+    return Response(body, media_type=content_type)
@@ -0,0 +1,60 @@
+import os, time
+from contextlib import contextmanager
+from app.config import MODEL_PATH, INFERENCE_BACKEND
+
+'''
+Per-phase latency metrics (Prometheus, GET /metrics)
+    1. One number for "inference" hides where the time goes, so every phase gets its own timer:
+        upload_read, input_read, queue, decode, preprocess, forward, nms, plot, encode_write, db_commit
+       upload_read = receiving a multipart body (BodyLimitMiddleware, first to last chunk, before the form is parsed),
+       input_read = reading an image back from a job file / batch upload / ZIP member.
+    2. Timers are time.perf_counter() (monotonic), never time.time().
+    3. decode / preprocess / forward / nms run inside the model worker processes,
+       they come back with each result as meta["timings_ms"] and are observed here in the API process.
+    4. queue = time a /detect-image request waited for its batch (submit -> result minus the batch itself).
+    5. Labels: phase, model (weights file name), backend.
+    6. prometheus-client is in requirements.txt, without it the timers are no-ops and /metrics says so.
+'''
+
+try:
+    from prometheus_client import Histogram, CONTENT_TYPE_LATEST, generate_latest
+except ImportError:
+    Histogram = None
+
+MODEL_LABEL = os.path.splitext(os.path.basename(MODEL_PATH))[0]
+
+PHASE_SECONDS = Histogram(
+    "detection_phase_seconds",
+    "Time spent in each phase of a detection request",
+    ["phase", "model", "backend"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 1, 2.5, 5, 10),
+) if Histogram else None
+
+def observe(phase, seconds):
+    if PHASE_SECONDS is None:
+        return
+    PHASE_SECONDS.labels(phase, MODEL_LABEL, INFERENCE_BACKEND).observe(seconds)
+
+def observe_timings(timings_ms):
+    for phase, ms in (timings_ms or {}).items():
+        if ms is not None:
+            observe(phase, ms / 1000)
+
+def observe_inference(meta, waited_seconds=None):
+    # meta from detect_images(), waited_seconds = how long the caller awaited it
+    observe_timings(meta.get("timings_ms"))
+    if waited_seconds is not None:
+        observe("queue", max(0.0, waited_seconds - meta["inference_time_ms"] / 1000))
+
+@contextmanager
+def timed(phase):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(phase, time.perf_counter() - start)
+
+def render():
+    if PHASE_SECONDS is None:
+        return b"# prometheus-client is not installed, no metrics\n", "text/plain; charset=utf-8"
+    return generate_latest(), CONTENT_TYPE_LATEST
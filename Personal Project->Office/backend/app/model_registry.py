@@ -0,0 +1,56 @@
+import threading
+import time
+import numpy as np
+from app.detector import load_model, INFERENCE_PARAMS
+from app.config import MODEL_PATH, INFERENCE_IMGSZ, INFERENCE_BACKEND, WARMUP_RUNS
+
+'''
+Model registry
+    1. Nothing is loaded at import time, importing the routes (tooling, tests, worker spawns) is cheap.
+    2. get(name) loads the weights on first use, only once per process.
+    3. warm_up(name) runs a few dummy passes so the first real request does not pay
+       for lazy init (allocator, kernel selection, fuse of conv+bn layers...).
+'''
+
+class ModelRegistry:
+    def __init__(self, paths: dict, backend: str = INFERENCE_BACKEND):
+        self.paths = dict(paths)
+        self.backends = {name: backend for name in self.paths}
+        self._models = {}
+        self._warm = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, path: str, backend: str = INFERENCE_BACKEND):
+        with self._lock:
+            if self.paths.get(name) != path or self.backends.get(name) != backend:
+                self.paths[name] = path
+                self.backends[name] = backend
+                self._models.pop(name, None)
+                self._warm.pop(name, None)
+
+    def get(self, name: str = "default"):
+        model = self._models.get(name)
+        if model is None:
+            with self._lock:
+                model = self._models.get(name)
+                if model is None:
+                    model = load_model(self.paths[name], self.backends[name])
+                    self._models[name] = model
+        return model
+
+    def warm_up(self, name: str = "default", runs: int = WARMUP_RUNS, imgsz: int = INFERENCE_IMGSZ):
+        model = self.get(name)
+        if name in self._warm:
+            return model
+
+        start = time.perf_counter()
+        dummy = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+        for _ in range(runs):
+            model(dummy, **INFERENCE_PARAMS, verbose=False)
+        self._warm[name] = (time.perf_counter() - start) * 1000
+        return model
+
+    def is_ready(self, name: str = "default") -> bool:
+        return name in self._warm
+
+registry = ModelRegistry({"default": MODEL_PATH})
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from app.detector import detect_images, resolve_weights
+from app.model_registry import registry
+from app.video import process_video
+from app.batching import QueueFullError
+
+'''
+Model worker pool
+    1. YOLO inference is CPU bound, running it inside an async route blocks uvicorn's event loop.
+    2. While the loop is blocked, logins, history reads and downloads all wait behind the inference.
+    3. So inference runs in separate worker processes, each loading the weights once at start-up.
+    4. The async routes only await a future, the event loop stays free.
+    5. MODEL_WORKERS=0 keeps the model in the API process and runs it on one background thread.
+    6. warm_up() starts every worker and waits for the model registry warm-up in each of them,
+       the readiness endpoint reports "ready" only after that.
+    7. A video is one long task, so videos get their own video_workers processes:
+        - image batches never queue behind a clip
+        - at most video_max_pending videos run or wait, after that run_video() raises QueueFullError
+        - MODEL_WORKERS=0 (single thread, dev mode) keeps everything on that one thread
+'''
+
+logger = logging.getLogger(__name__)
+
+# Per-process model, set by the pool initializer (one per worker process)
+_model = None
+
+def _init_worker(model_path: str, backend: str, torch_threads: int, warmup_runs: int):
+    global _model
+    if torch_threads > 0 and backend != "stub":
+        import torch
+        torch.set_num_threads(torch_threads)  # workers must not oversubscribe the cores..!
+    registry.register("default", model_path, backend)
+    _model = registry.warm_up("default", runs=warmup_runs)
+
+def _ping():
+    # runs after the initializer, so the worker is loaded and warm by now
+    return os.getpid()
+
+def _run_batch(images_bytes):
+    return detect_images(_model, images_bytes)
+
+def _run_video(input_path, output_path, frame_stride, batch_size, queue_frames, mode, max_stride, scene_threshold):
+    return process_video(
+        _model, input_path, output_path, frame_stride, batch_size, queue_frames, mode, max_stride, scene_threshold
+    )
+
+class ModelWorkerPool:
+    def __init__(
+        self, model_path: str, backend: str = "torch", workers: int = 1, torch_threads: int = 0, warmup_runs: int = 1,
+        video_workers: int = 1, video_max_pending: int = 4,
+    ):
+        self.model_path = model_path
+        self.backend = backend
+        self.workers = workers
+        self.torch_threads = torch_threads
+        self.warmup_runs = warmup_runs
+        self.video_workers = max(1, video_workers)
+        self.video_max_pending = max(1, video_max_pending)
+        self.status = "starting"   # starting -> warming_up -> ready / failed
+        self.error = None
+        self._executor = None
+        self._video_executor = None
+        self._video_pending = 0
+
+    def start(self):
+        if self._executor is not None:
+            return
+        initargs = (self.model_path, self.backend, self.torch_threads, self.warmup_runs)
+        if self.workers > 0:
+            # spawn instead of fork: never copy the running event loop / db connections into a worker
+            spawn = multiprocessing.get_context("spawn")
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=spawn, initializer=_init_worker, initargs=initargs,
+            )
+            self._video_executor = ProcessPoolExecutor(
+                max_workers=self.video_workers, mp_context=spawn, initializer=_init_worker, initargs=initargs,
+            )
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=1, initializer=_init_worker, initargs=initargs)
+            self._video_executor = self._executor
+
+    async def warm_up(self):
+        # one ping per worker forces every process to spawn, load and warm up now
+        self.start()
+        self.status = "warming_up"
+        loop = asyncio.get_running_loop()
+        try:
+            # export onnx / openvino weights once here, not concurrently in every worker
+            await asyncio.to_thread(resolve_weights, self.model_path, self.backend)
+            pings = [loop.run_in_executor(self._executor, _ping) for _ in range(max(1, self.workers))]
+            if self._video_executor is not self._executor:
+                pings += [loop.run_in_executor(self._video_executor, _ping) for _ in range(self.video_workers)]
+            await asyncio.gather(*pings)
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+            logger.warning("Model warm-up failed: %s", e)
+            return
+        self.status = "ready"
+
+    async def run_batch(self, images_bytes):
+        self.start()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, _run_batch, images_bytes)
+
+    async def run_video(
+        self, input_path, output_path, frame_stride=1, batch_size=8, queue_frames=32,
+        mode="stride", max_stride=12, scene_threshold=25.0,
+    ):
+        # A whole clip is one job: frames never leave the (video) worker process
+        self.start()
+        if self.video_full():
+            raise QueueFullError("Video queue is full")
+        self._video_pending += 1
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self._video_executor, _run_video, input_path, output_path, frame_stride, batch_size, queue_frames,
+                mode, max_stride, scene_threshold,
+            )
+        finally:
+            self._video_pending -= 1
+
+    def video_full(self):
+        return self._video_pending >= self.video_max_pending
+
+    def shutdown(self):
+        if self._video_executor is not None and self._video_executor is not self._executor:
+            self._video_executor.shutdown(wait=True, cancel_futures=True)
+        self._video_executor = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+            self.status = "starting"
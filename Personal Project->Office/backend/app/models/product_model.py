@@ -1,15 +1,152 @@
 from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
 from typing import Optional
 from pydantic import EmailStr    
 from datetime import datetime
 import os
 
 class Detections(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    filename: str
+    filepath: str
+    timestamp: datetime = Field(default_factory=datetime.utcnow, index=True)
+    inference_time_ms: float
+    num_detections: int
+    classes_detected: str
+    confidence_avg: float
+    source_path: Optional[str] = None  # upload as received, the overlay is rendered from it on demand
+    boxes_json: Optional[str] = None   # raw boxes in original image coordinates
+    image_width: Optional[int] = None
+    image_height: Optional[int] = None
+    available: Optional[bool] = None   # False until the write-behind writer has the upload on disk (for good if that write failed)
+
+# One row per detected box, so class / confidence filters run in SQL with an index
+class DetectionBoxes(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_detectionboxes_class_conf", "class_id", "confidence"),
+        Index("ix_detectionboxes_detection", "detection_id"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    detection_id: int = Field(foreign_key="detections.id")
+    class_id: int
+    class_name: str = Field(index=True)
+    confidence: float
+    x1: float
+    y1: float
+    x2: float
+    y2: float
+
+# Bulk deletes: rows go in one statement, their files are unlinked later in batches
+class DeleteJobs(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+    status: str = Field(default="pending", index=True)  # pending -> running -> done
+    rows_deleted: int = 0
+    files_total: int = 0
+    files_removed: int = 0
+
+class FileReap(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    job_id: int = Field(foreign_key="deletejobs.id", index=True)
+    detection_id: int
+    path: str
+
+# Async detection jobs: POST /jobs/detect queues a row, job workers claim and run it
+class DetectJobs(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_detectjobs_status_id", "status", "id"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    kind: str                           # image / video
+    status: str = Field(default="queued")  # queued -> running -> done / failed
+    name: str                           # result file name without extension
+    ext: str
+    input_path: str                     # stored upload, read by the worker
+    params_json: Optional[str] = None
+    attempts: int = 0
+    worker_id: Optional[str] = None
+    result_json: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class ResultCache(SQLModel, table=True):
+    key: str = Field(primary_key=True)  # sha256(image bytes + model version + backend + params)
+    model_version: str = Field(index=True)
+    detection_id: Optional[int] = None
+    source_path: Optional[str] = None  # source_path of that detection, ids are reused after a delete
+    filepath: str  # cache owned hard link to the uploaded image
+    file_size: int
+    boxes_json: Optional[str] = None
+    image_width: Optional[int] = None
+    image_height: Optional[int] = None
+    inference_time_ms: float
+    num_detections: int
+    classes_detected: str
+    confidence_avg: float
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    last_used: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+class VideoDetections(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     filename: str
     filepath: str
     timestamp: datetime = Field(default_factory=datetime.utcnow)
+    fps: float
+    frame_stride: int
+    frames_total: int
+    frames_processed: int
+    processing_time_ms: float
     inference_time_ms: float
     num_detections: int
+    max_detections_per_frame: int
     classes_detected: str
-    confidence_avg: float
\ No newline at end of file
+    confidence_avg: float
+
+# Analytics rollups, one row per (hour | day) bucket, updated on every insert (see app/analytics.py)
+class DetectionRollups(SQLModel, table=True):
+    __table_args__ = (
+        Index("ux_detectionrollups_bucket", "granularity", "bucket_start", unique=True),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    granularity: str   # hour / day
+    bucket_start: datetime
+    images: int = 0
+    detections: int = 0
+    confidence_sum: float = 0     # sum of confidence_avg, avg = confidence_sum / images
+    inference_time_sum: float = 0
+
+class ClassRollups(SQLModel, table=True):
+    __table_args__ = (
+        Index("ux_classrollups_bucket_class", "granularity", "bucket_start", "class_name", unique=True),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    granularity: str
+    bucket_start: datetime
+    class_name: str
+    boxes: int = 0
+    images: int = 0   # images with at least one box of this class
+
+# inference_time_ms histogram per bucket, p50 / p95 are read from it (histograms can be added up, percentiles can't)
+class LatencyRollups(SQLModel, table=True):
+    __table_args__ = (
+        Index("ux_latencyrollups_bucket_le", "granularity", "bucket_start", "le_ms", unique=True),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    granularity: str
+    bucket_start: datetime
+    le_ms: float   # upper bound of the latency bin
+    count: int = 0
+
+# progress of analytics.backfill(), a single row: ids up to max_id predate the rollups
+class RollupBackfill(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    max_id: int
+    last_id: int = 0   # rolled up so far, committed with each batch
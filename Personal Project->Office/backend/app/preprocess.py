@@ -0,0 +1,89 @@
+import io, mmap
+import cv2, numpy as np
+
+'''
+Size-aware decode + pre-processing
+    1. A 24MP photo decoded at full size is ~70MB of pixels, then YOLO shrinks it to 640 anyway.
+    2. So first read only the image header to get its size (no pixel decode).
+    3. If the image is much larger than imgsz, decode it at 1/2, 1/4 or 1/8 size directly
+       (cv2.IMREAD_REDUCED_*, JPEG does this inside the decoder, much less memory and time).
+    4. Letterbox straight to imgsz x imgsz, the model gets exactly its input size.
+    5. Boxes come back in letterbox coordinates, map_boxes() brings them back to the original image.
+    - The reduced decode + letterbox are only the model input..!
+      The annotated image is drawn on a full resolution decode (decode_full), in original pixel coordinates.
+'''
+
+_REDUCED = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+def read_image_size(image_bytes):
+    # Only the header is parsed here, the pixels are not decoded
+    from PIL import Image
+    try:
+        if isinstance(image_bytes, mmap.mmap):
+            # spooled upload (app/uploads.py), PIL reads the header from the mapping, no copy
+            image_bytes.seek(0)
+            fp = image_bytes
+        else:
+            fp = io.BytesIO(image_bytes)
+        with Image.open(fp) as img:
+            return img.size  # (width, height)
+    except Exception:
+        return None
+
+def decode_flag(size, imgsz: int):
+    # Largest reduction that still keeps the long side >= imgsz (so no detail the model could use is lost)
+    if size:
+        long_side = max(size)
+        for factor, flag in _REDUCED:
+            if long_side / factor >= imgsz:
+                return flag
+    return cv2.IMREAD_COLOR
+
+def decode_for_inference(image_bytes, imgsz: int):
+    # Returns (decoded image, factor, original (w, h)), factor = original size / decoded size
+    np_arr = np.frombuffer(image_bytes, np.uint8)
+    size = read_image_size(image_bytes)
+    img = cv2.imdecode(np_arr, decode_flag(size, imgsz))
+    if img is None:
+        return None, 1.0, None
+
+    h, w = img.shape[:2]
+    if size is None:
+        return img, 1.0, (w, h)
+    # EXIF orientation can swap width / height, the long side does not change
+    factor = max(size) / max(w, h)
+    original = (round(w * factor), round(h * factor))
+    return img, factor, original
+
+def letterbox(img, imgsz: int, color=(114, 114, 114)):
+    # Resize keeping aspect ratio and pad to imgsz x imgsz (same as ultralytics pre-processing)
+    h, w = img.shape[:2]
+    scale = min(imgsz / h, imgsz / w)
+    new_w, new_h = round(w * scale), round(h * scale)
+    if (new_w, new_h) != (w, h):
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+        img = cv2.resize(img, (new_w, new_h), interpolation=interpolation)
+    pad_w, pad_h = (imgsz - new_w) / 2, (imgsz - new_h) / 2
+    top, bottom = round(pad_h - 0.1), round(pad_h + 0.1)
+    left, right = round(pad_w - 0.1), round(pad_w + 0.1)
+    img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return img, scale, (left, top)
+
+def map_boxes(boxes, scale, pad, factor, size):
+    # letterbox coordinates -> original image coordinates (clipped to the image)
+    width, height = size
+    mapped = []
+    for box in boxes:
+        x1, y1, x2, y2 = box["xyxy"]
+        xyxy = [
+            min(max((x1 - pad[0]) / scale * factor, 0.0), width),
+            min(max((y1 - pad[1]) / scale * factor, 0.0), height),
+            min(max((x2 - pad[0]) / scale * factor, 0.0), width),
+            min(max((y2 - pad[1]) / scale * factor, 0.0), height),
+        ]
+        mapped.append({**box, "xyxy": xyxy})
+    return mapped
+
+def decode_full(image_bytes):
+    # Full resolution decode for the annotated image, boxes from map_boxes() fit it as they are
+    return cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
@@ -0,0 +1,200 @@
+import argparse, glob, json, os, time
+from collections import defaultdict
+import cv2, numpy as np
+from app.config import MODEL_PATH, UPLOAD_DIR, INFERENCE_IMGSZ
+from app.detector import INFERENCE_PARAMS, resolve_weights, int8_paths, file_sha256, box_iou, extract_boxes
+from app.preprocess import letterbox
+
+'''
+INT8 post-training quantization (opt-in, INFERENCE_BACKEND=onnx-int8)
+    1. Export the FP32 ONNX model (same file the onnx backend uses).
+    2. Calibrate activations ranges on the raw uploads under storage/uploads (UPLOAD_DIR, --images to change),
+       never the *_result images: their boxes are burned into the pixels.
+    3. Quantize weights + activations to INT8 (static, QDQ, per-channel weights) with ONNX Runtime.
+    4. Compare INT8 against FP32 on held-out images (every 5th image is never used for calibration):
+        - mAP50 of the INT8 boxes, taking the FP32 boxes as ground truth
+        - box agreement and the difference in detection counts
+    5. The model is built under a temp name, the report (with the sha256 of that model) is written next to it,
+       and only an approved model is renamed to *.int8.onnx. The onnx-int8 backend serves it only if the
+       report says "approved" and its hash matches the file, a failed rebuild never inherits an old approval.
+
+    Usage (from the backend folder):
+        python -m app.quantize --limit 300 --min-map 0.95
+'''
+
+IMAGE_GLOBS = ("*.jpg", "*.jpeg", "*.png", "*.webp")
+
+def list_images(folder, limit):
+    paths = sorted(path for ext in IMAGE_GLOBS for path in glob.glob(os.path.join(folder, ext)))
+    return paths[:limit]
+
+def to_tensor(path, imgsz):
+    img = cv2.imread(path, cv2.IMREAD_COLOR)
+    img, _, _ = letterbox(img, imgsz)
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB).transpose(2, 0, 1)
+    return np.ascontiguousarray(img, dtype=np.float32)[None] / 255.0
+
+class _CalibrationReader:
+    # onnxruntime CalibrationDataReader interface: get_next() -> {input_name: tensor} or None
+    def __init__(self, input_name, paths, imgsz):
+        self.input_name = input_name
+        self._paths = iter(paths)
+        self.imgsz = imgsz
+
+    def get_next(self):
+        path = next(self._paths, None)
+        if path is None:
+            return None
+        return {self.input_name: to_tensor(path, self.imgsz)}
+
+    def rewind(self):
+        pass
+
+def quantize(fp32_path, int8_path, calibration_paths, imgsz):
+    import onnxruntime as ort
+    from onnxruntime.quantization import quantize_static, QuantFormat, QuantType, CalibrationMethod
+
+    input_name = ort.InferenceSession(fp32_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    quantize_static(
+        fp32_path,
+        int8_path,
+        _CalibrationReader(input_name, calibration_paths, imgsz),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+        calibrate_method=CalibrationMethod.MinMax,
+    )
+
+    # ultralytics reads class names / stride from the onnx metadata, keep it on the INT8 model
+    import onnx
+    fp32_model, int8_model = onnx.load(fp32_path), onnx.load(int8_path)
+    if not int8_model.metadata_props:
+        for prop in fp32_model.metadata_props:
+            int8_model.metadata_props.add(key=prop.key, value=prop.value)
+        onnx.save(int8_model, int8_path)
+
+def map50(reference, predictions, iou_threshold=0.5):
+    # mAP@0.5 of predictions against reference boxes (all-point interpolated AP, mean over classes)
+    n_ref = defaultdict(int)
+    for boxes in reference:
+        for box in boxes:
+            n_ref[box["cls"]] += 1
+
+    preds = defaultdict(list)
+    for i, boxes in enumerate(predictions):
+        for box in boxes:
+            preds[box["cls"]].append((box["conf"], i, box["xyxy"]))
+
+    aps = []
+    for cls, total in n_ref.items():
+        used = set()
+        tp = []
+        for conf, i, xyxy in sorted(preds[cls], key=lambda p: -p[0]):
+            best, best_j = 0.0, None
+            for j, ref in enumerate(reference[i]):
+                if ref["cls"] != cls or (i, j) in used:
+                    continue
+                overlap = box_iou(xyxy, ref["xyxy"])
+                if overlap > best:
+                    best, best_j = overlap, j
+            if best >= iou_threshold:
+                used.add((i, best_j))
+                tp.append(1)
+            else:
+                tp.append(0)
+
+        tp = np.array(tp, dtype=float)
+        if not len(tp):
+            aps.append(0.0)
+            continue
+        cum_tp = np.cumsum(tp)
+        recall = cum_tp / total
+        precision = cum_tp / np.arange(1, len(tp) + 1)
+        # precision envelope, then area under the PR curve
+        recall = np.concatenate([[0.0], recall, [1.0]])
+        precision = np.concatenate([[1.0], precision, [0.0]])
+        precision = np.flip(np.maximum.accumulate(np.flip(precision)))
+        steps = np.where(recall[1:] != recall[:-1])[0]
+        aps.append(float(np.sum((recall[steps + 1] - recall[steps]) * precision[steps + 1])))
+
+    return float(np.mean(aps)) if aps else 1.0
+
+def evaluate(fp32_path, int8_path, eval_paths):
+    from ultralytics import YOLO
+    fp32 = YOLO(fp32_path, task="detect")
+    int8 = YOLO(int8_path, task="detect")
+
+    reference, predictions = [], []
+    fp32_ms, int8_ms = 0.0, 0.0
+    for path in eval_paths:
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        t0 = time.perf_counter()
+        ref = fp32(img, **INFERENCE_PARAMS, verbose=False)[0]
+        t1 = time.perf_counter()
+        pred = int8(img, **INFERENCE_PARAMS, verbose=False)[0]
+        t2 = time.perf_counter()
+        fp32_ms += (t1 - t0) * 1000
+        int8_ms += (t2 - t1) * 1000
+        reference.append(extract_boxes(ref, fp32.names))
+        predictions.append(extract_boxes(pred, int8.names))
+
+    n = max(1, len(eval_paths))
+    ref_count = sum(len(b) for b in reference)
+    pred_count = sum(len(b) for b in predictions)
+    return {
+        "eval_images": len(eval_paths),
+        "map50_vs_fp32": map50(reference, predictions),
+        "fp32_detections": ref_count,
+        "int8_detections": pred_count,
+        "detections_delta": pred_count - ref_count,
+        "fp32_ms_per_image": fp32_ms / n,
+        "int8_ms_per_image": int8_ms / n,
+        "speedup": (fp32_ms / int8_ms) if int8_ms else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and validate the INT8 detection model")
+    # raw uploads, the *_result images in IMG_SAVE_DIR have the boxes burned in
+    parser.add_argument("--images", default=UPLOAD_DIR, help="calibration / evaluation images")
+    parser.add_argument("--limit", type=int, default=300)
+    parser.add_argument("--imgsz", type=int, default=INFERENCE_IMGSZ)
+    parser.add_argument("--min-map", type=float, default=0.95, help="minimum mAP50 vs FP32 to approve INT8")
+    args = parser.parse_args()
+
+    paths = list_images(args.images, args.limit)
+    if len(paths) < 5:
+        raise SystemExit(f"Need at least 5 images in {args.images} for calibration + evaluation")
+
+    eval_paths = paths[::5]
+    calibration_paths = [p for i, p in enumerate(paths) if i % 5]
+
+    fp32_path = resolve_weights(MODEL_PATH, "onnx")
+    int8_path, report_path = int8_paths(MODEL_PATH)
+
+    candidate_path = f"{os.path.splitext(int8_path)[0]}.tmp.onnx"
+    try:
+        print(f"Calibrating on {len(calibration_paths)} images...")
+        quantize(fp32_path, candidate_path, calibration_paths, args.imgsz)
+
+        print(f"Evaluating on {len(eval_paths)} held-out images...")
+        report = evaluate(fp32_path, candidate_path, eval_paths)
+        report["calibration_images"] = len(calibration_paths)
+        report["min_map50"] = args.min_map
+        report["approved"] = report["map50_vs_fp32"] >= args.min_map
+        report["sha256"] = file_sha256(candidate_path)
+
+        # report first: until the rename the old model no longer matches it, so it is not served
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+        if report["approved"]:
+            os.replace(candidate_path, int8_path)
+    finally:
+        if os.path.exists(candidate_path):
+            os.remove(candidate_path)
+
+    print(json.dumps(report, indent=2))
+    print("INT8 model approved for serving" if report["approved"] else "INT8 model REJECTED, onnx-int8 will fall back to FP32")
+
+if __name__ == "__main__":
+    main()
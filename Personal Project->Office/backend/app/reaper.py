@@ -0,0 +1,106 @@
+import os
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import insert, literal, true, and_
+from sqlmodel import Session, select, delete, func
+from app.database import engine
+from app.models.product_model import Detections, DetectionBoxes, DeleteJobs, FileReap
+from app.thumbnails import remove_thumbnails
+from app.encodings import remove_variants
+from app import result_cache
+
+'''
+Set-based bulk delete + background file reaping
+    1. Deleting row by row (load, os.remove, session.delete) keeps one transaction open for minutes.
+    2. Instead, in ONE short transaction:
+        - INSERT INTO filereap SELECT id, filepath / source_path FROM detections WHERE <filter>
+        - DELETE FROM detectionboxes / detections WHERE id IN (the ids just queued)
+    3. The endpoint returns right away with a job id.
+    4. A background worker unlinks the queued files in batches (one small commit per batch).
+    5. The queue is a table, so a restart just resumes the unfinished jobs.
+'''
+
+REAP_BATCH_SIZE = 500
+
+_lock = threading.Lock()
+
+def build_filter(older_than_days=None, class_name=None):
+    conditions = []
+    if older_than_days is not None:
+        conditions.append(Detections.timestamp < datetime.utcnow() - timedelta(days=older_than_days))
+    if class_name is not None:
+        conditions.append(Detections.id.in_(
+            select(DetectionBoxes.detection_id).where(DetectionBoxes.class_name == class_name)
+        ))
+    return and_(*conditions) if conditions else true()
+
+def enqueue_delete(session, condition):
+    job = DeleteJobs()
+    session.add(job)
+    session.flush()
+
+    for column in (Detections.filepath, Detections.source_path):
+        session.exec(
+            insert(FileReap).from_select(
+                ["job_id", "detection_id", "path"],
+                select(literal(job.id), Detections.id, column).where(condition, column.is_not(None)),
+            )
+        )
+    # filepath is never null, so the queued rows hold exactly the ids matched by the filter
+    # (the filter itself can't be re-run, it may look at the boxes we delete first)
+    matched_ids = select(FileReap.detection_id).where(FileReap.job_id == job.id)
+    session.exec(delete(DetectionBoxes).where(DetectionBoxes.detection_id.in_(matched_ids)))
+    result_cache.forget(session, matched_ids)
+    result = session.exec(delete(Detections).where(Detections.id.in_(matched_ids)))
+
+    job.rows_deleted = result.rowcount
+    job.files_total = session.exec(
+        select(func.count(FileReap.id)).where(FileReap.job_id == job.id)
+    ).one()
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    return job
+
+def reap_files(job_id: int, batch_size: int = REAP_BATCH_SIZE):
+    # one worker at a time is plenty, this is disk bound
+    with _lock, Session(engine) as session:
+        job = session.get(DeleteJobs, job_id)
+        if not job or job.status == "done":
+            return
+        job.status = "running"
+        session.add(job)
+        session.commit()
+
+        while True:
+            batch = session.exec(
+                select(FileReap).where(FileReap.job_id == job_id).order_by(FileReap.id).limit(batch_size)
+            ).all()
+            if not batch:
+                break
+
+            for item in batch:
+                try:
+                    os.remove(item.path)
+                    job.files_removed += 1
+                except FileNotFoundError:
+                    pass  # never rendered / already gone
+            for item in batch:
+                # named after the result file, a no-op for the upload
+                remove_thumbnails(item.path)
+                remove_variants(item.path)
+            session.exec(delete(FileReap).where(FileReap.id.in_([item.id for item in batch])))
+            session.add(job)
+            session.commit()
+
+        job.status = "done"
+        job.finished_at = datetime.utcnow()
+        session.add(job)
+        session.commit()
+
+def resume_pending():
+    # jobs interrupted by a restart still have files queued
+    with Session(engine) as session:
+        job_ids = session.exec(select(DeleteJobs.id).where(DeleteJobs.status != "done")).all()
+    for job_id in job_ids:
+        reap_files(job_id)
@@ -0,0 +1,174 @@
+import hashlib, json, os, shutil
+from datetime import datetime
+from sqlalchemy import update
+from sqlmodel import select, func
+from app.models.product_model import Detections, ResultCache
+from app.detector import INFERENCE_PARAMS
+from app.annotations import box_rows, load_boxes, result_path_for
+from app import analytics
+from app.config import MODEL_PATH, INFERENCE_BACKEND, UPLOAD_DIR, CACHE_DIR, RESULT_CACHE_MAX_BYTES
+
+'''
+Content-hash result cache
+    1. Operators upload the same frames again and again.
+    2. key = sha256(image bytes + model version + backend + inference params)
+    3. Hit  -> return the stored Detections record (boxes + annotated file), no inference, no new files.
+    4. Miss -> normal detection, then the stored upload is hard linked into storage/cache with its boxes.
+    5. The cache owns its own link, so deleting history never breaks it (and eviction never deletes history).
+       Deletes call forget() in the same transaction, and a hit only returns the record whose
+       source_path the entry recorded (SQLite hands a deleted id to the next row).
+    6. Cached files are kept under RESULT_CACHE_MAX_BYTES, least recently used go first.
+    7. Model version = hash of the weights file, new weights -> new keys, old entries are purged.
+'''
+
+os.makedirs(CACHE_DIR, exist_ok=True)
+
+_version = {"stat": None, "value": None}
+
+def model_version():
+    # Hashing the weights is not free, so only redo it when the file changes
+    try:
+        st = os.stat(MODEL_PATH)
+    except FileNotFoundError:
+        return "missing"
+    stat = (st.st_size, st.st_mtime_ns)
+    if _version["stat"] != stat:
+        digest = hashlib.sha256()
+        with open(MODEL_PATH, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        _version["stat"] = stat
+        _version["value"] = digest.hexdigest()[:16]
+    return _version["value"]
+
+def make_key(image_bytes):
+    digest = hashlib.sha256(image_bytes)
+    digest.update(model_version().encode())
+    digest.update(INFERENCE_BACKEND.encode())
+    digest.update(json.dumps(INFERENCE_PARAMS, sort_keys=True).encode())
+    return digest.hexdigest()
+
+def _link(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)  # different file system
+
+def lookup(session, key):
+    entry = session.get(ResultCache, key)
+    if not entry:
+        return None
+
+    if not os.path.exists(entry.filepath):
+        session.delete(entry)
+        session.commit()
+        return None
+
+    record = session.get(Detections, entry.detection_id) if entry.detection_id else None
+    if record and record.source_path != entry.source_path:
+        record = None  # the id now belongs to another upload
+    if record and record.source_path and not os.path.exists(record.source_path) and not os.path.exists(record.filepath):
+        _link(entry.filepath, record.source_path)  # its upload was removed, the overlay can be rendered again
+    if not record:
+        # history entry was deleted, bring it back from the cached upload + boxes (no inference)
+        ext = os.path.splitext(entry.filepath)[1]
+        source_path = os.path.join(UPLOAD_DIR, f"{key[:16]}{ext}")
+        if not os.path.exists(source_path):
+            _link(entry.filepath, source_path)
+        filename = f"{key[:16]}_result.jpg"
+        record = Detections(
+            filename=filename,
+            filepath=result_path_for(source_path),
+            inference_time_ms=entry.inference_time_ms,
+            num_detections=entry.num_detections,
+            classes_detected=entry.classes_detected,
+            confidence_avg=entry.confidence_avg,
+            source_path=source_path,
+            boxes_json=entry.boxes_json,
+            image_width=entry.image_width,
+            image_height=entry.image_height,
+        )
+        session.add(record)
+        session.flush()
+        boxes = load_boxes(entry.boxes_json)
+        session.add_all(box_rows(record.id, boxes))
+        analytics.record(session, [(record, boxes)])  # a new history row, counted like any other
+        entry.detection_id = record.id
+        entry.source_path = record.source_path
+
+    entry.last_used = datetime.utcnow()
+    session.add(entry)
+    session.commit()
+    session.refresh(record)
+    return record
+
+def _entry(session, key, record):
+    cache_path = os.path.join(CACHE_DIR, f"{key}{os.path.splitext(record.source_path)[1]}")
+    if os.path.exists(cache_path):
+        os.remove(cache_path)
+    _link(record.source_path, cache_path)
+
+    entry = session.get(ResultCache, key) or ResultCache(key=key)
+    entry.model_version = model_version()
+    entry.detection_id = record.id
+    entry.source_path = record.source_path
+    entry.filepath = cache_path
+    entry.file_size = os.path.getsize(cache_path)
+    entry.inference_time_ms = record.inference_time_ms
+    entry.num_detections = record.num_detections
+    entry.classes_detected = record.classes_detected
+    entry.confidence_avg = record.confidence_avg
+    entry.boxes_json = record.boxes_json
+    entry.image_width = record.image_width
+    entry.image_height = record.image_height
+    entry.last_used = datetime.utcnow()
+    session.add(entry)
+
+def store(session, key, record):
+    _entry(session, key, record)
+    session.commit()
+
+    evict(session)
+
+def store_many(session, items):
+    # (key, record) pairs from /detect-batch, one commit + one eviction pass for the whole chunk
+    for key, record in items:
+        _entry(session, key, record)
+    session.commit()
+
+    evict(session)
+
+def forget(session, detection_ids):
+    # detections being deleted (ids or a subquery), their entries stay, the caller commits
+    session.exec(
+        update(ResultCache).where(ResultCache.detection_id.in_(detection_ids)).values(detection_id=None)
+    )
+
+def _remove(session, entries):
+    for entry in entries:
+        if os.path.exists(entry.filepath):
+            os.remove(entry.filepath)
+        session.delete(entry)
+    session.commit()
+
+def evict(session, max_bytes: int = RESULT_CACHE_MAX_BYTES):
+    total = session.exec(select(func.coalesce(func.sum(ResultCache.file_size), 0))).one()
+    if total <= max_bytes:
+        return 0
+
+    removed = []
+    for entry in session.exec(select(ResultCache).order_by(ResultCache.last_used)):
+        if total <= max_bytes:
+            break
+        total -= entry.file_size
+        removed.append(entry)
+    _remove(session, removed)
+    return len(removed)
+
+def purge_stale(session):
+    # Entries made with other weights can never be hit again
+    stale = session.exec(
+        select(ResultCache).where(ResultCache.model_version != model_version())
+    ).all()
+    _remove(session, stale)
+    return len(stale)
@@ -1,78 +1,129 @@
-from fastapi import FastAPI, Depends, HTTPException, Form, File, UploadFile, APIRouter, Query
+from fastapi import FastAPI, Depends, HTTPException, Form, File, UploadFile, APIRouter, Query, BackgroundTasks, Request, WebSocket, WebSocketDisconnect
 from sqlmodel import SQLModel, create_engine, Session, select, delete
 from typing import Annotated, Optional
-from ultralytics import YOLO
+from datetime import datetime, timedelta
+from sqlalchemy import func
 import cv2, numpy as np, os
 from app.models.user_model import User, EmailOTP
-from app.models.product_model import Detections
+from app.models.product_model import Detections, DetectionBoxes, VideoDetections, DeleteJobs, DetectJobs
 from app.dependancies import get_current_user, SessionDep
 from app.schemas.user_schema import CreateUser, OTPVerify, UpdateUser, loginUser, UserRead, Token
 from app.auth import hash_password, verified_password, create_acess_token
-import random, os
-from fastapi.responses import JSONResponse, FileResponse
-import time
+import random, os, shutil, uuid
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+import time, logging
 from email.message import EmailMessage
 from app.emailverfication import send_otp_email, generate_otp
+from app.batching import MicroBatcher, QueueFullError
+from app.model_workers import ModelWorkerPool
+from app import result_cache
+from app import reaper
+from app import jobs
+from app import analytics
+from app import metrics
+from app.live import live_session, user_from_token
+from app.file_serving import serve_file
+from app.uploads import read_upload, release
+from app.batch_ingest import iter_images, detect_stream, via_batcher
+from app.thumbnails import snap_width, pick_format, ensure_thumbnail, FORMATS
+from app.encodings import pick_profile, media_type, is_stored_profile, ensure_variant
+from app.pagination import paginate, DEFAULT_LIMIT, MAX_LIMIT
+from app.annotations import source_path_for, result_path_for, write_source, dump_boxes, box_rows, ensure_rendered, remove_files
+from app.write_behind import writer
+from app.database import engine
+from functools import partial
+from app.config import (
+    MODEL_PATH, IMG_SAVE_DIR, VID_SAVE_DIR, UPLOAD_DIR, INFERENCE_BACKEND,
+    BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS,
+    MODEL_WORKERS, TORCH_THREADS_PER_WORKER, INFERENCE_QUEUE_SIZE, WARMUP_RUNS,
+    VIDEO_FRAME_STRIDE, VIDEO_BATCH_SIZE, VIDEO_QUEUE_FRAMES,
+    VIDEO_MODE, VIDEO_TRACK_MAX_STRIDE, VIDEO_SCENE_THRESHOLD, VIDEO_WORKERS, VIDEO_MAX_PENDING,
+    RESULT_CACHE_ENABLED, BATCH_DB_CHUNK, BATCH_INGEST_MAX_FILES, LIVE_MAX_FRAME_BYTES,
+    UPLOAD_MAX_BYTES, WRITE_BEHIND_ENABLED,
+    RESULT_JPEG_QUALITY,
+)
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 app = FastAPI(title="AI Vision API")
 
-BASE_DIR = os.path.dirname(
-    os.path.dirname(
-        os.path.dirname(
-            os.path.dirname(os.path.abspath(__file__))
-        )
-    )
-)
-
-MODEL_PATH = os.path.join(BASE_DIR, "weights", "combined_best.pt")
-
-IMG_SAVE_DIR = os.path.join(BASE_DIR, "storage", "images")
-VID_SAVE_DIR = os.path.join(BASE_DIR, "storage", "videos")
-
 os.makedirs(IMG_SAVE_DIR, exist_ok=True)
 os.makedirs(VID_SAVE_DIR, exist_ok=True)
 
-model = YOLO(MODEL_PATH)
-
-def detect_image(image_bytes):
-    start = time.time()
-
-    np_arr = np.frombuffer(image_bytes, np.uint8)
-    img = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-    results = model(img)
-
-    annotated = results[0].plot()
-    inference_time = (time.time() - start) * 1000
-    boxes = results[0].boxes
-    num_detections = len(boxes)
-    classes = [model.names[int(cls)] for cls in boxes.cls]
-    confidence_avg = float(boxes.conf.mean()) if num_detections > 0 else 0.0
+# Weights are loaded inside the model workers (lazily, via the model registry), not at import..!
+model_pool = ModelWorkerPool(
+    MODEL_PATH,
+    backend=INFERENCE_BACKEND,
+    workers=MODEL_WORKERS,
+    torch_threads=TORCH_THREADS_PER_WORKER,
+    warmup_runs=WARMUP_RUNS,
+    video_workers=VIDEO_WORKERS,
+    video_max_pending=VIDEO_MAX_PENDING,
+)
 
-    metadata = {
-        "inference_time_ms": inference_time,
-        "num_detections": num_detections,
-        "classes_detected": ",".join(classes),
-        "confidence_avg": confidence_avg,
-    }
-    return annotated, metadata
+batcher = MicroBatcher(
+    model_pool.run_batch,
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait_ms=BATCH_MAX_WAIT_MS,
+    max_concurrency=max(1, MODEL_WORKERS),
+    max_queue=INFERENCE_QUEUE_SIZE,
+)
 
-def save_image(image, file_name):
-    name, ext = os.path.splitext(file_name)
-    filename = f"{name}_result.jpg"
-    filepath = os.path.join(IMG_SAVE_DIR, filename)
-    cv2.imwrite(filepath, image)
-    return filename, filepath   # return only filename
+def save_upload(upload_file, path):
+    # shutil copies in chunks, the video is never fully loaded into memory..!
+    with open(path, "wb") as buffer:
+        shutil.copyfileobj(upload_file, buffer, length=1024 * 1024)
 
 IMG_EXT = [".jpg", ".jpeg", ".png", ".gif", ".webp", ".avif", ".svg"]
+VID_EXT = [".mp4", ".avi", ".mov", ".mkv", ".m4v"]
+
+def rendered_path(record):
+    # The overlay is drawn on first access only (see app/annotations.py)
+    try:
+        path = ensure_rendered(record)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if not path:
+        raise HTTPException(status_code=404, detail="File missing on server")
+    return path
+
+def negotiated_path(request, record, fmt, quality):
+    # The annotated image in the format / quality tier the client asked for (see app/encodings.py)
+    path = rendered_path(record)
+    try:
+        fmt, tier = pick_profile(request.headers.get("accept"), fmt, quality)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if is_stored_profile(fmt, tier, RESULT_JPEG_QUALITY):
+        return path, fmt
+    try:
+        return ensure_variant(path, fmt, tier), fmt
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/view-image")
 def view_image(
+    request: Request,
     path: str,
+    session: SessionDep,
+    fmt: Optional[str] = Query(None, alias="format"),
+    quality: Optional[str] = Query(None),
     current_user: User = Depends(get_current_user)
     ):
-    return FileResponse(path, media_type="image/jpeg")
+    record = session.exec(select(Detections).where(Detections.filepath == path)).first()
+    if record:
+        path, fmt = negotiated_path(request, record, fmt, quality)
+    else:
+        fmt = "jpg"
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="File missing on server")
+    # ETag / 304, Range and Cache-Control handling, see app/file_serving.py
+    response = serve_file(request, path, media_type(fmt))
+    response.headers["Vary"] = "Accept"
+    return response
 
 @router.post("/detect-image")
 async def detect(
@@ -81,21 +132,77 @@ async def detect(
     session: SessionDep = None,
     current_user: User = Depends(get_current_user)
     ):
-    image_bytes = await file.read()
-
     name, ext = os.path.splitext(file.filename)
     ext = ext.lower()
 
     if ext not in IMG_EXT:
         raise HTTPException(status_code=400, detail="Only image files allowed")
 
-    annotated, meta = detect_image(image_bytes)
-    image_name = name
-    
-    if custom_file_name:
-        object_name, file_path = save_image(annotated, custom_file_name)
-    else:
-        object_name, file_path = save_image(annotated, image_name)
+    # magic bytes are already checked by BodyLimitMiddleware while the body arrives (415 before it is spooled),
+    # read_upload() checks again, big uploads are memory-mapped from Starlette's spool file (app/uploads.py)
+    # (receiving the body is timed as upload_read by BodyLimitMiddleware)
+    image_bytes = await read_upload(file, UPLOAD_MAX_BYTES)
+    try:
+        return await _detect_uploaded(image_bytes, name, ext, custom_file_name, session)
+    finally:
+        release(image_bytes)
+
+def _source_written(detection_id, cache_key, path):
+    # runs once the upload is durable on disk (write-behind thread, or inline when the queue was full)
+    with Session(engine) as session:
+        record = session.get(Detections, detection_id)
+        if record is None:
+            # deleted before the flush, nothing points at the file any more
+            os.remove(path)
+            return
+        record.available = True
+        session.add(record)
+        session.commit()
+        if cache_key:
+            session.refresh(record)
+            result_cache.store(session, cache_key, record)
+
+def _source_failed(detection_id, path):
+    # write-behind could not store the upload: the row stays available=False, hidden from the lists
+    logger.error("Detection %s: upload %s was not stored", detection_id, path)
+
+async def _detect_uploaded(image_bytes, name, ext, custom_file_name, session):
+    cache_key = None
+    if RESULT_CACHE_ENABLED:
+        cache_key = await run_in_threadpool(result_cache.make_key, image_bytes)
+        # DB reads + possible hard link, kept off the event loop
+        cached = await run_in_threadpool(result_cache.lookup, session, cache_key)
+        if cached:
+            return JSONResponse({
+                "message": "Detections done",
+                "download_url": f"{cached.filepath}",
+                "Total Detections": f"{cached.num_detections}",
+                "cached": True,
+            })
+
+    try:
+        submitted = time.perf_counter()
+        meta = await batcher.submit(image_bytes)
+        metrics.observe_inference(meta, time.perf_counter() - submitted)
+    except QueueFullError:
+        raise HTTPException(
+            status_code=503,
+            detail="Server busy, try again shortly..!",
+            headers={"Retry-After": "1"},
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    image_name = os.path.splitext(custom_file_name)[0] if custom_file_name else name
+
+    # Only the upload bytes are stored, the annotated *_result.jpg is rendered on first view
+    # In memory uploads go to the write-behind writer after the commit, spooled (mmap) ones are written here
+    source_path = source_path_for(image_name, ext)
+    deferred = WRITE_BEHIND_ENABLED and isinstance(image_bytes, bytes)
+    if not deferred:
+        with metrics.timed("encode_write"):
+            await run_in_threadpool(write_source, source_path, image_bytes)
+    object_name = f"{image_name}_result.jpg"
+    file_path = result_path_for(source_path)
 
     total_detections = meta["num_detections"]
 
@@ -106,22 +213,230 @@ async def detect(
         num_detections=meta["num_detections"],
         classes_detected=meta["classes_detected"],
         confidence_avg=meta["confidence_avg"],
+        source_path=source_path,
+        boxes_json=dump_boxes(meta["boxes"]),
+        image_width=meta["image_size"][0],
+        image_height=meta["image_size"][1],
+        available=not deferred,
     )
 
-    session.add(record)
-    session.commit()
+    with metrics.timed("db_commit"):
+        session.add(record)
+        session.flush()  # gives record.id for the per-box rows, still one commit
+        session.add_all(box_rows(record.id, meta["boxes"]))
+        analytics.record(session, [(record, meta["boxes"])])
+        session.commit()
+
+    if deferred:
+        # the row is marked available (and the result cached) once the file is durable
+        on_done = partial(_source_written, record.id, cache_key)
+        if not writer.submit(source_path, image_bytes, on_done, partial(_source_failed, record.id)):
+            # write-behind queue full, back-pressure: this request writes the file itself
+            with metrics.timed("encode_write"):
+                await run_in_threadpool(write_source, source_path, image_bytes)
+            await run_in_threadpool(on_done, source_path)
+    elif cache_key:
+        # store() may evict (unlink) many cached files, not on the event loop
+        session.refresh(record)
+        await run_in_threadpool(result_cache.store, session, cache_key, record)
 
     return JSONResponse({
         "message": "Detections done",
         "download_url": f"{file_path}",
         "Total Detections": f"{total_detections}",
+        "cached": False,
     })
 
+@router.post("/detect-batch")
+async def detect_batch(
+    files: list[UploadFile] = File(None),
+    archive: UploadFile | None = File(None),
+    current_user: User = Depends(get_current_user)
+    ):
+    # Many files and/or one ZIP -> one NDJSON line per image (see app/batch_ingest.py)
+    if not files and archive is None:
+        raise HTTPException(status_code=400, detail="Send files or a ZIP archive")
+    if len(files or []) > BATCH_INGEST_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"Batch limit of {BATCH_INGEST_MAX_FILES} images")
+    if batcher.full():
+        raise HTTPException(status_code=503, detail="Server busy, try again shortly..!", headers={"Retry-After": "1"})
+
+    images = iter_images(files or [], archive, IMG_EXT)
+    stream = detect_stream(
+        images,
+        via_batcher(batcher.submit),
+        IMG_EXT,
+        chunk_size=BATCH_MAX_SIZE,
+        inflight=max(1, MODEL_WORKERS),
+        db_chunk=BATCH_DB_CHUNK,
+    )
+    return StreamingResponse(stream, media_type="application/x-ndjson")
+
+@router.websocket("/ws/detect")
+async def live_detect(websocket: WebSocket, token: Optional[str] = None):
+    # Binary JPEG frames in, compact box JSON out, stale frames are dropped (see app/live.py)
+    user = await run_in_threadpool(user_from_token, token)
+    if not user:
+        await websocket.close(code=1008)  # policy violation: no / bad token
+        return
+
+    await websocket.accept()
+    try:
+        stats = await live_session(websocket, batcher.submit, LIVE_MAX_FRAME_BYTES)
+        logger.debug("Live client %s left: %s", user.id, stats)
+    except WebSocketDisconnect:
+        logger.debug("Live client %s disconnected", user.id)
+
+@router.post("/detect-video")
+async def detect_video(
+    file: UploadFile = File(...),
+    custom_file_name: Optional[str] = Query(None),
+    frame_stride: int = Query(VIDEO_FRAME_STRIDE, ge=1),
+    mode: str = Query(VIDEO_MODE, pattern="^(stride|track)$"),
+    session: SessionDep = None,
+    current_user: User = Depends(get_current_user)
+    ):
+    name, ext = os.path.splitext(file.filename)
+    ext = ext.lower()
+
+    if ext not in VID_EXT:
+        raise HTTPException(status_code=400, detail="Only video files allowed")
+
+    video_name = os.path.splitext(custom_file_name)[0] if custom_file_name else name
+    object_name = f"{video_name}_result.mp4"
+    file_path = os.path.join(VID_SAVE_DIR, object_name)
+    upload_path = os.path.join(VID_SAVE_DIR, f"upload_{uuid.uuid4().hex}{ext}")
+
+    if model_pool.video_full():
+        raise HTTPException(status_code=503, detail="Server busy, try again shortly..!", headers={"Retry-After": "5"})
+    await run_in_threadpool(save_upload, file.file, upload_path)
+    try:
+        stats = await model_pool.run_video(
+            upload_path, file_path,
+            frame_stride=frame_stride,
+            batch_size=VIDEO_BATCH_SIZE,
+            queue_frames=VIDEO_QUEUE_FRAMES,
+            mode=mode,
+            max_stride=VIDEO_TRACK_MAX_STRIDE,
+            scene_threshold=VIDEO_SCENE_THRESHOLD,
+        )
+    except QueueFullError:
+        raise HTTPException(status_code=503, detail="Server busy, try again shortly..!", headers={"Retry-After": "5"})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        os.remove(upload_path)
+
+    record = VideoDetections(
+        filename=object_name,
+        filepath=file_path,
+        fps=stats["fps"],
+        frame_stride=stats["frame_stride"],
+        frames_total=stats["frames_total"],
+        frames_processed=stats["frames_processed"],
+        processing_time_ms=stats["processing_time_ms"],
+        inference_time_ms=stats["inference_time_ms"],
+        num_detections=stats["num_detections"],
+        max_detections_per_frame=stats["max_detections_per_frame"],
+        classes_detected=stats["classes_detected"],
+        confidence_avg=stats["confidence_avg"],
+    )
+
+    session.add(record)
+    session.commit()
+    session.refresh(record)
+
+    return {
+        "message": "Video detections done",
+        "video_id": record.id,
+        "download_url": file_path,
+        "frames_total": stats["frames_total"],
+        "frames_processed": stats["frames_processed"],
+        "mode": stats["mode"],
+        "Total Detections": stats["num_detections"],
+        "class_counts": stats["class_counts"],
+    }
+
+@router.post("/jobs/detect", status_code=202)
+async def create_detect_job(
+    file: UploadFile = File(...),
+    custom_file_name: Optional[str] = Query(None),
+    frame_stride: int = Query(VIDEO_FRAME_STRIDE, ge=1),
+    mode: str = Query(VIDEO_MODE, pattern="^(stride|track)$"),
+    session: SessionDep = None,
+    current_user: User = Depends(get_current_user)
+    ):
+    # Only stores the upload and queues it, a job worker does the inference (see app/jobs.py)
+    name, ext = os.path.splitext(file.filename)
+    ext = ext.lower()
+
+    if ext in IMG_EXT:
+        kind, save_dir = "image", UPLOAD_DIR
+    elif ext in VID_EXT:
+        kind, save_dir = "video", VID_SAVE_DIR
+    else:
+        raise HTTPException(status_code=400, detail="Only image or video files allowed")
+
+    job_name = os.path.splitext(custom_file_name)[0] if custom_file_name else name
+    input_path = os.path.join(save_dir, f"{job_name}_{uuid.uuid4().hex[:8]}{ext}")
+    await run_in_threadpool(save_upload, file.file, input_path)
+
+    params = {"frame_stride": frame_stride, "mode": mode} if kind == "video" else {}
+    job = jobs.enqueue(session, kind, job_name, ext, input_path, params)
+
+    return {
+        "message": "Detection job queued",
+        "job_id": job.id,
+        "status_url": f"/jobs/{job.id}",
+    }
+
+@router.get("/jobs/{job_id}")
+def get_detect_job(
+    job_id: int,
+    session: SessionDep,
+    current_user: User = Depends(get_current_user)
+    ):
+    job = session.get(DetectJobs, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return jobs.job_to_dict(session, job)
+
+@router.get("/video-detections")
+def get_video_detections(
+    session: SessionDep,
+    video_id: Optional[int] = None
+    ):
+    if video_id is not None:
+        record = session.get(VideoDetections, video_id)
+        if not record:
+            raise HTTPException(status_code=404, detail="Video detection not found")
+        return record
+
+    return session.exec(select(VideoDetections).order_by(VideoDetections.id.desc())).all()
+
+@router.get("/download-video")
+def download_video(
+    request: Request,
+    session: SessionDep,
+    video_id: int,
+    current_user: User = Depends(get_current_user)
+    ):
+    record = session.get(VideoDetections, video_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Record not found")
+
+    if not os.path.exists(record.filepath):
+        raise HTTPException(status_code=404, detail="File missing on server")
+
+    return serve_file(request, record.filepath, "video/mp4", filename=record.filename)
+
 @router.get("/detections")
 def get_detections(
     session: SessionDep, 
     file_name: Optional[str] = None, 
-    file_id: Optional[int] = None
+    file_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT)
     ):
     if file_id is not None:
         record = session.get(Detections, file_id)
@@ -129,19 +444,79 @@ def get_detections(
             raise HTTPException(status_code=404, detail="Detection not found")
         return record
 
+    # available=False: upload not on disk (yet), left out until it is
+    query = select(Detections).where(Detections.available.isnot(False))
     if file_name is not None:
-        query = select(Detections).where(Detections.filename == file_name)
-        records = session.exec(query).all()
-        return records
+        query = query.where(Detections.filename == file_name)
+
+    try:
+        records, next_cursor = paginate(session, query, Detections.id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"items": records, "next_cursor": next_cursor}
+
+@router.get("/detections/search")
+def search_detections(
+    session: SessionDep,
+    class_name: Optional[str] = None,
+    class_id: Optional[int] = None,
+    min_conf: float = Query(0.0, ge=0.0, le=1.0),
+    max_conf: float = Query(1.0, ge=0.0, le=1.0),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(get_current_user)
+    ):
+    # e.g. /detections/search?class_name=forklift&min_conf=0.8
+    # All filtering happens in SQL on the per-box table (index on class_id + confidence)
+    if class_id is None and class_name is not None:
+        class_id = session.exec(
+            select(DetectionBoxes.class_id).where(DetectionBoxes.class_name == class_name).limit(1)
+        ).first()
+        if class_id is None:
+            return []
+
+    query = (
+        select(
+            Detections,
+            func.count(DetectionBoxes.id).label("matched_boxes"),
+            func.max(DetectionBoxes.confidence).label("max_confidence"),
+        )
+        .join(DetectionBoxes, DetectionBoxes.detection_id == Detections.id)
+        .where(DetectionBoxes.confidence >= min_conf, DetectionBoxes.confidence <= max_conf)
+        .where(Detections.available.isnot(False))
+    )
+    if class_id is not None:
+        query = query.where(DetectionBoxes.class_id == class_id)
+    if start is not None:
+        query = query.where(Detections.timestamp >= start)
+    if end is not None:
+        query = query.where(Detections.timestamp <= end)
 
-    records = session.exec(select(Detections)).all()
-    return records
+    query = query.group_by(Detections.id).order_by(Detections.id.desc()).limit(limit)
+
+    return [
+        {
+            "id": record.id,
+            "filename": record.filename,
+            "filepath": record.filepath,
+            "timestamp": record.timestamp,
+            "num_detections": record.num_detections,
+            "matched_boxes": matched_boxes,
+            "max_confidence": max_confidence,
+        }
+        for record, matched_boxes, max_confidence in session.exec(query)
+    ]
 
 @router.get("/download")
 def download_file(
+    request: Request,
     session: SessionDep,
     file_name: str | None = Query(None),
     file_id: int | None = Query(None),
+    fmt: Optional[str] = Query(None, alias="format"),
+    quality: Optional[str] = Query(None),
     current_user: User = Depends(get_current_user)  # optional but recommended
     ):
     if not file_name and not file_id:
@@ -157,32 +532,44 @@ def download_file(
     if not record:
         raise HTTPException(status_code=404, detail="Record not found")
 
-    path = record.filepath
-
-    if not os.path.exists(path):
-        raise HTTPException(status_code=404, detail="File missing on server")
+    path, fmt = negotiated_path(request, record, fmt, quality)
+    filename = f"{os.path.splitext(record.filename)[0]}.{fmt}"
 
-    return FileResponse(
-        path,
-        media_type="image/jpeg",
-        filename=record.filename
-    )
+    response = serve_file(request, path, media_type(fmt), filename=filename)
+    response.headers["Vary"] = "Accept"
+    return response
 
 
 @router.delete("/detections/all")
 def delete_all_detections(
     session: SessionDep,
+    background_tasks: BackgroundTasks,
+    older_than_days: Optional[int] = Query(None, ge=0),
+    class_name: Optional[str] = None,
     current_user: User = Depends(get_current_user)
     ):
-    records = session.exec(select(Detections)).all()
-
-    for rec in records:
-        if os.path.exists(rec.filepath):
-            os.remove(rec.filepath)   # delete image file too
-        session.delete(rec)
+    # One set-based DELETE, files are unlinked afterwards by a background job
+    condition = reaper.build_filter(older_than_days=older_than_days, class_name=class_name)
+    job = reaper.enqueue_delete(session, condition)
+    background_tasks.add_task(reaper.reap_files, job.id)
+
+    return {
+        "message": "Detections cleared, files are being removed in the background",
+        "job_id": job.id,
+        "rows_deleted": job.rows_deleted,
+        "status_url": f"/detections/delete-jobs/{job.id}",
+    }
 
-    session.commit()
-    return {"message": "All detections cleared"}
+@router.get("/detections/delete-jobs/{job_id}")
+def delete_job_status(
+    job_id: int,
+    session: SessionDep,
+    current_user: User = Depends(get_current_user)
+    ):
+    job = session.get(DeleteJobs, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 @router.delete("/detections/id/{file_id}")
 def delete_by_id(
@@ -204,9 +591,10 @@ def delete_by_id(
     if not record:
         raise HTTPException(404, "Detection not found")
 
-    if os.path.exists(record.filepath):
-        os.remove(record.filepath)
+    remove_files(record)
 
+    session.exec(delete(DetectionBoxes).where(DetectionBoxes.detection_id == record.id))
+    result_cache.forget(session, [record.id])
     session.delete(record)
     session.commit()
 
@@ -215,17 +603,68 @@ def delete_by_id(
 @router.get("/detections-history")
 def detections_history(
     session: SessionDep,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    thumb_w: int = Query(256, ge=1),
     current_user: User = Depends(get_current_user)
     ):
-    records = session.exec(select(Detections).order_by(Detections.id.desc())).all()
+    try:
+        query = select(Detections).where(Detections.available.isnot(False))
+        records, next_cursor = paginate(session, query, Detections.id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # one canonical width per page, so every tile hits the same cached variant
+    thumb_w = snap_width(thumb_w)
+    return {
+        "items": [
+            {
+                "id": r.id,
+                "filename": r.filename,
+                "thumbnail_url": f"/detections/{r.id}/thumbnail?w={thumb_w}",
+                "num_detections": r.num_detections,
+                "timestamp": r.timestamp,
+            }
+            for r in records
+        ],
+        "next_cursor": next_cursor,
+    }
 
-    return [
-        {
-            "id": r.id,
-            "filename": r.filename,
-            "filepath": r.filepath,
-            "num_detections": r.num_detections,
-            "timestamp": r.timestamp,
-        }
-        for r in records
-    ]
\ No newline at end of file
+@router.get("/analytics")
+def get_analytics(
+    session: SessionDep,
+    granularity: str = Query("day", pattern="^(hour|day)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user)
+    ):
+    # Reads the hour / day rollups only, never the Detections table (see app/analytics.py)
+    end = end or datetime.utcnow()
+    start = start or end - (timedelta(days=2) if granularity == "hour" else timedelta(days=30))
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return analytics.query(session, granularity, analytics.bucket_start(start, granularity), end)
+
+@router.get("/detections/{detection_id}/thumbnail")
+def detection_thumbnail(
+    request: Request,
+    detection_id: int,
+    session: SessionDep,
+    w: int = Query(256, ge=1),
+    current_user: User = Depends(get_current_user)
+    ):
+    record = session.get(Detections, detection_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Detection not found")
+
+    path = rendered_path(record)
+    width = snap_width(w)
+    fmt = pick_format(request.headers.get("accept"))
+    try:
+        thumb = ensure_thumbnail(path, width, fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    response = serve_file(request, thumb, FORMATS[fmt][0])
+    response.headers["Vary"] = "Accept"
+    return response
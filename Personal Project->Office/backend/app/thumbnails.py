@@ -0,0 +1,65 @@
+import glob, os, uuid
+import cv2
+from app.config import THUMB_DIR, THUMBNAIL_WIDTHS, THUMBNAIL_QUALITY
+from app.encodings import pick_accepted
+
+'''
+Thumbnail variants
+    1. The history page shows 250px tiles, downloading the full annotated image for that is a waste.
+    2. /detections/{id}/thumbnail?w= resizes the annotated image once and keeps it on disk:
+        storage/thumbnails/{result name}_{w}.webp (or .jpg for clients that don't accept webp, same Accept rules as app/encodings.py)
+    3. Only a few fixed widths exist (THUMBNAIL_WIDTHS), any ?w= is snapped up to the next one,
+       so the cache can't be filled with one file per requested pixel width.
+    4. A variant older than its annotated image is rebuilt.
+    5. Named after the annotated file (unique per upload), not the row id: SQLite reuses the id of a
+       deleted row, and the reaper removes the old files only later.
+'''
+
+os.makedirs(THUMB_DIR, exist_ok=True)
+
+FORMATS = {
+    "webp": ("image/webp", [cv2.IMWRITE_WEBP_QUALITY, THUMBNAIL_QUALITY]),
+    "jpg": ("image/jpeg", [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_QUALITY]),
+}
+
+def snap_width(w):
+    for width in THUMBNAIL_WIDTHS:
+        if w <= width:
+            return width
+    return THUMBNAIL_WIDTHS[-1]
+
+def pick_format(accept_header):
+    return pick_accepted(accept_header, [("webp", FORMATS["webp"][0])])
+
+def _stem(annotated_path):
+    return os.path.splitext(os.path.basename(annotated_path))[0]
+
+def thumbnail_path(annotated_path, width, fmt):
+    return os.path.join(THUMB_DIR, f"{_stem(annotated_path)}_{width}.{fmt}")
+
+def ensure_thumbnail(source_path, width, fmt):
+    # Returns the thumbnail path, creating / refreshing it from source_path (the annotated image) if needed
+    path = thumbnail_path(source_path, width, fmt)
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(source_path):
+        return path
+
+    img = cv2.imread(source_path, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Annotated image could not be decoded")
+
+    h, w = img.shape[:2]
+    if w > width:
+        # INTER_AREA is the right filter for shrinking, no aliasing on the box edges
+        img = cv2.resize(img, (width, max(1, round(h * width / w))), interpolation=cv2.INTER_AREA)
+
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp.{fmt}"
+    cv2.imwrite(tmp_path, img, FORMATS[fmt][1])
+    os.replace(tmp_path, path)
+    return path
+
+def remove_thumbnails(annotated_path):
+    for path in glob.glob(os.path.join(THUMB_DIR, f"{glob.escape(_stem(annotated_path))}_*")):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,156 @@
+import cv2
+import numpy as np
+from app.detector import box_iou
+
+'''
+Tracker-assisted video (mode="track")
+    1. The detector only runs on keyframes, the frames in between get the keyframe boxes
+       moved along with the image content (sparse optical flow, Lucas-Kanade, on a small gray frame).
+    2. A frame becomes a keyframe when:
+        - `stride` frames went by since the last one
+        - the scene changed (small thumbnail differs a lot from the last keyframe's)
+        - most tracked boxes lost their feature points
+    3. The stride adapts:
+        - at every keyframe the tracked boxes are matched to the fresh detections by IoU,
+          good agreement -> the stride grows by one, poor agreement -> it is halved
+        - fast moving boxes cap the stride (a box may move ~MOTION_BUDGET of its size between keyframes)
+    4. Static CCTV footage ends up at max_stride, busy scenes go back towards stride 1.
+    5. Output boxes keep the same dicts as the detector (cls / name / conf / xyxy).
+'''
+
+TRACK_WIDTH = 320          # optical flow runs at this width
+THUMB_SIZE = (64, 36)      # scene change thumbnail
+MOTION_BUDGET = 0.25       # share of a box diagonal it may move before we want a fresh detection
+MIN_POINTS = 3
+
+def _gray(frame, width=TRACK_WIDTH):
+    h, w = frame.shape[:2]
+    scale = min(1.0, width / w)
+    small = cv2.resize(frame, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA) if scale < 1 else frame
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), scale
+
+def thumbnail(frame):
+    return cv2.cvtColor(cv2.resize(frame, THUMB_SIZE, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+def match_iou(tracked, detected):
+    # greedy IoU matching (ByteTrack style association, high score boxes only), mean IoU of the pairs
+    if not tracked and not detected:
+        return 1.0
+    if not tracked or not detected:
+        return 0.0
+    pairs = sorted(
+        ((box_iou(t["xyxy"], d["xyxy"]), i, j) for i, t in enumerate(tracked) for j, d in enumerate(detected)
+         if t["cls"] == d["cls"]),
+        reverse=True,
+    )
+    used_t, used_d, total = set(), set(), 0.0
+    for iou, i, j in pairs:
+        if i in used_t or j in used_d:
+            continue
+        used_t.add(i)
+        used_d.add(j)
+        total += iou
+    # unmatched boxes on either side count as IoU 0
+    return total / max(len(tracked), len(detected))
+
+class BoxTracker:
+    def __init__(self):
+        self.boxes = []
+        self._gray = None
+        self._scale = 1.0
+        self._points = []   # one (n, 1, 2) float32 array per box, in small-frame coordinates
+
+    def reset(self, frame, boxes):
+        self._gray, self._scale = _gray(frame)
+        self.boxes = [dict(b) for b in boxes]
+        self._points = [self._seed_points(b["xyxy"]) for b in self.boxes]
+
+    def _seed_points(self, xyxy):
+        h, w = self._gray.shape
+        x1, y1, x2, y2 = [int(round(v * self._scale)) for v in xyxy]
+        x1, y1 = max(0, x1), max(0, y1)
+        x2, y2 = min(w - 1, x2), min(h - 1, y2)
+        if x2 - x1 < 2 or y2 - y1 < 2:
+            return np.empty((0, 1, 2), np.float32)
+        points = cv2.goodFeaturesToTrack(self._gray[y1:y2, x1:x2], maxCorners=20, qualityLevel=0.01, minDistance=3)
+        if points is None or len(points) < MIN_POINTS:
+            # flat box (no corners), a 3x3 grid still follows the content
+            xs, ys = np.meshgrid(np.linspace(0.25, 0.75, 3) * (x2 - x1), np.linspace(0.25, 0.75, 3) * (y2 - y1))
+            points = np.stack([xs.ravel(), ys.ravel()], axis=1).reshape(-1, 1, 2)
+        return (points + np.array([x1, y1], np.float32)).astype(np.float32)
+
+    def propagate(self, frame):
+        # returns (boxes for this frame, max motion per frame as share of the box diagonal, share of boxes lost)
+        gray, _ = _gray(frame)
+        if not self.boxes:
+            self._gray = gray
+            return [], 0.0, 0.0
+
+        counts = [len(p) for p in self._points]
+        if sum(counts) == 0:
+            self._gray = gray
+            return self.boxes, 0.0, 1.0
+
+        old = np.concatenate([p for p in self._points if len(p)])
+        new, status, _ = cv2.calcOpticalFlowPyrLK(self._gray, gray, old, None, winSize=(15, 15), maxLevel=2)
+        status = status.ravel().astype(bool)
+
+        motion, lost, offset = 0.0, 0, 0
+        for i, count in enumerate(counts):
+            good = status[offset:offset + count]
+            moved = new[offset:offset + count][good]
+            before = old[offset:offset + count][good]
+            offset += count
+            if len(moved) < MIN_POINTS:
+                lost += 1
+                self._points[i] = moved.reshape(-1, 1, 2)
+                continue
+
+            dx, dy = np.median((moved - before).reshape(-1, 2), axis=0) / self._scale
+            x1, y1, x2, y2 = self.boxes[i]["xyxy"]
+            self.boxes[i]["xyxy"] = [x1 + dx, y1 + dy, x2 + dx, y2 + dy]
+            diagonal = max(1.0, float(np.hypot(x2 - x1, y2 - y1)))
+            motion = max(motion, float(np.hypot(dx, dy)) / diagonal)
+            self._points[i] = moved.reshape(-1, 1, 2)
+
+        self._gray = gray
+        return [dict(b, xyxy=[float(v) for v in b["xyxy"]]) for b in self.boxes], motion, lost / len(self.boxes)
+
+class KeyframeScheduler:
+    def __init__(self, max_stride: int = 12, min_stride: int = 1, scene_threshold: float = 25.0):
+        self.max_stride = max(1, max_stride)
+        self.min_stride = max(1, min(min_stride, self.max_stride))
+        self.scene_threshold = scene_threshold
+        self.stride = self.min_stride
+        self.since_keyframe = None
+        self._thumb = None
+        self._motion = 0.0
+
+    def is_keyframe(self, frame, lost_share: float = 0.0):
+        thumb = thumbnail(frame)
+        scene_changed = self._thumb is not None and float(np.abs(thumb - self._thumb).mean()) > self.scene_threshold
+        keyframe = (
+            self.since_keyframe is None
+            or self.since_keyframe + 1 >= self.stride
+            or scene_changed
+            or lost_share > 0.5
+        )
+        if keyframe:
+            self._thumb = thumb
+            self.since_keyframe = 0
+        else:
+            self.since_keyframe += 1
+        return keyframe
+
+    def observe_motion(self, motion: float):
+        self._motion = max(self._motion, motion)
+
+    def after_keyframe(self, agreement: float):
+        # agreement = IoU between what the tracker predicted and what the detector found
+        if agreement < 0.5:
+            self.stride = max(self.min_stride, self.stride // 2)
+        elif agreement > 0.7:
+            self.stride = min(self.max_stride, self.stride + 1)
+        if self._motion > 0:
+            self.stride = max(self.min_stride, min(self.stride, int(MOTION_BUDGET / self._motion)))
+        self._motion = 0.0
@@ -0,0 +1,181 @@
+import os, mmap, time
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from app import metrics
+
+'''
+Streaming upload ingest
+    1. BodyLimitMiddleware: the request body is counted while it is received,
+       over the limit -> 413 right away (Content-Length is checked before anything is read).
+       It also times multipart bodies (first -> last chunk) as the upload_read phase.
+    2. On the sniff_paths (single image uploads) it also follows the multipart stream up to the
+       first bytes of the first file part: not an image we can decode (magic bytes) -> 415 right there,
+       the rest of the body is never received or spooled.
+       (the first file part has to start within SNIFF_SCAN_BYTES of the body, otherwise only 5. checks it)
+    3. Starlette already spools each file part while parsing the form:
+       up to UPLOAD_SPOOL_MEMORY_BYTES in memory, the rest in an (unnamed) temp file.
+    4. read_upload() sniffs the first chunk again (all other routes, and anything 2. could not see),
+       not an image -> 415 before the upload is used, then:
+        - small uploads are read as bytes
+        - spooled ones are memory-mapped in place (MappedUpload), no second copy on disk or in memory
+    5. A MappedUpload works everywhere bytes did (np.frombuffer, hashlib, f.write, PIL),
+       the decoder reads the pages straight from the page cache.
+    6. Sent to a model worker process only /proc/<pid>/fd/<fd> is pickled, the worker maps the same file
+       (no procfs -> the bytes are pickled as before).
+    7. Peak memory per request = UPLOAD_SPOOL_MEMORY_BYTES..!
+    - release() closes the mapping, Starlette deletes the temp file when the request is done.
+'''
+
+CHUNK_SIZE = 64 * 1024
+SNIFF_BYTES = 16             # enough for every signature in sniff()
+SNIFF_SCAN_BYTES = 64 * 1024 # how far into the body the middleware looks for the first file part
+
+def sniff(head: bytes):
+    # Image format from the first bytes of the file, None = not an image we can decode
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"avif", b"avis"):
+        return "avif"
+    if head.startswith(b"BM"):
+        return "bmp"
+    if head[:4] in (b"II*\x00", b"MM\x00*"):
+        return "tiff"
+    return None
+
+class MappedUpload(mmap.mmap):
+    # read-only mapping of an open (spooled) file, pickles as a path to that same open file
+    def __new__(cls, raw):
+        self = super().__new__(cls, raw.fileno(), 0, access=mmap.ACCESS_READ)
+        self.path = f"/proc/{os.getpid()}/fd/{raw.fileno()}"
+        return self
+
+    def __reduce__(self):
+        if os.path.isdir("/proc/self/fd"):
+            return _reopen, (self.path,)
+        return bytes, (self[:],)
+
+def _reopen(path):
+    try:
+        with open(path, "rb") as f:
+            return MappedUpload(f)
+    except (OSError, ValueError):
+        # request already gone (temp file closed), the image just fails to decode
+        return b""
+
+def _boundary(content_type: bytes):
+    for param in content_type.split(b";")[1:]:
+        key, _, value = param.strip().partition(b"=")
+        if key.lower() == b"boundary":
+            return value.strip(b'"')
+    return None
+
+def first_file_head(buf: bytes, boundary: bytes):
+    # (done, head): first bytes of the first file part in a multipart body prefix,
+    # done=False -> more of the body is needed, head=None -> there is no file part
+    delim = b"--" + boundary
+    start = buf.find(delim)
+    while start >= 0:
+        headers_at = start + len(delim)
+        if buf[headers_at:headers_at + 2] == b"--":
+            return True, None
+        headers_end = buf.find(b"\r\n\r\n", headers_at)
+        if headers_end < 0:
+            return False, None
+        data_at = headers_end + 4
+        if b"filename=" in buf[headers_at:headers_end].lower():
+            end = buf.find(b"\r\n" + delim, data_at)
+            if end >= 0:
+                return True, buf[data_at:end]
+            if len(buf) - data_at >= SNIFF_BYTES:
+                return True, buf[data_at:data_at + SNIFF_BYTES]
+            return False, None
+        start = buf.find(b"\r\n" + delim, data_at)
+        if start >= 0:
+            start += 2
+    return False, None
+
+def _too_large(max_bytes):
+    return HTTPException(status_code=413, detail=f"Upload too large (max {max_bytes} bytes)")
+
+async def read_upload(upload, max_bytes: int):
+    if upload.size is not None and upload.size > max_bytes:
+        raise _too_large(max_bytes)
+    head = await upload.read(CHUNK_SIZE)
+    if not sniff(head):
+        raise HTTPException(status_code=415, detail="Unsupported image format")
+    await upload.seek(0)
+
+    # SpooledTemporaryFile keeps small uploads in a BytesIO, bigger ones in a real temp file
+    spooled = upload.file
+    raw = getattr(spooled, "_file", spooled)
+    try:
+        raw.fileno()
+    except (OSError, AttributeError):
+        return await upload.read()
+    raw.flush()
+    return MappedUpload(raw)
+
+def release(data):
+    if not isinstance(data, MappedUpload):
+        return
+    try:
+        data.close()
+    except BufferError:
+        pass  # a decoder still holds a view, the mapping goes away with it
+
+class BodyLimitMiddleware:
+    # limits = {path: max bytes}, other requests get default_max
+    # sniff_paths = routes whose (first) file part must be an image, checked while it arrives
+    def __init__(self, app, default_max: int, limits: dict = None, sniff_paths=()):
+        self.app = app
+        self.default_max = default_max
+        self.limits = limits or {}
+        self.sniff_paths = set(sniff_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT", "PATCH"):
+            return await self.app(scope, receive, send)
+
+        max_bytes = self.limits.get(scope["path"], self.default_max)
+        length = dict(scope["headers"]).get(b"content-length")
+        if length and length.isdigit() and int(length) > max_bytes:
+            response = JSONResponse({"detail": f"Upload too large (max {max_bytes} bytes)"}, status_code=413)
+            return await response(scope, receive, send)
+
+        received = 0
+        content_type = dict(scope["headers"]).get(b"content-type", b"")
+        timed = content_type.startswith(b"multipart/form-data")
+        started = None
+        # prefix of the body kept until the first file part could be sniffed, None = nothing to check
+        boundary = _boundary(content_type) if timed and scope["path"] in self.sniff_paths else None
+        prefix = b"" if boundary else None
+
+        async def limited_receive():
+            nonlocal received, started, prefix
+            message = await receive()
+            if message["type"] == "http.request":
+                if started is None:
+                    started = time.perf_counter()
+                body = message.get("body", b"")
+                received += len(body)
+                if received > max_bytes:
+                    # raised inside the body parser, FastAPI turns it into the 413 response
+                    raise _too_large(max_bytes)
+                if prefix is not None:
+                    prefix += body
+                    done, head = first_file_head(prefix, boundary)
+                    if done or len(prefix) > SNIFF_SCAN_BYTES or not message.get("more_body", False):
+                        prefix = None  # decided (or gave up, read_upload() still checks)
+                    if done and head is not None and not sniff(head):
+                        raise HTTPException(status_code=415, detail="Unsupported image format")
+                if timed and not message.get("more_body", False):
+                    metrics.observe("upload_read", time.perf_counter() - started)
+            return message
+
+        await self.app(scope, limited_receive, send)
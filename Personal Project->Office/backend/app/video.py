@@ -0,0 +1,165 @@
+import cv2
+import queue, threading
+import time
+from collections import Counter
+from app.detector import extract_boxes, draw_boxes, INFERENCE_PARAMS
+from app.tracking import BoxTracker, KeyframeScheduler, match_iou
+
+'''
+Frame-by-frame video pipeline
+    1. decode thread  -> reads frames from the file one at a time
+    2. inference      -> runs the model on every frame_stride-th frame, in small batches
+    3. encode thread  -> draws the boxes and writes the annotated MP4
+    - The stages are connected with bounded queues, so at most a few dozen frames are in memory.
+    - Memory stays flat no matter how long the clip is..!
+    - Frames skipped by the stride get the boxes of the last processed frame.
+    - mode="track": keyframes are picked adaptively and the boxes in between follow the objects (see tracking.py).
+'''
+
+_END = object()
+
+def _decode(cap, frames_q, stop):
+    index = 0
+    while not stop.is_set():
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames_q.put((index, frame))
+        index += 1
+    frames_q.put(_END)
+
+def _encode(writer, out_q):
+    while True:
+        item = out_q.get()
+        if item is _END:
+            break
+        frame, boxes = item
+        writer.write(draw_boxes(frame, boxes))
+
+def process_video(
+    model, input_path, output_path, frame_stride: int = 1, batch_size: int = 8, queue_frames: int = 32,
+    mode: str = "stride", max_stride: int = 12, scene_threshold: float = 25.0,
+):
+    cap = cv2.VideoCapture(input_path)
+    if not cap.isOpened():
+        raise ValueError("Could not open video")
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+
+    frame_stride = max(1, frame_stride)
+    frames_q = queue.Queue(maxsize=queue_frames)
+    out_q = queue.Queue(maxsize=queue_frames)
+    stop = threading.Event()
+
+    decoder = threading.Thread(target=_decode, args=(cap, frames_q, stop), daemon=True)
+    encoder = threading.Thread(target=_encode, args=(writer, out_q), daemon=True)
+    decoder.start()
+    encoder.start()
+
+    stats = {
+        "frames_total": 0,
+        "frames_processed": 0,
+        "num_detections": 0,
+        "max_detections_per_frame": 0,
+        "inference_time_ms": 0.0,
+    }
+    class_counts = Counter()
+    conf_sum = 0.0
+    last_boxes = []
+    start = time.perf_counter()
+
+    def detect(frames):
+        t0 = time.perf_counter()
+        results = model(frames, **INFERENCE_PARAMS)
+        stats["inference_time_ms"] += (time.perf_counter() - t0) * 1000
+        return [extract_boxes(r, model.names) for r in results]
+
+    def count(boxes):
+        nonlocal conf_sum
+        stats["frames_processed"] += 1
+        stats["num_detections"] += len(boxes)
+        stats["max_detections_per_frame"] = max(stats["max_detections_per_frame"], len(boxes))
+        class_counts.update(box["name"] for box in boxes)
+        conf_sum += sum(box["conf"] for box in boxes)
+
+    def flush(chunk):
+        nonlocal last_boxes
+        keyframes = [frame for index, frame in chunk if index % frame_stride == 0]
+        boxes_per_keyframe = iter(detect(keyframes) if keyframes else [])
+
+        for index, frame in chunk:
+            if index % frame_stride == 0:
+                last_boxes = next(boxes_per_keyframe)
+                count(last_boxes)
+            stats["frames_total"] += 1
+            out_q.put((frame, last_boxes))
+
+    def track():
+        # one frame at a time, whether the next frame is a keyframe depends on this one
+        tracker = BoxTracker()
+        scheduler = KeyframeScheduler(max_stride=max_stride, scene_threshold=scene_threshold)
+        lost = 0.0
+        while True:
+            item = frames_q.get()
+            if item is _END:
+                break
+            _, frame = item
+            if scheduler.is_keyframe(frame, lost):
+                boxes = detect([frame])[0]
+                if stats["frames_processed"]:
+                    scheduler.after_keyframe(match_iou(tracker.boxes, boxes))
+                tracker.reset(frame, boxes)
+                count(boxes)
+                lost = 0.0
+            else:
+                boxes, motion, lost = tracker.propagate(frame)
+                scheduler.observe_motion(motion)
+            stats["frames_total"] += 1
+            out_q.put((frame, boxes))
+
+    try:
+        if mode == "track":
+            track()
+        # chunk = up to batch_size keyframes, never more than queue_frames frames
+        chunk = []
+        keyframes_in_chunk = 0
+        while mode != "track":
+            item = frames_q.get()
+            if item is _END:
+                break
+            chunk.append(item)
+            if item[0] % frame_stride == 0:
+                keyframes_in_chunk += 1
+            if keyframes_in_chunk >= batch_size or len(chunk) >= queue_frames:
+                flush(chunk)
+                chunk = []
+                keyframes_in_chunk = 0
+        if chunk:
+            flush(chunk)
+    finally:
+        stop.set()
+        # unblock the decoder if it is waiting on a full queue
+        while decoder.is_alive():
+            try:
+                frames_q.get_nowait()
+            except queue.Empty:
+                decoder.join(timeout=0.1)
+        out_q.put(_END)
+        encoder.join()
+        writer.release()
+        cap.release()
+
+    stats["processing_time_ms"] = (time.perf_counter() - start) * 1000
+    stats["fps"] = fps
+    stats["mode"] = mode
+    if mode == "track":
+        # average distance between keyframes
+        frame_stride = round(stats["frames_total"] / stats["frames_processed"]) if stats["frames_processed"] else 1
+    stats["frame_stride"] = frame_stride
+    stats["classes_detected"] = ",".join(name for name, _ in class_counts.most_common())
+    stats["class_counts"] = dict(class_counts)
+    stats["confidence_avg"] = conf_sum / stats["num_detections"] if stats["num_detections"] else 0.0
+    return stats
@@ -0,0 +1,117 @@
+import os, queue, threading, uuid, logging
+from app.config import WRITE_BEHIND_WORKERS, WRITE_BEHIND_MAX_BYTES, WRITE_FSYNC
+
+'''
+Write-behind file writer
+    1. The request hands the bytes to submit() and answers, disk latency is no longer in its p99.
+    2. Writer threads drain the queue: temp file -> (fsync) -> rename -> (fsync folder) -> on_done().
+    3. on_done() marks the Detections row available, only once the file is durable (WRITE_FSYNC=always).
+    4. Until then read(path) returns the bytes from memory, so a view right after the detection still works.
+       Rows with available=False are left out of the lists and only served from that buffer.
+    - A failed write is logged and on_error() is called, the row stays available=False for good.
+    5. The queue is bounded in bytes (WRITE_BEHIND_MAX_BYTES):
+        - full -> submit() returns False and the caller writes the file itself, memory never grows without limit
+    - stop() (app shutdown) waits for everything queued to be on disk.
+'''
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+class WriteBehind:
+    def __init__(self, workers: int = 2, max_bytes: int = 64 * 1024 * 1024, fsync: str = "always"):
+        self.workers = max(1, workers)
+        self.max_bytes = max_bytes
+        self.fsync = fsync == "always"
+        self._queue = queue.Queue()
+        self._pending = {}  # path -> bytes not on disk yet
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._threads = [
+                threading.Thread(target=self._run, name=f"write-behind-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, path, data, on_done=None, on_error=None):
+        # False = not queued (no room / not plain bytes), the caller has to write the file
+        if not isinstance(data, bytes):
+            return False
+        with self._lock:
+            if self._bytes + len(data) > self.max_bytes or path in self._pending:
+                return False
+            self._pending[path] = data
+            self._bytes += len(data)
+        self.start()
+        self._queue.put((path, data, on_done, on_error))
+        return True
+
+    def read(self, path):
+        # bytes of a file still waiting to be written, None if it is on disk (or unknown)
+        with self._lock:
+            return self._pending.get(path)
+
+    def _write(self, path, data):
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        if self.fsync:
+            # the rename itself is only durable once the folder is synced
+            fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                return
+            path, data, on_done, on_error = item
+            try:
+                self._write(path, data)
+            except Exception:
+                logger.exception("Write-behind failed for %s", path)
+                if on_error:
+                    self._call(on_error, path)
+            else:
+                if on_done:
+                    self._call(on_done, path)
+            finally:
+                with self._lock:
+                    self._pending.pop(path, None)
+                    self._bytes -= len(data)
+                self._queue.task_done()
+
+    def _call(self, callback, path):
+        try:
+            callback(path)
+        except Exception:
+            logger.exception("Write-behind callback failed for %s", path)
+
+    def flush(self):
+        # blocks until everything queued so far is written
+        self._queue.join()
+
+    def stop(self):
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(_STOP)
+        for thread in threads:
+            thread.join()
+
+writer = WriteBehind(WRITE_BEHIND_WORKERS, WRITE_BEHIND_MAX_BYTES, WRITE_FSYNC)
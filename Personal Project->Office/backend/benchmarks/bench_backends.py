@@ -0,0 +1,93 @@
+import argparse, glob, json, os, statistics, sys, time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import MODEL_PATH, UPLOAD_DIR
+from app.quantize import IMAGE_GLOBS
+from app.detector import BACKENDS, INFERENCE_PARAMS, load_model, decode_image, extract_boxes, box_iou
+
+'''
+Backend benchmark
+    Runs the same images through every inference backend and reports:
+        - load time, p50 / p95 latency per image, images/sec
+        - agreement with the torch backend (same boxes, same classes)
+    Usage (from the backend folder):
+        python -m benchmarks.bench_backends --backends torch onnx openvino --runs 20
+'''
+
+def load_images(folder, limit):
+    paths = sorted(path for ext in IMAGE_GLOBS for path in glob.glob(os.path.join(folder, ext)))[:limit]
+    images = []
+    for path in paths:
+        with open(path, "rb") as f:
+            images.append(decode_image(f.read()))
+    if not images:
+        # no stored images yet, use random noise so the timings still mean something
+        rng = np.random.default_rng(0)
+        images = [rng.integers(0, 255, (720, 1280, 3), dtype=np.uint8) for _ in range(4)]
+    return images
+
+def agreement(reference, boxes, threshold=0.9):
+    # share of reference boxes matched by a box of the same class with IoU >= threshold
+    matched, total = 0, 0
+    for ref_boxes, other_boxes in zip(reference, boxes):
+        total += len(ref_boxes)
+        used = set()
+        for ref in ref_boxes:
+            for i, box in enumerate(other_boxes):
+                if i not in used and box["cls"] == ref["cls"] and box_iou(box["xyxy"], ref["xyxy"]) >= threshold:
+                    used.add(i)
+                    matched += 1
+                    break
+    return matched / total if total else 1.0
+
+def bench(backend, images, runs):
+    start = time.perf_counter()
+    model = load_model(MODEL_PATH, backend)
+    model(images[0], **INFERENCE_PARAMS, verbose=False)  # warm-up
+    load_ms = (time.perf_counter() - start) * 1000
+
+    latencies, boxes = [], []
+    for run in range(runs):
+        for img in images:
+            t0 = time.perf_counter()
+            result = model(img, **INFERENCE_PARAMS, verbose=False)[0]
+            latencies.append((time.perf_counter() - t0) * 1000)
+            if run == 0:
+                boxes.append(extract_boxes(result, model.names))
+
+    latencies.sort()
+    return {
+        "load_ms": load_ms,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))],
+        "mean_ms": statistics.fmean(latencies),
+        "images_per_sec": 1000 / statistics.fmean(latencies),
+    }, boxes
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare CPU inference backends")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--images", default=UPLOAD_DIR)  # raw uploads, not the annotated results
+    parser.add_argument("--limit", type=int, default=16)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.limit)
+    report, reference = {}, None
+    for backend in args.backends:
+        try:
+            stats, boxes = bench(backend, images, args.runs)
+        except Exception as e:  # backend runtime not installed
+            report[backend] = {"error": str(e)}
+            continue
+        if reference is None:
+            reference = boxes
+        stats["agreement_vs_" + args.backends[0]] = agreement(reference, boxes)
+        report[backend] = stats
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
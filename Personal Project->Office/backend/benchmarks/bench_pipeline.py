@@ -0,0 +1,413 @@
+import argparse, http.client, json, os, platform, sqlite3, subprocess, sys, tempfile, threading, time, uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import cv2
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(os.path.dirname(BACKEND_DIR))
+FLASK_BACKEND_DIR = os.path.join(REPO_DIR, "FlaskOffice", "backend")
+
+sys.path.insert(0, BACKEND_DIR)
+
+'''
+Detection pipeline benchmark
+    Targets:
+        - detector : detect_images() in this process, one call per batch (no HTTP, no DB)
+        - fastapi  : Personal Project->Office backend under uvicorn, POST /detect-image
+        - flask    : FlaskOffice backend under `flask run` (threaded), POST /detect-image
+        - flask-gunicorn : FlaskOffice under gunicorn.conf.py (model preloaded before fork, gthread workers)
+        - encodings : the annotated result in every output profile (app/encodings.py), reports
+                      bytes per image (bandwidth) and encode time, both relative to the stored JPEG
+    For every image size x concurrency it reports images/sec, p50 / p95 / p99 latency and peak RSS
+    (the server process + its model workers for the HTTP targets) as JSON, so two commits can be diffed.
+    For a process tree the memory is summed as PSS when the kernel offers it, so weights shared
+    copy-on-write between forked workers are not counted once per worker.
+
+    The servers are started by the script itself, each on a throw-away sqlite database + storage folder,
+    with the result cache off (every request really runs the model) and SQL logging off.
+    --backend stub (default when the weights file is missing) uses the deterministic stub model,
+    so the numbers mean the same thing on every machine.
+
+    Usage (from the Personal Project->Office/backend folder):
+        python -m benchmarks.bench_pipeline --targets detector fastapi flask --out bench.json
+        python -m benchmarks.bench_pipeline --targets fastapi --sizes 1920x1080 --concurrency 1 8 32 --requests 400
+        python -m benchmarks.bench_pipeline --targets encodings --sizes 1280x720 1920x1080
+'''
+
+SECRET_KEY = "mysecretkey"  # same as app/auth.py in both servers
+BENCH_EMAIL = "bench@example.com"
+
+SERVERS = {
+    "fastapi": {
+        "cwd": BACKEND_DIR,
+        "cmd": lambda port: [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+    },
+    "flask": {
+        "cwd": FLASK_BACKEND_DIR,
+        "cmd": lambda port: [sys.executable, "-m", "flask", "--app", "app.main", "run", "--port", str(port), "--with-threads"],
+    },
+    "flask-gunicorn": {
+        "cwd": FLASK_BACKEND_DIR,
+        "cmd": lambda port: [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}", "app.main:app"],
+    },
+}
+TARGETS = ["detector"] + list(SERVERS) + ["encodings"]
+
+def make_images(width, height, count, seed=0):
+    # deterministic JPEGs: gradient background + a few filled rectangles, different per index
+    images = []
+    for i in range(count):
+        rng = np.random.default_rng(seed * 1000 + i)
+        ramp = np.linspace(0, 255, width, dtype=np.uint8)
+        img = np.dstack([np.tile(ramp, (height, 1))] * 3)
+        img = (img.astype(np.int16) + rng.integers(-20, 20, 3)).clip(0, 255).astype(np.uint8)
+        for _ in range(6):
+            x1, y1 = int(rng.integers(0, width - 10)), int(rng.integers(0, height - 10))
+            x2, y2 = min(width - 1, x1 + int(rng.integers(10, width // 3))), min(height - 1, y1 + int(rng.integers(10, height // 3)))
+            cv2.rectangle(img, (x1, y1), (x2, y2), [int(c) for c in rng.integers(0, 255, 3)], -1)
+        images.append(cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes())
+    return images
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * q
+    lower = int(k)
+    upper = min(lower + 1, len(values) - 1)
+    return round(values[lower] + (values[upper] - values[lower]) * (k - lower), 2)
+
+def latency_summary(latencies_ms):
+    return {
+        "p50": percentile(latencies_ms, 0.50),
+        "p95": percentile(latencies_ms, 0.95),
+        "p99": percentile(latencies_ms, 0.99),
+        "mean": round(sum(latencies_ms) / len(latencies_ms), 2) if latencies_ms else None,
+    }
+
+def _rss_kb(pid):
+    # PSS (shared pages split between the processes sharing them), plain RSS on older kernels
+    for path, key in ((f"/proc/{pid}/smaps_rollup", "Pss:"), (f"/proc/{pid}/status", "VmRSS:")):
+        try:
+            with open(path) as f:
+                for line in f:
+                    if line.startswith(key):
+                        return int(line.split()[1])
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            continue
+    return 0
+
+def _children(pid):
+    children = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                children += [int(c) for c in f.read().split()]
+    except FileNotFoundError:
+        pass
+    return children
+
+def tree_rss_kb(pid):
+    # the process + every descendant (model worker processes), Linux /proc only
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        total += _rss_kb(current)
+        stack += _children(current)
+    return total
+
+class PeakRSS:
+    # samples the RSS of a process tree in the background, keeps the peak
+    def __init__(self, pid, interval=0.02):
+        self.pid = pid
+        self.interval = interval
+        self.peak_kb = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_kb = max(self.peak_kb, tree_rss_kb(self.pid))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_kb = max(self.peak_kb, tree_rss_kb(self.pid))
+
+    @property
+    def peak_mb(self):
+        return round(self.peak_kb / 1024, 1) if self.peak_kb else None
+
+# ---------- detector target ----------
+
+def bench_detector(backend, sizes, batch_sizes, requests, images_per_size):
+    from app.config import MODEL_PATH
+    from app.detector import detect_images, load_model
+
+    model = load_model(MODEL_PATH, backend)
+    results = []
+    for width, height in sizes:
+        images = make_images(width, height, images_per_size, seed=width * height)
+        detect_images(model, images[:1])  # warm-up
+        for batch_size in batch_sizes:
+            calls = max(1, requests // batch_size)
+            latencies = []
+            with PeakRSS(os.getpid()) as rss:
+                start = time.perf_counter()
+                for i in range(calls):
+                    batch = [images[(i * batch_size + j) % len(images)] for j in range(batch_size)]
+                    t0 = time.perf_counter()
+                    detect_images(model, batch)
+                    latencies.append((time.perf_counter() - t0) * 1000)
+                elapsed = time.perf_counter() - start
+            results.append({
+                "target": "detector",
+                "backend": backend,
+                "image_size": f"{width}x{height}",
+                "batch_size": batch_size,
+                "requests": calls * batch_size,
+                "errors": 0,
+                "images_per_sec": round(calls * batch_size / elapsed, 2),
+                "latency_ms": latency_summary(latencies),  # per detect_images() call
+                "peak_rss_mb": rss.peak_mb,
+            })
+    return results
+
+def bench_encodings(backend, sizes, images_per_size):
+    from app.config import MODEL_PATH, RESULT_JPEG_QUALITY
+    from app.detector import detect_images, load_model, render_annotated
+    from app.encodings import FORMATS, TIERS, encode, is_stored_profile
+
+    model = load_model(MODEL_PATH, backend)
+    results = []
+    for width, height in sizes:
+        images = make_images(width, height, images_per_size, seed=width * height)
+        # the same overlay the API serves: boxes from the model, drawn on the upload
+        annotated = [render_annotated(image, meta["boxes"]) for image, meta in zip(images, detect_images(model, images))]
+
+        profiles = {}
+        for fmt in FORMATS:
+            for tier in TIERS:
+                sizes_bytes, encode_ms = [], []
+                for img in annotated:
+                    data, ms = encode(img, fmt, tier)
+                    sizes_bytes.append(len(data))
+                    encode_ms.append(ms)
+                profiles[(fmt, tier)] = (sizes_bytes, encode_ms)
+
+        stored = next(key for key in profiles if is_stored_profile(*key, RESULT_JPEG_QUALITY))
+        stored_bytes = sum(profiles[stored][0])
+        stored_ms = sum(profiles[stored][1])
+        for (fmt, tier), (sizes_bytes, encode_ms) in profiles.items():
+            results.append({
+                "target": "encodings",
+                "image_size": f"{width}x{height}",
+                "profile": f"{fmt}-{tier}",
+                "quality": FORMATS[fmt][2][tier],
+                "images": len(sizes_bytes),
+                "bytes_mean": round(sum(sizes_bytes) / len(sizes_bytes)),
+                "bytes_vs_stored": round(sum(sizes_bytes) / stored_bytes, 3),  # < 1 = bandwidth saved per view
+                "encode_ms": latency_summary(encode_ms),  # paid once per image and profile, then cached on disk
+                "encode_vs_stored": round(sum(encode_ms) / stored_ms, 2),
+            })
+    return results
+
+# ---------- HTTP targets ----------
+
+def make_token(email):
+    from jose import jwt
+    return jwt.encode({"sub": email, "exp": datetime.now(timezone.utc) + timedelta(hours=2)}, SECRET_KEY, algorithm="HS256")
+
+def multipart(field, filename, data, content_type="image/jpeg"):
+    boundary = uuid.uuid4().hex
+    head = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode()
+    return head + data + f"\r\n--{boundary}--\r\n".encode(), f"multipart/form-data; boundary={boundary}"
+
+def wait_for(process, port, path, timeout, expect=200):
+    deadline = time.time() + timeout
+    while time.time() < deadline and process.poll() is None:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", path)
+            if conn.getresponse().status == expect:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.25)
+    return False
+
+def add_bench_user(db_path):
+    # both servers create the "user" table at start-up, the token only needs a matching row
+    with sqlite3.connect(db_path) as conn:
+        if not conn.execute('SELECT 1 FROM "user" WHERE email = ?', (BENCH_EMAIL,)).fetchone():
+            conn.execute('INSERT INTO "user" (name, email, hashed_password) VALUES (?, ?, ?)', ("bench", BENCH_EMAIL, "x"))
+
+def start_server(target, backend, port, workdir, extra_env):
+    db_path = os.path.join(workdir, f"{target}.db")
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{db_path}",
+        "STORAGE_DIR": os.path.join(workdir, f"{target}_storage"),
+        "INFERENCE_BACKEND": backend,
+        "SQL_ECHO": "0",
+        "RESULT_CACHE_ENABLED": "0",   # every request must really run the model
+        "JOB_WORKER_IN_API": "0",
+    })
+    env.update(extra_env)
+    log = open(os.path.join(workdir, f"{target}.log"), "w")
+    process = subprocess.Popen(SERVERS[target]["cmd"](port), cwd=SERVERS[target]["cwd"], env=env, stdout=log, stderr=subprocess.STDOUT)
+    return process, db_path, log
+
+def post_image(conn, token, image, name):
+    body, content_type = multipart("file", name, image)
+    t0 = time.perf_counter()
+    conn.request("POST", "/detect-image", body=body, headers={"Content-Type": content_type, "Authorization": f"Bearer {token}"})
+    response = conn.getresponse()
+    response.read()
+    return response.status, (time.perf_counter() - t0) * 1000
+
+def run_load(port, token, images, concurrency, requests):
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def client():
+        nonlocal errors
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            try:
+                status, ms = post_image(conn, token, images[i % len(images)], f"bench_{i}.jpg")
+            except OSError:
+                status, ms = 0, 0.0
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+            with lock:
+                if status == 200:
+                    latencies.append(ms)
+                else:
+                    errors += 1
+        conn.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client)
+    return latencies, errors, time.perf_counter() - start
+
+def bench_server(target, backend, sizes, concurrency_levels, requests, images_per_size, port, workdir, extra_env, ready_timeout):
+    process, db_path, log = start_server(target, backend, port, workdir, extra_env)
+    try:
+        if not wait_for(process, port, "/health", ready_timeout):
+            return [{"target": target, "backend": backend, "error": f"server did not start, see {log.name}"}]
+        add_bench_user(db_path)
+        if not wait_for(process, port, "/ready", ready_timeout):
+            return [{"target": target, "backend": backend, "error": f"model not ready, see {log.name}"}]
+        token = make_token(BENCH_EMAIL)
+
+        results = []
+        for width, height in sizes:
+            images = make_images(width, height, images_per_size, seed=width * height)
+            run_load(port, token, images, 1, min(5, requests))  # warm-up
+            for concurrency in concurrency_levels:
+                with PeakRSS(process.pid) as rss:
+                    latencies, errors, elapsed = run_load(port, token, images, concurrency, requests)
+                results.append({
+                    "target": target,
+                    "backend": backend,
+                    "image_size": f"{width}x{height}",
+                    "concurrency": concurrency,
+                    "requests": requests,
+                    "errors": errors,
+                    "images_per_sec": round(len(latencies) / elapsed, 2),
+                    "latency_ms": latency_summary(latencies),  # per request, client side
+                    "peak_rss_mb": rss.peak_mb,
+                })
+        return results
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=20)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        log.close()
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def parse_size(value):
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+def main():
+    from app.config import MODEL_PATH
+
+    parser = argparse.ArgumentParser(description="Benchmark the detection pipeline and both API servers")
+    parser.add_argument("--targets", nargs="+", default=["detector", "fastapi", "flask"], choices=TARGETS)
+    parser.add_argument("--backend", default="torch" if os.path.exists(MODEL_PATH) else "stub",
+                        help="inference backend, stub = deterministic fake model (default when the weights are missing)")
+    parser.add_argument("--sizes", nargs="+", type=parse_size, default=[(640, 480), (1280, 720), (1920, 1080)])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16],
+                        help="parallel clients for the servers, batch size for the detector target")
+    parser.add_argument("--requests", type=int, default=100, help="images per size x concurrency case")
+    parser.add_argument("--images-per-size", type=int, default=16)
+    parser.add_argument("--model-workers", default=None, help="MODEL_WORKERS for the FastAPI server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ready-timeout", type=float, default=180)
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    extra_env = {}
+    if args.model_workers is not None:
+        extra_env["MODEL_WORKERS"] = args.model_workers
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "backend": args.backend,
+            "requests": args.requests,
+        },
+        "results": [],
+    }
+
+    with tempfile.TemporaryDirectory(prefix="bench_") as workdir:
+        for target in args.targets:
+            print(f"Benchmarking {target}...", file=sys.stderr)
+            if target == "detector":
+                report["results"] += bench_detector(args.backend, args.sizes, args.concurrency, args.requests, args.images_per_size)
+            elif target == "encodings":
+                report["results"] += bench_encodings(args.backend, args.sizes, args.images_per_size)
+            else:
+                report["results"] += bench_server(
+                    target, args.backend, args.sizes, args.concurrency, args.requests, args.images_per_size,
+                    args.port, workdir, extra_env, args.ready_timeout,
+                )
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import os, shutil, sys, tempfile
+import cv2
+import numpy as np
+import pytest
+
+'''
+Regression tests for the FastAPI backend
+    1. Everything runs against a throw-away sqlite database + storage folder (like the benchmarks),
+       the deterministic stub model (INFERENCE_BACKEND=stub) inside the test process (MODEL_WORKERS=0).
+    2. The settings are read when app.config is imported, so they are set here, before any app import.
+    3. Jobs are not picked up by the API (JOB_WORKER_IN_API=0), tests claim them themselves.
+    Run from the Personal Project->Office/backend folder:  python -m pytest tests
+'''
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix="office-tests-")
+
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(WORKDIR, 'tests.db')}",
+    "STORAGE_DIR": os.path.join(WORKDIR, "storage"),
+    "INFERENCE_BACKEND": "stub",
+    "MODEL_WORKERS": "0",
+    "TORCH_THREADS_PER_WORKER": "1",
+    "WARMUP_RUNS": "0",
+    "SQL_ECHO": "0",
+    "JOB_WORKER_IN_API": "0",
+    "BATCH_INGEST_MAX_FILES": "3",
+})
+sys.path.insert(0, BACKEND_DIR)
+
+TEST_EMAIL = "tests@example.com"
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from sqlmodel import Session, select
+    from app.main import app
+    from app.auth import create_acess_token
+    from app.database import engine
+    from app.models.user_model import User
+
+    with TestClient(app) as client:
+        # the token only needs a matching user row
+        with Session(engine) as session:
+            if not session.exec(select(User).where(User.email == TEST_EMAIL)).first():
+                session.add(User(name="tests", email=TEST_EMAIL, hashed_password="x"))
+                session.commit()
+        client.headers["Authorization"] = "Bearer " + create_acess_token({"sub": TEST_EMAIL})
+        yield client
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+@pytest.fixture
+def make_jpeg():
+    # a different (deterministic) image per seed, so tests never share result cache entries
+    def make(seed, size=(64, 80)):
+        rng = np.random.default_rng(seed)
+        img = rng.integers(0, 255, (*size, 3), dtype=np.uint8)
+        return cv2.imencode(".jpg", img)[1].tobytes()
+    return make
+
+@pytest.fixture
+def flush():
+    # write-behind: rows are listed / cached once their files are on disk
+    from app.write_behind import writer
+    return writer.flush
@@ -0,0 +1,49 @@
+import io, json, zipfile
+from app.config import BATCH_INGEST_MAX_FILES
+
+# conftest sets BATCH_INGEST_MAX_FILES=3
+
+def ndjson(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+def zipped(images):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        for name, data in images.items():
+            zf.writestr(name, data)
+        zf.writestr("readme.txt", "not an image")
+    return buf.getvalue()
+
+def test_too_many_files_is_413(client, make_jpeg):
+    files = [("files", (f"many{i}.jpg", make_jpeg(600 + i), "image/jpeg")) for i in range(BATCH_INGEST_MAX_FILES + 1)]
+    response = client.post("/detect-batch", files=files)
+    assert response.status_code == 413
+
+def test_zip_members_share_the_limit(client, make_jpeg):
+    archive = zipped({f"z{i}.jpg": make_jpeg(610 + i) for i in range(3)})
+    files = [("files", ("loose.jpg", make_jpeg(620), "image/jpeg")), ("archive", ("batch.zip", archive, "application/zip"))]
+    response = client.post("/detect-batch", files=files)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    lines = ndjson(response)
+    summary = lines[-1]
+    images = lines[:-1]
+    assert summary["done"] is True
+    assert summary["processed"] + summary["cached"] == BATCH_INGEST_MAX_FILES
+    assert summary["failed"] == 1
+    assert [line["file"] for line in images if "error" in line] == ["z2.jpg"]
+    assert all("id" in line for line in images if "error" not in line)
+
+def test_bad_image_fails_alone(client, make_jpeg):
+    files = [("files", ("good.jpg", make_jpeg(630), "image/jpeg")), ("files", ("bad.jpg", b"not an image", "image/jpeg"))]
+    lines = ndjson(client.post("/detect-batch", files=files))
+    by_file = {line["file"]: line for line in lines[:-1]}
+    assert "id" in by_file["good.jpg"]
+    assert "error" in by_file["bad.jpg"]
+    assert lines[-1]["failed"] == 1
+
+def test_not_a_zip(client):
+    lines = ndjson(client.post("/detect-batch", files=[("archive", ("broken.zip", b"PK nope", "application/zip"))]))
+    assert lines[0]["error"] == "Not a valid ZIP archive"
+    assert lines[-1]["done"] is True
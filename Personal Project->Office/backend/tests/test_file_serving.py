@@ -0,0 +1,46 @@
+import pytest
+
+@pytest.fixture
+def stored(client, make_jpeg, flush):
+    response = client.post("/detect-image", files={"file": ("serve.jpg", make_jpeg(501, (120, 160)), "image/jpeg")})
+    flush()
+    path = response.json()["download_url"]
+    first = client.get("/view-image", params={"path": path})
+    assert first.status_code == 200
+    return path, first
+
+def test_etag_revalidation_is_304(client, stored):
+    path, first = stored
+    etag = first.headers["etag"]
+    response = client.get("/view-image", params={"path": path}, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    changed = client.get("/view-image", params={"path": path}, headers={"If-None-Match": '"something-else"'})
+    assert changed.status_code == 200
+
+def test_range_is_206(client, stored):
+    path, first = stored
+    size = len(first.content)
+    response = client.get("/view-image", params={"path": path}, headers={"Range": "bytes=0-9"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 0-9/{size}"
+    assert response.content == first.content[:10]
+
+    suffix = client.get("/view-image", params={"path": path}, headers={"Range": "bytes=-5"})
+    assert suffix.status_code == 206
+    assert suffix.content == first.content[-5:]
+
+def test_range_past_the_end_is_416(client, stored):
+    path, first = stored
+    size = len(first.content)
+    response = client.get("/view-image", params={"path": path}, headers={"Range": f"bytes={size}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{size}"
+
+def test_if_range_mismatch_sends_whole_file(client, stored):
+    path, first = stored
+    response = client.get("/view-image", params={"path": path}, headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == first.content
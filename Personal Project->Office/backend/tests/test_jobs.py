@@ -0,0 +1,85 @@
+import threading
+from datetime import datetime, timedelta
+import pytest
+from sqlmodel import Session, select
+from app import jobs
+from app.config import JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS
+from app.database import engine
+from app.models.product_model import DetectJobs
+
+@pytest.fixture
+def job(client):
+    # one queued job, nothing else left in the queue (JOB_WORKER_IN_API=0, only the tests claim)
+    with Session(engine) as session:
+        for stale in session.exec(select(DetectJobs).where(DetectJobs.status.in_(("queued", "running")))).all():
+            stale.status = "failed"
+            session.add(stale)
+        session.commit()
+        return jobs.enqueue(session, "image", "job", ".jpg", "/nowhere/job.jpg").id
+
+def load(job_id):
+    with Session(engine) as session:
+        return session.get(DetectJobs, job_id)
+
+def started_before_lease(job_id):
+    with Session(engine) as session:
+        row = session.get(DetectJobs, job_id)
+        row.started_at = datetime.utcnow() - timedelta(seconds=JOB_LEASE_SECONDS + 60)
+        session.add(row)
+        session.commit()
+
+def test_claim_is_exclusive(job):
+    claimed = jobs.claim("worker-a")
+    assert claimed.id == job
+    assert jobs.claim("worker-b") is None
+
+    row = load(job)
+    assert (row.status, row.worker_id, row.attempts) == ("running", "worker-a", 1)
+
+def test_concurrent_claims_get_the_job_once(job):
+    results = []
+    barrier = threading.Barrier(4)
+
+    def worker(name):
+        barrier.wait()
+        results.append(jobs.claim(name))
+
+    threads = [threading.Thread(target=worker, args=(f"worker-{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [claimed.id for claimed in results if claimed] == [job]
+
+def test_stale_job_is_requeued(job):
+    jobs.claim("worker-a")
+    started_before_lease(job)
+    jobs.requeue_stale()
+    row = load(job)
+    assert (row.status, row.worker_id) == ("queued", None)
+
+    # the next claim counts another attempt
+    assert jobs.claim("worker-b").attempts == 2
+
+def test_stale_job_fails_after_max_attempts(job):
+    for _ in range(JOB_MAX_ATTEMPTS):
+        assert jobs.claim("worker-a").id == job
+        started_before_lease(job)
+        jobs.requeue_stale()
+    row = load(job)
+    assert row.status == "failed"
+    assert row.attempts == JOB_MAX_ATTEMPTS
+
+def test_running_job_within_lease_stays(job):
+    jobs.claim("worker-a")
+    jobs.requeue_stale()
+    assert load(job).status == "running"
+
+def test_postpone_and_release_do_not_use_an_attempt(job):
+    jobs.claim("worker-a")
+    jobs.postpone(job)
+    assert (load(job).status, load(job).attempts) == ("queued", 0)
+
+    jobs.claim("worker-a")
+    jobs.release("worker-a")
+    assert (load(job).status, load(job).attempts) == ("queued", 0)
@@ -0,0 +1,57 @@
+import pytest
+from sqlmodel import Session, select
+from app.database import engine
+from app.models.product_model import Detections
+from app.pagination import paginate, encode_cursor, decode_cursor
+
+def add_rows(prefix, count):
+    with Session(engine) as session:
+        rows = [
+            Detections(filename=f"{prefix}{i}", filepath=f"/nowhere/{prefix}{i}", inference_time_ms=1,
+                       num_detections=0, classes_detected="", confidence_avg=0)
+            for i in range(count)
+        ]
+        session.add_all(rows)
+        session.commit()
+        return [row.id for row in rows]
+
+def pages(prefix, limit):
+    query = select(Detections).where(Detections.filename.startswith(prefix))
+    cursor, result = None, []
+    with Session(engine) as session:
+        while True:
+            rows, cursor = paginate(session, query, Detections.id, cursor, limit)
+            result.append([row.id for row in rows])
+            if not cursor:
+                return result
+
+@pytest.mark.parametrize("count, limit, sizes", [
+    (0, 3, [0]),
+    (3, 3, [3]),         # exactly one page: no cursor to an empty page
+    (4, 3, [3, 1]),      # one row over
+    (6, 3, [3, 3]),
+    (7, 3, [3, 3, 1]),
+])
+def test_page_boundaries(client, count, limit, sizes):
+    prefix = f"page-{count}-{limit}-"
+    ids = add_rows(prefix, count)
+    result = pages(prefix, limit)
+    assert [len(page) for page in result] == sizes
+    # newest first, every row exactly once
+    assert [i for page in result for i in page] == sorted(ids, reverse=True)
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(42)) == 42
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+def test_endpoint_cursor_and_limit(client):
+    add_rows("endpoint-", 3)
+    first = client.get("/detections", params={"limit": 2})
+    assert first.status_code == 200
+    second = client.get("/detections", params={"limit": 2, "cursor": first.json()["next_cursor"]})
+    assert max(item["id"] for item in second.json()["items"]) < min(item["id"] for item in first.json()["items"])
+
+    assert client.get("/detections", params={"cursor": "bad"}).status_code == 400
+    assert client.get("/detections", params={"limit": 0}).status_code == 422
+    assert client.get("/detections", params={"limit": 10_000}).status_code == 422
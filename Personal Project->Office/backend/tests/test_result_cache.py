@@ -0,0 +1,54 @@
+import os
+from sqlmodel import Session, select
+from app.database import engine
+from app.models.product_model import Detections, ResultCache
+
+def upload(client, name, data):
+    response = client.post("/detect-image", files={"file": (f"{name}.jpg", data, "image/jpeg")})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def record_for(download_url):
+    with Session(engine) as session:
+        return session.exec(select(Detections).where(Detections.filepath == download_url)).first()
+
+def test_same_image_is_a_cache_hit(client, make_jpeg, flush):
+    data = make_jpeg(401)
+    first = upload(client, "hit-first", data)
+    flush()
+    second = upload(client, "hit-second", data)
+    assert first["cached"] is False
+    assert second["cached"] is True
+    assert second["Total Detections"] == first["Total Detections"]
+
+def test_cache_hit_after_delete_is_not_another_record(client, make_jpeg, flush):
+    a, b = make_jpeg(402), make_jpeg(403)
+    original = record_for(upload(client, "del-a", a)["download_url"])
+    flush()
+    assert client.delete(f"/detections/id/{original.id}").status_code == 200
+    with Session(engine) as session:
+        assert not session.exec(select(ResultCache).where(ResultCache.detection_id == original.id)).all()
+
+    # the deleted id is handed out again (sqlite reuses the highest rowid), the cache must not point at it
+    other = record_for(upload(client, "del-b", b)["download_url"])
+    flush()
+    again = upload(client, "del-a-again", a)
+    restored = record_for(again["download_url"])
+    assert again["cached"] is True
+    assert restored.id != other.id
+    assert restored.boxes_json == original.boxes_json != other.boxes_json
+    assert os.path.exists(restored.source_path)
+
+def test_cache_after_delete_all(client, make_jpeg, flush):
+    a = make_jpeg(404)
+    original = record_for(upload(client, "all-a", a)["download_url"])
+    flush()
+    assert client.delete("/detections/all").status_code == 200
+    with Session(engine) as session:
+        assert session.exec(select(ResultCache).where(ResultCache.detection_id.isnot(None))).all() == []
+
+    other = record_for(upload(client, "all-b", make_jpeg(405))["download_url"])
+    flush()
+    restored = record_for(upload(client, "all-a-again", a)["download_url"])
+    assert restored.id != other.id
+    assert restored.boxes_json == original.boxes_json
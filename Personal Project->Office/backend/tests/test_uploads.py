@@ -0,0 +1,21 @@
+from app.uploads import first_file_head, sniff
+
+BOUNDARY = b"xyz"
+FIELD = b'--xyz\r\nContent-Disposition: form-data; name="note"\r\n\r\nhello\r\n'
+FILE_HEADERS = b'--xyz\r\nContent-Disposition: form-data; name="file"; filename="a.jpg"\r\nContent-Type: image/jpeg\r\n\r\n'
+
+def test_first_file_head_waits_for_enough_bytes():
+    assert first_file_head(FIELD, BOUNDARY) == (False, None)
+    assert first_file_head(FIELD + FILE_HEADERS + b"\xff\xd8", BOUNDARY) == (False, None)
+    done, head = first_file_head(FIELD + FILE_HEADERS + b"\xff\xd8\xff" + b"0" * 32, BOUNDARY)
+    assert done and sniff(head) == "jpeg"
+
+def test_first_file_head_short_file_and_no_file():
+    assert first_file_head(FILE_HEADERS + b"ab\r\n--xyz--\r\n", BOUNDARY) == (True, b"ab")
+    assert first_file_head(FIELD + b"--xyz--\r\n", BOUNDARY) == (True, None)
+
+def test_not_an_image_is_415(client, make_jpeg):
+    bad = client.post("/detect-image", files={"file": ("fake.jpg", b"GIF? no, plain text " * 100, "image/jpeg")})
+    assert bad.status_code == 415
+    good = client.post("/detect-image", files={"file": ("real.jpg", make_jpeg(701), "image/jpeg")})
+    assert good.status_code == 200
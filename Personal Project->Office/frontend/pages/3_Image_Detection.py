@@ -35,7 +35,8 @@ if uploaded_file is not None:
 
             result_image = requests.get(
                 f"{API_URL}/view-image",
-                params={"path": result_path}
+                params={"path": result_path},
+                headers=headers
             )
 
             if result_image.status_code == 200:
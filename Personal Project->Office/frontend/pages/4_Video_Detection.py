@@ -0,0 +1,58 @@
+import streamlit as st
+import requests
+
+API_URL = "http://127.0.0.1:8000"
+
+st.title("🎥 Video Detection")
+
+if not st.session_state.token:
+    st.warning("Please login first")
+    st.stop()
+
+uploaded_file = st.file_uploader("Upload Video", type=["mp4", "avi", "mov", "mkv"])
+
+frame_stride = st.number_input(
+    "Frame stride (run the detector on every Nth frame)",
+    min_value=1, max_value=60, value=1
+)
+
+if uploaded_file is not None:
+    st.video(uploaded_file)
+
+    if st.button("Detect"):
+        files = {
+            "file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)
+        }
+
+        headers = {"Authorization": f"Bearer {st.session_state.token}"}
+
+        with st.spinner("Processing video..."):
+            res = requests.post(
+                f"{API_URL}/detect-video",
+                files=files,
+                params={"frame_stride": frame_stride},
+                headers=headers
+            )
+
+        if res.status_code == 200:
+            data = res.json()
+            st.success("Detection Completed")
+
+            result_video = requests.get(
+                f"{API_URL}/download-video",
+                params={"video_id": data["video_id"]},
+                headers=headers
+            )
+
+            if result_video.status_code == 200:
+                st.video(result_video.content)
+
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Frames", data["frames_total"])
+            col2.metric("Frames processed", data["frames_processed"])
+            col3.metric("Total Detections", data["Total Detections"])
+
+            if data["class_counts"]:
+                st.bar_chart(data["class_counts"])
+        else:
+            st.error(res.text)
@@ -39,14 +39,40 @@ with col3:
 
 st.divider()
 
-# Fetch detections from backend
-res = requests.get(f"{API_URL}/detections-history")
+headers = {"Authorization": f"Bearer {st.session_state.token}"}
 
-if res.status_code != 200:
-    st.error("Failed to load detections")
-    st.stop()
+PAGE_SIZE = 20
+
+# History is fetched page by page (keyset cursor), "Load more" asks for the next page only
+if "history_items" not in st.session_state:
+    st.session_state.history_items = []
+    st.session_state.history_cursor = None
+    st.session_state.history_done = False
+
+def load_page():
+    params = {"limit": PAGE_SIZE, "thumb_w": 256}
+    if st.session_state.history_cursor:
+        params["cursor"] = st.session_state.history_cursor
+
+    res = requests.get(f"{API_URL}/detections-history", params=params, headers=headers)
+    if res.status_code != 200:
+        st.error("Failed to load detections")
+        st.stop()
 
-data = res.json()
+    page = res.json()
+    st.session_state.history_items.extend(page["items"])
+    st.session_state.history_cursor = page["next_cursor"]
+    st.session_state.history_done = page["next_cursor"] is None
+
+if st.button("Refresh"):
+    st.session_state.history_items = []
+    st.session_state.history_cursor = None
+    st.session_state.history_done = False
+
+if not st.session_state.history_items and not st.session_state.history_done:
+    load_page()
+
+data = st.session_state.history_items
 
 if not data:
     st.info("No detections found")
@@ -59,7 +85,10 @@ for item in data:
     # Image column
     with col1:
         st.markdown('<div class="center-col">', unsafe_allow_html=True)
-        st.image(item["filepath"], width=250)
+        # small server side thumbnail (webp), not the full resolution result
+        img_res = requests.get(f"{API_URL}{item['thumbnail_url']}", headers={**headers, "Accept": "image/webp,image/*"})
+        if img_res.status_code == 200:
+            st.image(img_res.content, width=250)
         st.markdown('</div>', unsafe_allow_html=True)
 
     # Filename column
@@ -71,3 +100,8 @@ for item in data:
         st.markdown(f'<div class="center-col"><span style="background:#0f5132;color:#d1e7dd;padding:6px 12px;border-radius:10px;">{item["num_detections"]}</span></div>', unsafe_allow_html=True)
 
     st.divider()
+
+if not st.session_state.history_done:
+    if st.button("Load more"):
+        load_page()
+        st.rerun()
@@ -0,0 +1,49 @@
+import streamlit as st
+import requests
+
+API_URL = "http://127.0.0.1:8000"
+
+st.title("📊 Model Analytics")
+
+if not st.session_state.get("token"):
+    st.warning("Please login first")
+    st.stop()
+
+headers = {"Authorization": f"Bearer {st.session_state.token}"}
+
+granularity = st.radio("Buckets", ["day", "hour"], horizontal=True)
+
+# The backend answers from hourly / daily rollups, so this stays fast however long the history is
+res = requests.get(f"{API_URL}/analytics", params={"granularity": granularity}, headers=headers)
+if res.status_code != 200:
+    st.error(res.text)
+    st.stop()
+
+data = res.json()
+summary = data["summary"]
+
+if not summary["images"]:
+    st.info("No detections in this period")
+    st.stop()
+
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Images", summary["images"])
+col2.metric("Detections", summary["detections"])
+col3.metric("p50 inference (ms)", summary["p50_inference_ms"])
+col4.metric("p95 inference (ms)", summary["p95_inference_ms"])
+
+st.subheader("Detections per class")
+st.bar_chart(summary["classes"])
+
+buckets = data["buckets"]
+st.subheader("Images per bucket")
+st.line_chart({b["bucket_start"]: b["images"] for b in buckets})
+
+st.subheader("Inference time (ms)")
+st.line_chart({
+    "p50": {b["bucket_start"]: b["p50_inference_ms"] for b in buckets},
+    "p95": {b["bucket_start"]: b["p95_inference_ms"] for b in buckets},
+})
+
+st.subheader("Average confidence")
+st.line_chart({b["bucket_start"]: b["avg_confidence"] for b in buckets})